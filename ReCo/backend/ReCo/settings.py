@@ -62,6 +62,7 @@ TEMPLATES = [
                 'django.template.context_processors.request',
                 'django.contrib.auth.context_processors.auth',
                 'django.contrib.messages.context_processors.messages',
+                'marketplace.context_processors.unread_messages',
             ],
         },
     },
@@ -95,6 +96,17 @@ else:
         }
     }
 
+# Cache (contagens, estatísticas e listas derivadas)
+# Em produção com vários workers, aponte para um cache compartilhado
+# (ex.: DJANGO_CACHE_BACKEND=django.core.cache.backends.redis.RedisCache
+#  e DJANGO_CACHE_LOCATION=redis://127.0.0.1:6379/1)
+CACHES = {
+    'default': {
+        'BACKEND': os.environ.get('DJANGO_CACHE_BACKEND', 'django.core.cache.backends.locmem.LocMemCache'),
+        'LOCATION': os.environ.get('DJANGO_CACHE_LOCATION', 'reco-default'),
+    }
+}
+
 # Internationalization
 # https://docs.djangoproject.com/en/5.2/topics/i18n/
 
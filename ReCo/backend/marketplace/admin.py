@@ -1,10 +1,25 @@
-from django.contrib import admin
-from .models import Donation, Message, DonationRequest, CollectionPoint, Delivery, RecyclingPartner, RecyclingBatch
+from django.contrib import admin, messages
+from .models import Donation, Message, DonationRequest, CollectionPoint, Delivery, RecyclingPartner, RecyclingBatch, BackgroundJob, ExportWatermark
 from .notifications import (
     notify_donation_approved, notify_donation_rejected,
     notify_request_approved, notify_request_rejected,
     notify_delivery_in_progress, notify_delivery_completed
 )
+from . import moderation
+
+
+def _moderation_action(moderate, action, description):
+    """Ação do admin que aplica a moderação em massa aos itens selecionados"""
+    def run(modeladmin, request, queryset):
+        ids = list(queryset.values_list('pk', flat=True))
+        changed = moderate(ids, action, request.user)
+        modeladmin.message_user(
+            request,
+            f'{changed} de {len(ids)} item(ns) atualizado(s); notificações enfileiradas.',
+            messages.SUCCESS if changed else messages.WARNING,
+        )
+    run.__name__ = f'{action}_selected'
+    return admin.action(description=description)(run)
 
 
 @admin.register(Donation)
@@ -12,6 +27,10 @@ class DonationAdmin(admin.ModelAdmin):
     list_display = ('title', 'donor', 'status', 'city', 'condition', 'created_at')
     list_filter = ('status', 'condition', 'city', 'created_at')
     search_fields = ('title', 'description', 'donor__username', 'contact_email')
+    actions = [
+        _moderation_action(moderation.moderate_donations, 'approve', 'Aprovar doações selecionadas'),
+        _moderation_action(moderation.moderate_donations, 'cancel', 'Cancelar doações selecionadas'),
+    ]
     readonly_fields = ('created_at', 'donor', 'approved_by', 'approved_at')
     fieldsets = (
         ('Informações da Doação', {
@@ -50,6 +69,10 @@ class DonationRequestAdmin(admin.ModelAdmin):
     list_display = ('id', 'donation', 'beneficiary', 'status', 'created_at')
     list_filter = ('status', 'created_at')
     search_fields = ('donation__title', 'beneficiary__username', 'reason')
+    actions = [
+        _moderation_action(moderation.moderate_requests, 'approve', 'Aprovar solicitações selecionadas'),
+        _moderation_action(moderation.moderate_requests, 'reject', 'Rejeitar solicitações selecionadas'),
+    ]
     readonly_fields = ('created_at', 'updated_at', 'beneficiary', 'donation')
     fieldsets = (
         ('Solicitação', {
@@ -167,4 +190,17 @@ class RecyclingBatchAdmin(admin.ModelAdmin):
     list_filter = ('status', 'partner', 'created_at')
     search_fields = ('batch_code', 'partner__company_name')
     readonly_fields = ('created_at', 'updated_at', 'collected_at', 'sent_at', 'processed_at', 'certificate_issued_at')
-    filter_horizontal = ('items',)
\ No newline at end of file
+    filter_horizontal = ('items',)
+
+
+@admin.register(BackgroundJob)
+class BackgroundJobAdmin(admin.ModelAdmin):
+    list_display = ('id', 'kind', 'status', 'progress', 'requested_by', 'created_at', 'finished_at')
+    list_filter = ('status', 'kind')
+    readonly_fields = ('params_hash', 'created_at', 'started_at', 'heartbeat_at', 'finished_at')
+
+
+@admin.register(ExportWatermark)
+class ExportWatermarkAdmin(admin.ModelAdmin):
+    list_display = ('dataset', 'exported_until', 'rows', 'updated_at')
+    readonly_fields = ('updated_at',)
@@ -0,0 +1,78 @@
+"""
+Números do painel administrativo.
+
+Uma agregação condicional por tabela (doações, solicitações, entregas,
+perfis e pontos de coleta) em vez de uma contagem por indicador. O resultado
+fica no cache até um save/delete desses modelos (sinais) ou até
+ADMIN_STATS_CACHE_TIMEOUT, que também limita a defasagem dos números "do mês".
+"""
+from datetime import timedelta
+
+from django.core.cache import cache
+from django.db.models import Count, Q
+from django.utils import timezone
+
+from usuario.models import Profile
+
+from .models import CollectionPoint, Delivery, Donation, DonationRequest
+
+
+ADMIN_STATS_CACHE_KEY = 'marketplace:admin_dashboard_stats'
+ADMIN_STATS_CACHE_TIMEOUT = 60
+
+ACTIVE_DELIVERY_STATUSES = ['atribuida', 'coletada', 'em_transito']
+# Doações que contam no impacto estimado
+IMPACT_STATUSES = ['aprovada', 'em_rota', 'entregue']
+
+
+def _compute_stats():
+    thirty_days_ago = timezone.now() - timedelta(days=30)
+    recent = Q(created_at__gte=thirty_days_ago)
+
+    donations = Donation.objects.aggregate(
+        total_donations=Count('id'),
+        pending_donations=Count('id', filter=Q(status='pendente')),
+        approved_donations=Count('id', filter=Q(status='aprovada')),
+        delivered_donations=Count('id', filter=Q(status='entregue')),
+        donations_this_month=Count('id', filter=recent),
+        impact_items=Count('id', filter=Q(status__in=IMPACT_STATUSES)),
+    )
+    requests = DonationRequest.objects.aggregate(
+        total_requests=Count('id'),
+        pending_requests=Count('id', filter=Q(status='pendente')),
+        approved_requests=Count('id', filter=Q(status='aprovada')),
+        rejected_requests=Count('id', filter=Q(status='rejeitada')),
+        requests_this_month=Count('id', filter=recent),
+    )
+    deliveries = Delivery.objects.aggregate(
+        total_deliveries=Count('id'),
+        pending_deliveries=Count('id', filter=Q(status__in=ACTIVE_DELIVERY_STATUSES)),
+        delivered=Count('id', filter=Q(status='entregue')),
+        deliveries_this_month=Count('id', filter=recent),
+    )
+    profiles = Profile.objects.aggregate(
+        total_donors=Count('id', filter=Q(user_type='doador')),
+        total_beneficiaries=Count('id', filter=Q(user_type='beneficiario')),
+        total_drivers=Count('id', filter=Q(user_type='transportador', is_available=True)),
+    )
+    points = CollectionPoint.objects.aggregate(
+        total_collection_points=Count('id', filter=Q(is_active=True)),
+    )
+
+    stats = {**donations, **requests, **deliveries, **profiles, **points}
+    # Impacto estimado: ~3 kg por item eletrônico e ~60 kg de CO2 por kg reaproveitado
+    stats['estimated_kg'] = stats.pop('impact_items') * 3
+    stats['estimated_co2_saved'] = stats['estimated_kg'] * 60
+    return stats
+
+
+def admin_stats():
+    stats = cache.get(ADMIN_STATS_CACHE_KEY)
+    if stats is None:
+        stats = _compute_stats()
+        cache.set(ADMIN_STATS_CACHE_KEY, stats, ADMIN_STATS_CACHE_TIMEOUT)
+    return stats
+
+
+def invalidate_admin_stats():
+    cache.delete(ADMIN_STATS_CACHE_KEY)
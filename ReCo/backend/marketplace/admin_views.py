@@ -4,19 +4,70 @@ Views para painel administrativo do ReCo
 from django.contrib import messages
 from django.contrib.auth.decorators import user_passes_test
 from django.shortcuts import render, get_object_or_404, redirect
+from django.views.decorators.http import require_http_methods
 from django.db.models import Count, Q
 from django.utils import timezone
+from django.utils.http import url_has_allowed_host_and_scheme
 from datetime import timedelta
 
-from .models import Donation, DonationRequest, Delivery, CollectionPoint
+from . import analytics, jobs, moderation
+from .admin_stats import ACTIVE_DELIVERY_STATUSES, admin_stats
+from .models import Donation, DonationRequest, Delivery, CollectionPoint, ExportWatermark
+from .pagination import MAX_PAGE_SIZE, paginate_keyset
+from .search import search_donations
 from usuario.models import Profile
 
 
+# Telas de gestão: itens por página (``?page_size=``, até MAX_PAGE_SIZE)
+MANAGEMENT_PAGE_SIZE = 50
+PAGE_SIZE_CHOICES = (25, 50, 100)
+
+
 def is_admin(user):
     """Verifica se o usuário é administrador"""
     return user.is_staff or user.is_superuser
 
 
+def _status_counts(model):
+    """{status: quantidade} de todo o modelo em uma consulta agrupada"""
+    rows = model.objects.values('status').annotate(count=Count('id')).order_by()
+    return {row['status']: row['count'] for row in rows}
+
+
+def _management_page(request, queryset):
+    """
+    Página (keyset, mais recentes primeiro) da listagem de gestão e o
+    contexto de navegação usado por admin/_pagination.html.
+    """
+    try:
+        page_size = int(request.GET.get('page_size') or MANAGEMENT_PAGE_SIZE)
+    except ValueError:
+        page_size = MANAGEMENT_PAGE_SIZE
+    page_size = max(1, min(page_size, MAX_PAGE_SIZE))
+    cursor = request.GET.get('cursor')
+    page = paginate_keyset(queryset, ('-created_at', '-id'), cursor=cursor, page_size=page_size)
+
+    params = request.GET.copy()
+    params.pop('cursor', None)
+    first_url = f"{request.path}?{params.urlencode()}" if cursor else None
+    next_url = None
+    if page.has_next:
+        params['cursor'] = page.next_cursor
+        next_url = f"{request.path}?{params.urlencode()}"
+    pagination = {
+        'page_size': page_size,
+        'page_size_choices': PAGE_SIZE_CHOICES,
+        # Filtros atuais repetidos no formulário de itens por página
+        'filter_params': [
+            (name, value) for name, value in request.GET.items()
+            if name not in ('cursor', 'page_size')
+        ],
+        'first_url': first_url,
+        'next_url': next_url,
+    }
+    return page, pagination
+
+
 @user_passes_test(is_admin, login_url='usuario:login')
 def dashboard(request):
     """
@@ -25,50 +76,13 @@ def dashboard(request):
     # Período de análise (últimos 30 dias)
     thirty_days_ago = timezone.now() - timedelta(days=30)
     
-    # Estatísticas Gerais
-    stats = {
-        # Doações
-        'total_donations': Donation.objects.count(),
-        'pending_donations': Donation.objects.filter(status='pendente').count(),
-        'approved_donations': Donation.objects.filter(status='aprovada').count(),
-        'delivered_donations': Donation.objects.filter(status='entregue').count(),
-        'donations_this_month': Donation.objects.filter(created_at__gte=thirty_days_ago).count(),
-        
-        # Solicitações
-        'total_requests': DonationRequest.objects.count(),
-        'pending_requests': DonationRequest.objects.filter(status='pendente').count(),
-        'approved_requests': DonationRequest.objects.filter(status='aprovada').count(),
-        'rejected_requests': DonationRequest.objects.filter(status='rejeitada').count(),
-        'requests_this_month': DonationRequest.objects.filter(created_at__gte=thirty_days_ago).count(),
-        
-        # Entregas
-        'total_deliveries': Delivery.objects.count(),
-        'pending_deliveries': Delivery.objects.filter(status__in=['atribuida', 'coletada', 'em_transito']).count(),
-        'delivered': Delivery.objects.filter(status='entregue').count(),
-        'deliveries_this_month': Delivery.objects.filter(created_at__gte=thirty_days_ago).count(),
-        
-        # Usuários
-        'total_donors': Profile.objects.filter(user_type='doador').count(),
-        'total_beneficiaries': Profile.objects.filter(user_type='beneficiario').count(),
-        'total_drivers': Profile.objects.filter(user_type='transportador', is_available=True).count(),
-        'total_collection_points': CollectionPoint.objects.filter(is_active=True).count(),
-    }
-    
-    # Cálculo de Impacto (estimativas)
-    # Assumindo ~3kg por item eletrônico
-    total_items = Donation.objects.filter(status__in=['aprovada', 'em_rota', 'entregue']).count()
-    estimated_kg = total_items * 3
-    
-    # CO2 evitado: ~60kg de CO2 por kg de eletrônico reciclado
-    estimated_co2_saved = estimated_kg * 60
-    
-    stats['estimated_kg'] = estimated_kg
-    stats['estimated_co2_saved'] = estimated_co2_saved
+    # Estatísticas gerais e impacto estimado (uma agregação por tabela, em cache)
+    stats = admin_stats()
     
     # Widgets para ações rápidas
     pending_donations = Donation.objects.filter(status='pendente').select_related('donor')[:5]
     pending_requests = DonationRequest.objects.filter(status='pendente').select_related('donation', 'beneficiary')[:5]
-    active_deliveries = Delivery.objects.filter(status__in=['atribuida', 'coletada', 'em_transito']).select_related('donation', 'driver')[:5]
+    active_deliveries = Delivery.objects.filter(status__in=ACTIVE_DELIVERY_STATUSES).select_related('donation', 'driver')[:5]
     
     context = {
         'stats': stats,
@@ -76,6 +90,7 @@ def dashboard(request):
         'pending_requests': pending_requests,
         'active_deliveries': active_deliveries,
         'thirty_days_ago': thirty_days_ago,
+        'export_watermarks': ExportWatermark.objects.all(),
     }
     
     return render(request, 'admin/dashboard.html', context)
@@ -86,7 +101,7 @@ def donations_management(request):
     """
     Gerenciamento de doações com filtros avançados
     """
-    donations = Donation.objects.select_related('donor', 'approved_by', 'collection_point').order_by('-created_at')
+    donations = Donation.objects.select_related('donor', 'approved_by', 'collection_point')
     
     # Filtros
     status_filter = request.GET.get('status', '')
@@ -98,20 +113,24 @@ def donations_management(request):
     if condition_filter:
         donations = donations.filter(condition=condition_filter)
     if search:
-        donations = donations.filter(Q(title__icontains=search) | Q(description__icontains=search))
+        donations = search_donations(donations, search)
     
-    # Contadores
+    page, pagination = _management_page(request, donations)
+    
+    # Contadores (uma consulta agrupada por status)
+    counts = _status_counts(Donation)
     stats = {
-        'total': Donation.objects.count(),
-        'pending': Donation.objects.filter(status='pendente').count(),
-        'approved': Donation.objects.filter(status='aprovada').count(),
-        'in_route': Donation.objects.filter(status='em_rota').count(),
-        'delivered': Donation.objects.filter(status='entregue').count(),
-        'canceled': Donation.objects.filter(status='cancelada').count(),
+        'total': sum(counts.values()),
+        'pending': counts.get('pendente', 0),
+        'approved': counts.get('aprovada', 0),
+        'in_route': counts.get('em_rota', 0),
+        'delivered': counts.get('entregue', 0),
+        'canceled': counts.get('cancelada', 0),
     }
     
     context = {
-        'donations': donations,
+        'donations': page,
+        'pagination': pagination,
         'stats': stats,
         'status_filter': status_filter,
         'condition_filter': condition_filter,
@@ -130,7 +149,7 @@ def requests_management(request):
     """
     donation_requests = DonationRequest.objects.select_related(
         'donation', 'beneficiary', 'approved_by'
-    ).order_by('-created_at')
+    )
     
     # Filtros
     status_filter = request.GET.get('status', '')
@@ -145,17 +164,21 @@ def requests_management(request):
             Q(reason__icontains=search)
         )
     
-    # Contadores
+    page, pagination = _management_page(request, donation_requests)
+    
+    # Contadores (uma consulta agrupada por status)
+    counts = _status_counts(DonationRequest)
     stats = {
-        'total': DonationRequest.objects.count(),
-        'pending': DonationRequest.objects.filter(status='pendente').count(),
-        'approved': DonationRequest.objects.filter(status='aprovada').count(),
-        'rejected': DonationRequest.objects.filter(status='rejeitada').count(),
-        'delivered': DonationRequest.objects.filter(status='entregue').count(),
+        'total': sum(counts.values()),
+        'pending': counts.get('pendente', 0),
+        'approved': counts.get('aprovada', 0),
+        'rejected': counts.get('rejeitada', 0),
+        'delivered': counts.get('entregue', 0),
     }
     
     context = {
-        'requests': donation_requests,
+        'requests': page,
+        'pagination': pagination,
         'stats': stats,
         'status_filter': status_filter,
         'search': search,
@@ -172,7 +195,7 @@ def deliveries_management(request):
     """
     deliveries = Delivery.objects.select_related(
         'donation', 'driver'
-    ).order_by('-created_at')
+    )
     
     # Filtros
     status_filter = request.GET.get('status', '')
@@ -183,20 +206,24 @@ def deliveries_management(request):
     if driver_filter:
         deliveries = deliveries.filter(driver_id=driver_filter)
     
-    # Contadores
+    page, pagination = _management_page(request, deliveries)
+    
+    # Contadores (uma consulta agrupada por status)
+    counts = _status_counts(Delivery)
     stats = {
-        'total': Delivery.objects.count(),
-        'pending': Delivery.objects.filter(status__in=['atribuida', 'coletada']).count(),
-        'in_transit': Delivery.objects.filter(status='em_transito').count(),
-        'delivered': Delivery.objects.filter(status='entregue').count(),
-        'canceled': Delivery.objects.filter(status='cancelada').count(),
+        'total': sum(counts.values()),
+        'pending': counts.get('atribuida', 0) + counts.get('coletada', 0),
+        'in_transit': counts.get('em_transito', 0),
+        'delivered': counts.get('entregue', 0),
+        'canceled': counts.get('cancelada', 0),
     }
     
     # Lista de drivers disponíveis
     drivers = Profile.objects.filter(user_type='transportador', is_available=True).select_related('user')
     
     context = {
-        'deliveries': deliveries,
+        'deliveries': page,
+        'pagination': pagination,
         'stats': stats,
         'status_filter': status_filter,
         'driver_filter': driver_filter,
@@ -292,3 +319,63 @@ def approve_donation(request, pk):
     
     # Se não for POST, redireciona de volta
     return redirect('doacoes:admin_donations_management')
+
+
+@user_passes_test(is_admin, login_url='usuario:login')
+@require_http_methods(["POST"])
+def analytics_export(request):
+    """
+    Enfileira a exportação analítica (Parquet/CSV) completa ou incremental
+    """
+    params = {
+        'format': analytics.default_format(),
+        'incremental': request.POST.get('mode') == 'incremental',
+    }
+    job = jobs.enqueue(analytics.JOB_KIND, params, user=request.user)
+    return redirect('doacoes:reports_export_job', pk=job.pk)
+
+
+def _bulk_moderate(request, moderate, actions, redirect_to, label):
+    """Aplica a ação em massa do formulário (``action`` + ``ids``) e volta para a lista"""
+    action = request.POST.get('action', '')
+    # Sem repetidos: a contagem de ignorados compara com os que mudaram
+    ids = sorted({int(pk) for pk in request.POST.getlist('ids') if pk.isdigit()})
+    if action not in actions:
+        messages.error(request, 'Ação em massa inválida.')
+    elif not ids:
+        messages.warning(request, f'Selecione ao menos uma {label}.')
+    else:
+        changed = moderate(ids, action, request.user, request.POST.get('reason', '').strip())
+        skipped = len(ids) - changed
+        messages.success(request, f'{changed} {label}(s) atualizada(s); as notificações foram enfileiradas.')
+        if skipped:
+            messages.info(request, f'{skipped} item(ns) ignorado(s): o status atual não permite essa ação.')
+    # Volta para a mesma página/filtros da listagem
+    next_url = request.POST.get('next', '')
+    if url_has_allowed_host_and_scheme(next_url, allowed_hosts={request.get_host()}):
+        return redirect(next_url)
+    return redirect(redirect_to)
+
+
+@user_passes_test(is_admin, login_url='usuario:login')
+@require_http_methods(["POST"])
+def bulk_moderate_donations(request):
+    """
+    Aprova ou cancela as doações selecionadas de uma vez
+    """
+    return _bulk_moderate(
+        request, moderation.moderate_donations, moderation.DONATION_ACTIONS,
+        'doacoes:admin_donations_management', 'doação',
+    )
+
+
+@user_passes_test(is_admin, login_url='usuario:login')
+@require_http_methods(["POST"])
+def bulk_moderate_requests(request):
+    """
+    Aprova ou rejeita as solicitações selecionadas de uma vez
+    """
+    return _bulk_moderate(
+        request, moderation.moderate_requests, moderation.REQUEST_ACTIONS,
+        'doacoes:admin_requests_management', 'solicitação',
+    )
@@ -0,0 +1,208 @@
+"""
+Exportação analítica (colunar) do ciclo de vida das doações.
+
+Cada conjunto (doações, solicitações, entregas e lotes de reciclagem) vira um
+arquivo Parquet quando o pyarrow está instalado ou CSV com gzip caso
+contrário. As linhas saem de um ``values_list().iterator()`` e são gravadas em
+lotes de EXPORT_CHUNK_SIZE, então a memória não cresce com o tamanho da tabela.
+
+No modo incremental só vão as linhas com ``updated_at`` posterior à marca
+d'água (ExportWatermark) do conjunto. Exclusões não aparecem no incremental:
+uma exportação completa periódica recompõe o conjunto.
+"""
+import csv
+import gzip
+import io
+import os
+from datetime import timedelta
+
+from django.db import models
+from django.utils import timezone
+
+from .models import Delivery, Donation, DonationRequest, ExportWatermark, RecyclingBatch
+
+try:
+    import pyarrow as pa
+    import pyarrow.parquet as pq
+except ImportError:  # Dependência opcional: sem ela o formato é CSV com gzip
+    pa = pq = None
+
+
+JOB_KIND = 'analytics_export'
+EXPORT_CHUNK_SIZE = 5000
+
+PARQUET = 'parquet'
+CSV = 'csv'
+FORMATS = {PARQUET: '.parquet', CSV: '.csv.gz'}
+
+# Transações em andamento podem gravar updated_at um pouco antes do commit:
+# a marca d'água fica atrás do relógio para essas linhas não escaparem
+WATERMARK_LAG = timedelta(minutes=5)
+
+DATASETS = {
+    'donations': (Donation, [
+        'id', 'title', 'condition', 'city', 'status', 'is_available', 'delivery_type',
+        'donor_id', 'beneficiary_id', 'approved_by_id', 'collection_point_id',
+        'approved_at', 'created_at', 'updated_at',
+    ]),
+    'requests': (DonationRequest, [
+        'id', 'donation_id', 'beneficiary_id', 'status', 'approved_by_id',
+        'created_at', 'updated_at',
+    ]),
+    'deliveries': (Delivery, [
+        'id', 'donation_id', 'driver_id', 'status',
+        'assigned_at', 'picked_up_at', 'delivered_at', 'created_at', 'updated_at',
+    ]),
+    'recycling_batches': (RecyclingBatch, [
+        'id', 'batch_code', 'partner_id', 'status', 'estimated_weight_kg', 'actual_weight_kg',
+        'created_by_id', 'processed_by_id', 'collected_at', 'sent_at', 'processed_at',
+        'certificate_issued_at', 'created_at', 'updated_at',
+    ]),
+}
+
+
+def default_format():
+    return PARQUET if pq is not None else CSV
+
+
+def filename(dataset, fmt):
+    return f'{dataset}{FORMATS[fmt]}'
+
+
+def cutoff():
+    """Limite superior (updated_at) de uma exportação iniciada agora"""
+    return timezone.now() - WATERMARK_LAG
+
+
+def dataset_queryset(dataset, since=None, until=None):
+    """Linhas do conjunto com updated_at em (since, until]"""
+    model, _ = DATASETS[dataset]
+    rows = model.objects.all()
+    if since is not None:
+        rows = rows.filter(updated_at__gt=since)
+    if until is not None:
+        rows = rows.filter(updated_at__lte=until)
+    return rows.order_by('pk')
+
+
+def watermarks():
+    """{conjunto: exported_until} das exportações anteriores"""
+    return dict(ExportWatermark.objects.values_list('dataset', 'exported_until'))
+
+
+def _chunks(queryset, fields):
+    chunk = []
+    for row in queryset.values_list(*fields).iterator(chunk_size=EXPORT_CHUNK_SIZE):
+        chunk.append(row)
+        if len(chunk) == EXPORT_CHUNK_SIZE:
+            yield chunk
+            chunk = []
+    if chunk:
+        yield chunk
+
+
+def _arrow_type(field):
+    if isinstance(field, models.ForeignKey):
+        field = field.target_field
+    if isinstance(field, models.DateTimeField):
+        return pa.timestamp('us', tz='UTC')
+    if isinstance(field, models.DateField):
+        return pa.date32()
+    if isinstance(field, models.BooleanField):
+        return pa.bool_()
+    if isinstance(field, (models.AutoField, models.IntegerField)):
+        return pa.int64()
+    if isinstance(field, models.FloatField):
+        return pa.float64()
+    return pa.string()
+
+
+def arrow_schema(dataset):
+    model, fields = DATASETS[dataset]
+    return pa.schema([
+        pa.field(name, _arrow_type(model._meta.get_field(name.removesuffix('_id'))))
+        for name in fields
+    ])
+
+
+def _write_parquet(fh, dataset, chunks, on_chunk):
+    schema = arrow_schema(dataset)
+    rows = 0
+    with pq.ParquetWriter(fh, schema, compression='snappy') as writer:
+        for chunk in chunks:
+            columns = list(zip(*chunk))
+            writer.write_table(pa.Table.from_arrays(
+                [pa.array(column, type=schema.field(i).type) for i, column in enumerate(columns)],
+                schema=schema,
+            ))
+            rows += len(chunk)
+            on_chunk(rows)
+    return rows
+
+
+def _write_csv(fh, dataset, chunks, on_chunk):
+    _, fields = DATASETS[dataset]
+    rows = 0
+    with gzip.GzipFile(fileobj=fh, mode='wb') as gz:
+        text = io.TextIOWrapper(gz, encoding='utf-8', newline='')
+        writer = csv.writer(text)
+        writer.writerow(fields)
+        for chunk in chunks:
+            writer.writerows(
+                [value.isoformat() if hasattr(value, 'isoformat') else value for value in row]
+                for row in chunk
+            )
+            rows += len(chunk)
+            on_chunk(rows)
+        text.flush()
+        # Solta o wrapper sem fechar o gzip (fechado pelo with)
+        text.detach()
+    return rows
+
+
+def write_dataset(fh, dataset, fmt, since=None, until=None, on_chunk=None):
+    """Grava o conjunto no arquivo binário ``fh``. Retorna o número de linhas."""
+    if fmt == PARQUET and pq is None:
+        raise ValueError('Exportação Parquet requer o pacote pyarrow')
+    _, fields = DATASETS[dataset]
+    chunks = _chunks(dataset_queryset(dataset, since, until), fields)
+    writer = _write_parquet if fmt == PARQUET else _write_csv
+    return writer(fh, dataset, chunks, on_chunk or (lambda rows: None))
+
+
+def export(directory, datasets=None, fmt=None, incremental=False, progress=None):
+    """
+    Grava um arquivo por conjunto em ``directory``. ``progress(pct)`` é
+    chamado a cada lote. Retorna (limite, [(conjunto, caminho, linhas)]).
+
+    As marcas d'água não são atualizadas aqui: quem chama confirma com
+    ``save_watermarks`` depois de entregar os arquivos.
+    """
+    datasets = list(datasets or DATASETS)
+    fmt = fmt or default_format()
+    until = cutoff()
+    previous = watermarks() if incremental else {}
+
+    os.makedirs(directory, exist_ok=True)
+    results = []
+    for index, dataset in enumerate(datasets):
+        since = previous.get(dataset)
+        total = dataset_queryset(dataset, since, until).count() or 1
+
+        def on_chunk(rows, index=index, total=total):
+            if progress:
+                progress((index + rows / total) * 100 / len(datasets))
+
+        path = os.path.join(directory, filename(dataset, fmt))
+        with open(path, 'wb') as fh:
+            rows = write_dataset(fh, dataset, fmt, since, until, on_chunk)
+        results.append((dataset, path, rows))
+    return until, results
+
+
+def save_watermarks(until, results):
+    """Avança a marca d'água dos conjuntos exportados até ``until``"""
+    for dataset, _, rows in results:
+        ExportWatermark.objects.update_or_create(
+            dataset=dataset, defaults={'exported_until': until, 'rows': rows},
+        )
@@ -0,0 +1,12 @@
+from django.apps import AppConfig
+
+
+class MarketplaceConfig(AppConfig):
+    default_auto_field = "django.db.models.BigAutoField"
+    name = "marketplace"
+
+    def ready(self):
+        # Registra os receivers de sinais (índices, caches e contadores)
+        from . import signals  # noqa: F401
+        # Registra os handlers da fila de tarefas (BackgroundJob)
+        from . import exports, moderation  # noqa: F401
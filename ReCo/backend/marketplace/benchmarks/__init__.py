@@ -0,0 +1,3 @@
+"""
+Ferramentas de benchmark do marketplace (geração de dados e medições)
+"""
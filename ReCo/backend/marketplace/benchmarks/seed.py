@@ -0,0 +1,239 @@
+"""
+Gerador determinístico de dados para benchmarks.
+
+Usa bulk_create em lotes e datas espalhadas no passado; a mesma semente
+sempre produz o mesmo conjunto de dados. Destinado apenas a bancos de teste.
+"""
+import random
+from contextlib import contextmanager
+from datetime import timedelta
+
+from django.contrib.auth import get_user_model
+from django.contrib.auth.hashers import make_password
+from django.utils import timezone
+
+from usuario.models import Profile
+
+from .. import rollups, search
+from ..conversations import rebuild_conversations
+from ..models import (
+    Conversation, Delivery, Donation, DonationRequest, Message, RecyclingBatch, RecyclingPartner,
+)
+
+
+User = get_user_model()
+
+BATCH_SIZE = 2000
+HISTORY_DAYS = 730
+# Doações marcadas para reciclagem por lote
+RECYCLING_BATCH_ITEMS = 20
+
+WORDS = [
+    'notebook', 'monitor', 'teclado', 'mouse', 'impressora', 'celular', 'tablet',
+    'carregador', 'cabo', 'roteador', 'placa', 'memória', 'processador', 'fonte',
+    'gabinete', 'webcam', 'caixa', 'som', 'televisão', 'hd', 'ssd', 'câmera',
+]
+CITIES = ['Brasília', 'Taguatinga', 'Ceilândia', 'Gama', 'Sobradinho', 'Guará', 'Samambaia', '']
+
+
+@contextmanager
+def manual_timestamps(*models):
+    """Permite gravar created_at/updated_at explícitos durante o seed"""
+    fields = []
+    for model in models:
+        for field in model._meta.concrete_fields:
+            if getattr(field, 'auto_now_add', False) or getattr(field, 'auto_now', False):
+                fields.append((field, field.auto_now_add, field.auto_now))
+                field.auto_now_add = field.auto_now = False
+    try:
+        yield
+    finally:
+        for field, auto_now_add, auto_now in fields:
+            field.auto_now_add = auto_now_add
+            field.auto_now = auto_now
+
+
+def _bulk(model, objects):
+    model.objects.bulk_create(objects, batch_size=BATCH_SIZE)
+
+
+def seed(donations=10000, seed=42, activity=True):
+    """
+    Popula o banco com ``donations`` doações e dados relacionados proporcionais.
+
+    Com ``activity=False`` só usuários, doações e o rollup diário são gerados
+    (sem solicitações, entregas, mensagens, lotes de reciclagem e índice de
+    busca), o que permite volumes de milhões de linhas em benchmarks que só
+    leem doações.
+
+    Retorna um dicionário com a quantidade criada por modelo.
+    """
+    rng = random.Random(seed)
+    now = timezone.now()
+
+    def past(days=HISTORY_DAYS):
+        return now - timedelta(seconds=rng.randint(0, days * 86400))
+
+    n_users = max(10, donations // 10)
+    password = make_password(None)
+    users = [
+        User(username=f'bench{i}', email=f'bench{i}@example.com', password=password)
+        for i in range(n_users)
+    ]
+    _bulk(User, users)
+    user_ids = list(User.objects.filter(username__startswith='bench').values_list('id', flat=True))
+    drivers = user_ids[:max(2, n_users // 50)]
+    driver_set = set(drivers)
+    # bulk_create não dispara o sinal que cria o Profile
+    _bulk(Profile, [
+        Profile(
+            user_id=user_id,
+            user_type='transportador' if user_id in driver_set else rng.choice(['doador', 'beneficiario']),
+            is_available=user_id in driver_set,
+        )
+        for user_id in user_ids
+    ])
+
+    status_weights = [('pendente', 2), ('aprovada', 5), ('em_rota', 1), ('entregue', 3), ('cancelada', 1), ('reciclagem', 1)]
+    statuses = [s for s, w in status_weights for _ in range(w)]
+    conditions = [c for c, _ in Donation.CONDITION_CHOICES]
+
+    with manual_timestamps(Donation, DonationRequest, Delivery, Message, RecyclingBatch):
+        # Em lotes: o volume de objetos em memória não cresce com ``donations``
+        for start in range(0, donations, BATCH_SIZE * 5):
+            batch = [
+                Donation(
+                    title=' '.join(rng.sample(WORDS, 2)).capitalize(),
+                    description=' '.join(rng.choices(WORDS, k=12)),
+                    condition=rng.choice(conditions),
+                    city=rng.choice(CITIES),
+                    donor_id=rng.choice(user_ids),
+                    created_at=past(),
+                    is_available=rng.random() > 0.1,
+                    status=rng.choice(statuses),
+                )
+                for _ in range(min(BATCH_SIZE * 5, donations - start))
+            ]
+            for donation in batch:
+                donation.updated_at = donation.created_at
+            _bulk(Donation, batch)
+        donation_rows = list(
+            Donation.objects.order_by('id').values_list('id', 'donor_id', 'status', 'created_at')
+        ) if activity else []
+
+        requests = []
+        deliveries = []
+        messages = []
+        recycling = []
+        for donation_id, donor_id, status, created_at in donation_rows:
+            beneficiaries = rng.sample(user_ids, k=min(len(user_ids), rng.randint(0, 3)))
+            for beneficiary_id in beneficiaries:
+                if beneficiary_id == donor_id:
+                    continue
+                request_status = rng.choice(['pendente', 'aprovada', 'rejeitada', 'entregue'])
+                requested_at = created_at + timedelta(hours=rng.randint(1, 240))
+                requests.append(DonationRequest(
+                    donation_id=donation_id,
+                    beneficiary_id=beneficiary_id,
+                    status=request_status,
+                    reason='Preciso para estudar',
+                    created_at=requested_at,
+                    updated_at=requested_at,
+                ))
+                sent_at = requested_at
+                for _ in range(rng.randint(0, 6)):
+                    sent_at += timedelta(minutes=rng.randint(1, 600))
+                    sender, recipient = rng.choice([(beneficiary_id, donor_id), (donor_id, beneficiary_id)])
+                    messages.append(Message(
+                        donation_id=donation_id,
+                        sender_id=sender,
+                        recipient_id=recipient,
+                        text='Olá, ainda está disponível?',
+                        created_at=sent_at,
+                    ))
+            if status in ('em_rota', 'entregue'):
+                assigned_at = created_at + timedelta(days=rng.randint(1, 20))
+                deliveries.append(Delivery(
+                    donation_id=donation_id,
+                    driver_id=rng.choice(drivers),
+                    status='entregue' if status == 'entregue' else rng.choice(['atribuida', 'coletada', 'em_transito']),
+                    assigned_at=assigned_at,
+                    created_at=assigned_at,
+                    updated_at=assigned_at,
+                ))
+            elif status == 'reciclagem':
+                recycling.append((donation_id, created_at))
+
+            if len(messages) >= BATCH_SIZE * 5:
+                _bulk(DonationRequest, requests)
+                _bulk(Delivery, deliveries)
+                _bulk(Message, messages)
+                requests, deliveries, messages = [], [], []
+
+        _bulk(DonationRequest, requests)
+        _bulk(Delivery, deliveries)
+        _bulk(Message, messages)
+
+        if recycling:
+            _seed_recycling(rng, recycling, user_ids, now)
+
+    # bulk_create não dispara sinais: reconstrói os derivados
+    if activity:
+        search.rebuild_index()
+        rebuild_conversations()
+    rollups.reconcile()
+
+    return {
+        'users': n_users,
+        'donations': donations,
+        'requests': DonationRequest.objects.count(),
+        'deliveries': Delivery.objects.count(),
+        'messages': Message.objects.count(),
+        'conversations': Conversation.objects.count(),
+        'recycling_batches': RecyclingBatch.objects.count(),
+    }
+
+
+def _seed_recycling(rng, recycling, user_ids, now):
+    """Parceiros e lotes com as doações para reciclagem (``[(id, created_at)]``)"""
+    n_batches = -(-len(recycling) // RECYCLING_BATCH_ITEMS)
+    _bulk(RecyclingPartner, [
+        RecyclingPartner(
+            company_name=f'Recicladora {i}',
+            cnpj=f'bench-{i:08d}',
+            address='Endereço de teste',
+            phone='(61) 0000-0000',
+            email=f'recicladora{i}@example.com',
+            contact_person='Responsável',
+        )
+        for i in range(max(2, n_batches // 50))
+    ])
+    partner_ids = list(
+        RecyclingPartner.objects.filter(cnpj__startswith='bench-').values_list('id', flat=True)
+    )
+    statuses = [s for s, _ in RecyclingBatch.STATUS_CHOICES]
+
+    groups = [recycling[i:i + RECYCLING_BATCH_ITEMS] for i in range(0, len(recycling), RECYCLING_BATCH_ITEMS)]
+    batches = []
+    for i, group in enumerate(groups):
+        # Lote montado alguns dias depois da última doação do grupo
+        created_at = min(now, max(day for _, day in group) + timedelta(days=rng.randint(1, 30)))
+        batches.append(RecyclingBatch(
+            batch_code=f'BENCH-{i:08d}',
+            partner_id=rng.choice(partner_ids),
+            status=rng.choice(statuses),
+            estimated_weight_kg=len(group) * 3,
+            created_by_id=rng.choice(user_ids),
+            created_at=created_at,
+            updated_at=created_at,
+        ))
+    _bulk(RecyclingBatch, batches)
+    batch_ids = dict(
+        RecyclingBatch.objects.filter(batch_code__startswith='BENCH-').values_list('batch_code', 'id')
+    )
+    Item = RecyclingBatch.items.through
+    _bulk(Item, [
+        Item(recyclingbatch_id=batch_ids[f'BENCH-{i:08d}'], donation_id=donation_id)
+        for i, group in enumerate(groups)
+        for donation_id, _ in group
+    ])
@@ -0,0 +1,13 @@
+"""
+Context processors do marketplace
+"""
+from . import unread
+
+
+def unread_messages(request):
+    """Total de mensagens não lidas para o badge do menu (lido do cache)"""
+    user = getattr(request, 'user', None)
+    if user is None or not user.is_authenticated:
+        return {}
+    # Callable: o template só consulta o cache se usar a variável
+    return {'unread_messages_count': lambda: unread.unread_count(user.pk)}
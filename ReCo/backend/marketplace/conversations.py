@@ -0,0 +1,71 @@
+"""
+Manutenção da tabela de resumo de conversas (Conversation).
+"""
+from django.db import IntegrityError, transaction
+from django.db.models import F
+
+from .models import Conversation, Message
+
+
+def record_message(message):
+    """
+    Atualiza o resumo da conversa com a mensagem recém-gravada.
+
+    Deve rodar na mesma transação do ``message.save()``. O UPDATE com F() é
+    atômico, então envios simultâneos não perdem contagem de não lidas.
+    """
+    user_a, user_b = Conversation.pair(message.sender_id, message.recipient_id)
+    unread_field = 'unread_a' if message.recipient_id == user_a else 'unread_b'
+    conversation = Conversation.objects.filter(
+        donation_id=message.donation_id, user_a_id=user_a, user_b_id=user_b,
+    )
+    changes = {
+        'last_message': message,
+        'last_activity': message.created_at,
+        unread_field: F(unread_field) + 1,
+    }
+    if conversation.update(**changes):
+        return
+    try:
+        with transaction.atomic():
+            Conversation.objects.create(
+                donation_id=message.donation_id,
+                user_a_id=user_a,
+                user_b_id=user_b,
+                last_message=message,
+                last_activity=message.created_at,
+                **{unread_field: 1},
+            )
+    except IntegrityError:
+        # Outra requisição criou a conversa ao mesmo tempo
+        conversation.update(**changes)
+
+
+def rebuild_conversations(batch_size=2000):
+    """
+    Recria os resumos a partir das mensagens (ex.: após bulk_create no seed).
+
+    Mensagens não marcadas como lidas contam como não lidas.
+    """
+    summaries = {}
+    messages = Message.objects.order_by('id').values_list(
+        'id', 'donation_id', 'sender_id', 'recipient_id', 'created_at', 'read',
+    )
+    for pk, donation_id, sender_id, recipient_id, created_at, read in messages.iterator(chunk_size=batch_size):
+        user_a, user_b = Conversation.pair(sender_id, recipient_id)
+        summary = summaries.setdefault((donation_id, user_a, user_b), {'unread_a': 0, 'unread_b': 0})
+        summary['last_message_id'] = pk
+        summary['last_activity'] = created_at
+        if not read:
+            summary['unread_a' if recipient_id == user_a else 'unread_b'] += 1
+
+    with transaction.atomic():
+        Conversation.objects.all().delete()
+        Conversation.objects.bulk_create(
+            [
+                Conversation(donation_id=donation_id, user_a_id=user_a, user_b_id=user_b, **summary)
+                for (donation_id, user_a, user_b), summary in summaries.items()
+            ],
+            batch_size=batch_size,
+        )
+    return len(summaries)
@@ -0,0 +1,69 @@
+"""
+Exportações de relatórios executadas como tarefas em segundo plano.
+"""
+import os
+import shutil
+import tempfile
+import zipfile
+
+from django.utils import timezone
+from openpyxl import Workbook
+
+from . import analytics, jobs
+from .report_query import ReportQuery
+from .reports_views import (
+    EXPORT_CHUNK_SIZE, EXPORT_HEADERS, export_filename, export_queryset, export_rows,
+    impact_pdf, impact_pdf_filename,
+)
+
+
+@jobs.register('donations_xlsx')
+def donations_xlsx(job):
+    donations = export_queryset(job.params)
+    total = donations.count()
+
+    wb = Workbook(write_only=True)
+    ws = wb.create_sheet('Doacoes')
+    ws.append(EXPORT_HEADERS)
+    for done, row in enumerate(export_rows(donations), start=1):
+        ws.append(row)
+        if done % EXPORT_CHUNK_SIZE == 0:
+            jobs.set_progress(job, done * 100 // total)
+
+    output = tempfile.TemporaryFile()
+    wb.save(output)
+    output.seek(0)
+    return export_filename('xlsx'), output
+
+
+@jobs.register('impact_pdf')
+def impact_pdf_job(job):
+    path, _ = impact_pdf(ReportQuery.from_params(job.params))
+    return impact_pdf_filename(), open(path, 'rb')
+
+
+@jobs.register(analytics.JOB_KIND)
+def analytics_export(job):
+    """Conjuntos analíticos num .zip (os arquivos já vêm comprimidos)"""
+    directory = tempfile.mkdtemp(prefix='reco-analytics-')
+    try:
+        until, results = analytics.export(
+            directory,
+            fmt=job.params.get('format'),
+            incremental=job.params.get('incremental', False),
+            progress=lambda pct: jobs.set_progress(job, pct),
+        )
+        output = tempfile.TemporaryFile()
+        with zipfile.ZipFile(output, 'w', compression=zipfile.ZIP_STORED) as archive:
+            for _, path, _ in results:
+                archive.write(path, os.path.basename(path))
+    finally:
+        shutil.rmtree(directory, ignore_errors=True)
+    output.seek(0)
+    mode = 'incremental' if job.params.get('incremental') else 'completa'
+    # Marcas d'água só avançam com o .zip já gravado: se o storage falhar,
+    # a próxima incremental repete estas linhas
+    return (
+        f"analitico_{mode}_{timezone.localtime():%Y%m%d_%H%M}.zip", output,
+        lambda: analytics.save_watermarks(until, results),
+    )
@@ -0,0 +1,57 @@
+"""
+Contagens por cidade e condição para a barra de filtros da listagem.
+
+Calculadas em uma única consulta agrupada e guardadas no cache até que uma
+doação seja criada, mude de status/cidade/condição ou seja removida.
+"""
+from django.core.cache import cache
+from django.db.models import Count
+
+from .models import Donation
+
+
+FACETS_CACHE_KEY = 'marketplace:donation_facets'
+# Invalidação é explícita (sinais); o timeout limita a defasagem entre
+# workers quando o cache não é compartilhado
+FACETS_CACHE_TIMEOUT = 60 * 10
+
+
+def _compute_facets():
+    rows = (
+        Donation.objects.filter(is_available=True, status__in=Donation.PUBLIC_STATUSES)
+        .values('city', 'condition')
+        .annotate(count=Count('id'))
+        .order_by()
+    )
+
+    cities = {}
+    conditions = {}
+    for row in rows:
+        city = (row['city'] or '').strip()
+        if city:
+            cities[city] = cities.get(city, 0) + row['count']
+        conditions[row['condition']] = conditions.get(row['condition'], 0) + row['count']
+
+    return {
+        'cities': sorted(cities.items()),
+        'conditions': [
+            (value, label, conditions.get(value, 0))
+            for value, label in Donation.CONDITION_CHOICES
+        ],
+    }
+
+
+def donation_facets():
+    """
+    Retorna ``{'cities': [(cidade, qtd)], 'conditions': [(valor, rótulo, qtd)]}``
+    considerando apenas doações visíveis na listagem pública.
+    """
+    facets = cache.get(FACETS_CACHE_KEY)
+    if facets is None:
+        facets = _compute_facets()
+        cache.set(FACETS_CACHE_KEY, facets, FACETS_CACHE_TIMEOUT)
+    return facets
+
+
+def invalidate_facets():
+    cache.delete(FACETS_CACHE_KEY)
@@ -0,0 +1,167 @@
+"""
+Busca por proximidade sem extensão espacial no banco.
+
+Cada doação/ponto de coleta guarda o geohash da sua localização em uma coluna
+indexada. Uma busca por raio:
+
+1. calcula a caixa (bounding box) que contém o círculo;
+2. escolhe a maior precisão de geohash em que poucas células cobrem a caixa e
+   filtra por faixas de prefixo (``geohash >= 'abc' AND geohash < 'abc{'``),
+   que usam o índice B-tree em qualquer banco;
+3. descarta no SQL o que está fora da caixa e ordena o restante pela
+   distância exata (haversine) em Python.
+"""
+import math
+
+from django.db.models import Q
+
+
+EARTH_RADIUS_KM = 6371.0088
+KM_PER_DEGREE_LAT = 111.32
+
+# Precisão gravada na coluna (~5 m); buscas usam prefixos dela
+GEOHASH_PRECISION = 9
+# Limite de células (faixas no WHERE) por busca
+MAX_CELLS = 16
+
+RADIUS_CHOICES_KM = (5, 10, 20, 50)
+DEFAULT_RADIUS_KM = 10
+MAX_RADIUS_KM = 50
+
+BASE32 = '0123456789bcdefghjkmnpqrstuvwxyz'
+# Caractere seguinte ao último do alfabeto: fecha a faixa de um prefixo
+PREFIX_END = '{'
+
+
+def encode(latitude, longitude, precision=GEOHASH_PRECISION):
+    """Geohash de um ponto"""
+    lat_range = [-90.0, 90.0]
+    lng_range = [-180.0, 180.0]
+    chars = []
+    bits = 0
+    value = 0
+    even = True
+    while len(chars) < precision:
+        interval, coordinate = (lng_range, longitude) if even else (lat_range, latitude)
+        middle = (interval[0] + interval[1]) / 2
+        value <<= 1
+        if coordinate >= middle:
+            value |= 1
+            interval[0] = middle
+        else:
+            interval[1] = middle
+        even = not even
+        bits += 1
+        if bits == 5:
+            chars.append(BASE32[value])
+            bits = value = 0
+    return ''.join(chars)
+
+
+def cell_size(precision):
+    """(altura, largura) em graus de uma célula com essa precisão"""
+    total_bits = precision * 5
+    lng_bits = (total_bits + 1) // 2
+    lat_bits = total_bits // 2
+    return 180.0 / 2 ** lat_bits, 360.0 / 2 ** lng_bits
+
+
+def haversine_km(lat1, lng1, lat2, lng2):
+    phi1, phi2 = math.radians(lat1), math.radians(lat2)
+    d_phi = phi2 - phi1
+    d_lambda = math.radians(lng2 - lng1)
+    a = math.sin(d_phi / 2) ** 2 + math.cos(phi1) * math.cos(phi2) * math.sin(d_lambda / 2) ** 2
+    return 2 * EARTH_RADIUS_KM * math.asin(min(1.0, math.sqrt(a)))
+
+
+def bounding_box(latitude, longitude, radius_km):
+    """(min_lat, max_lat, min_lng, max_lng) que contém o círculo"""
+    d_lat = radius_km / KM_PER_DEGREE_LAT
+    d_lng = radius_km / (KM_PER_DEGREE_LAT * max(math.cos(math.radians(latitude)), 0.01))
+    return (
+        max(latitude - d_lat, -90.0),
+        min(latitude + d_lat, 90.0),
+        max(longitude - d_lng, -180.0),
+        min(longitude + d_lng, 180.0),
+    )
+
+
+def _steps(start, end, size, origin):
+    """Centros das células de ``size`` graus que cobrem [start, end]"""
+    first = math.floor((start - origin) / size)
+    last = math.floor((end - origin) / size)
+    return [origin + (i + 0.5) * size for i in range(first, last + 1)]
+
+
+def covering_cells(box):
+    """Menor conjunto de prefixos (até MAX_CELLS) que cobre a caixa"""
+    min_lat, max_lat, min_lng, max_lng = box
+    for precision in range(GEOHASH_PRECISION, 0, -1):
+        height, width = cell_size(precision)
+        lats = _steps(min_lat, max_lat, height, -90.0)
+        lngs = _steps(min_lng, max_lng, width, -180.0)
+        if len(lats) * len(lngs) <= MAX_CELLS:
+            return sorted({
+                encode(min(lat, 90.0), min(lng, 180.0), precision)
+                for lat in lats for lng in lngs
+            })
+    return ['']
+
+
+def cells_filter(cells, field='geohash'):
+    """Q com uma faixa indexável por prefixo"""
+    condition = Q()
+    for cell in cells:
+        if not cell:
+            return Q(**{f'{field}__gt': ''})
+        condition |= Q(**{f'{field}__gte': cell, f'{field}__lt': cell + PREFIX_END})
+    return condition
+
+
+def parse_point(lat, lng):
+    """(lat, lng) em float a partir da querystring, ou None se inválido"""
+    try:
+        latitude, longitude = float(lat), float(lng)
+    except (TypeError, ValueError):
+        return None
+    if not (-90 <= latitude <= 90 and -180 <= longitude <= 180):
+        return None
+    if math.isnan(latitude) or math.isnan(longitude):
+        return None
+    return latitude, longitude
+
+
+def parse_radius(value):
+    try:
+        radius = float(value)
+    except (TypeError, ValueError):
+        return DEFAULT_RADIUS_KM
+    if math.isnan(radius) or radius <= 0:
+        return DEFAULT_RADIUS_KM
+    return min(radius, MAX_RADIUS_KM)
+
+
+def nearby(queryset, latitude, longitude, radius_km, lat_field='latitude', lng_field='longitude'):
+    """
+    Itens do queryset dentro do raio, do mais próximo ao mais distante.
+
+    Cada item recebe o atributo ``distance_km``. ``lat_field``/``lng_field``
+    podem ser campos ou anotações do queryset.
+    """
+    box = bounding_box(latitude, longitude, radius_km)
+    min_lat, max_lat, min_lng, max_lng = box
+    candidates = queryset.filter(cells_filter(covering_cells(box))).filter(**{
+        f'{lat_field}__gte': min_lat,
+        f'{lat_field}__lte': max_lat,
+        f'{lng_field}__gte': min_lng,
+        f'{lng_field}__lte': max_lng,
+    })
+
+    results = []
+    for item in candidates:
+        distance = haversine_km(latitude, longitude, getattr(item, lat_field), getattr(item, lng_field))
+        if distance <= radius_km:
+            item.distance_km = distance
+            results.append(item)
+    results.sort(key=lambda item: (item.distance_km, item.pk))
+    return results
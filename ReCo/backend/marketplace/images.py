@@ -0,0 +1,126 @@
+"""
+Derivados redimensionados (WebP e JPEG) das imagens enviadas.
+
+Para ``donations/foto.jpg`` são gravados, ao lado do original,
+``donations/foto.w200.webp``, ``donations/foto.w200.jpg`` e assim por diante
+para cada largura de IMAGE_DERIVATIVE_WIDTHS. Imagens menores que a largura
+alvo são apenas recodificadas (nunca ampliadas), então toda largura existe.
+"""
+import logging
+import os
+from io import BytesIO
+
+from django.conf import settings
+from django.core.files.base import ContentFile
+from PIL import Image, ImageOps, UnidentifiedImageError
+
+
+logger = logging.getLogger(__name__)
+
+DERIVATIVE_WIDTHS = tuple(getattr(settings, 'IMAGE_DERIVATIVE_WIDTHS', (200, 400, 800)))
+
+# extensão -> (formato do Pillow, opções de gravação)
+DERIVATIVE_FORMATS = {
+    'webp': ('WEBP', {'quality': 80, 'method': 4}),
+    'jpg': ('JPEG', {'quality': 82, 'optimize': True, 'progressive': True}),
+}
+
+# Campos de imagem que recebem derivados, por modelo ('app_label.Model')
+IMAGE_FIELDS = {
+    'marketplace.Donation': ['image'],
+    'marketplace.Message': ['image'],
+    'marketplace.Delivery': ['proof_image'],
+    'usuario.Profile': ['profile_photo'],
+}
+
+
+def derivative_name(name, width, ext):
+    base, _ = os.path.splitext(name)
+    return f'{base}.w{width}.{ext}'
+
+
+def is_derivative(name):
+    """Evita gerar derivados de derivados no backfill"""
+    base, _ = os.path.splitext(name)
+    _, _, suffix = base.rpartition('.w')
+    return suffix.isdigit()
+
+
+def has_derivatives(fieldfile):
+    """Checa o menor derivado WebP como marcador (um único stat no storage)"""
+    if not fieldfile:
+        return False
+    return fieldfile.storage.exists(derivative_name(fieldfile.name, DERIVATIVE_WIDTHS[0], 'webp'))
+
+
+def _encode(image, fmt, options):
+    if fmt == 'JPEG' and image.mode != 'RGB':
+        background = Image.new('RGB', image.size, (255, 255, 255))
+        rgba = image.convert('RGBA')
+        background.paste(rgba, mask=rgba.getchannel('A'))
+        image = background
+    elif fmt == 'WEBP' and image.mode not in ('RGB', 'RGBA'):
+        image = image.convert('RGBA')
+    buffer = BytesIO()
+    image.save(buffer, fmt, **options)
+    return ContentFile(buffer.getvalue())
+
+
+def generate_derivatives(fieldfile, force=False):
+    """
+    Gera os derivados de um ImageField já salvo.
+
+    Retorna a lista de nomes gravados (vazia se já existiam ou em caso de erro).
+    """
+    if not fieldfile or (not force and has_derivatives(fieldfile)):
+        return []
+
+    storage = fieldfile.storage
+    try:
+        with storage.open(fieldfile.name, 'rb') as fh:
+            original = Image.open(fh)
+            original = ImageOps.exif_transpose(original)
+            original.load()
+    except (OSError, UnidentifiedImageError, Image.DecompressionBombError) as exc:
+        logger.warning('Não foi possível gerar derivados de %s: %s', fieldfile.name, exc)
+        return []
+
+    written = []
+    # Da maior para a menor: o marcador (menor WebP) é gravado por último
+    for width in sorted(DERIVATIVE_WIDTHS, reverse=True):
+        resized = original.copy()
+        if resized.width > width:
+            height = round(resized.height * width / resized.width)
+            resized = resized.resize((width, height), Image.LANCZOS)
+        for ext, (fmt, options) in DERIVATIVE_FORMATS.items():
+            name = derivative_name(fieldfile.name, width, ext)
+            if storage.exists(name):
+                storage.delete(name)
+            written.append(storage.save(name, _encode(resized, fmt, options)))
+    return written
+
+
+def generate_for_instance(instance, force=False):
+    """Gera derivados para todos os campos de imagem configurados da instância"""
+    written = []
+    for field_name in IMAGE_FIELDS.get(instance._meta.label, []):
+        written += generate_derivatives(getattr(instance, field_name), force=force)
+    return written
+
+
+def srcset(fieldfile, ext):
+    storage = fieldfile.storage
+    return ', '.join(
+        f'{storage.url(derivative_name(fieldfile.name, width, ext))} {width}w'
+        for width in DERIVATIVE_WIDTHS
+    )
+
+
+def derivative_url(fieldfile, width, ext='jpg'):
+    """URL do derivado mais próximo (>=) da largura pedida, ou do original"""
+    if not fieldfile:
+        return ''
+    if not has_derivatives(fieldfile):
+        return fieldfile.url
+    candidates = [w for w in DERIVATIVE_WIDTHS if w >= width] or [max(DERIVATIVE_WIDTHS)]
+    return fieldfile.storage.url(derivative_name(fieldfile.name, min(candidates), ext))
@@ -0,0 +1,160 @@
+"""
+Fila de tarefas em segundo plano guardada no banco (BackgroundJob).
+
+As views só enfileiram; o comando ``run_jobs`` pega a tarefa mais antiga,
+executa o handler registrado para o tipo e grava o arquivo gerado em
+MEDIA_ROOT/jobs/. Um pedido idêntico a uma tarefa ainda na fila ou em
+execução devolve essa tarefa: ``active_key`` guarda o params_hash (que já
+inclui o tipo) enquanto ela está ativa e volta a NULL ao terminar. O índice
+único comum nessa coluna vale em qualquer banco, inclusive no MySQL, que não
+tem índice parcial.
+
+Handlers recebem a tarefa, podem chamar ``set_progress`` e retornam
+``(nome do arquivo, arquivo aberto)`` ou None quando não geram arquivo
+(ex.: envio de notificações em lote). Um terceiro item opcional é chamado só
+depois que o arquivo foi gravado no storage (ex.: confirmar marcas d'água).
+"""
+import hashlib
+import json
+import logging
+import os
+from datetime import timedelta
+
+from django.core.files import File
+from django.db import IntegrityError, transaction
+from django.utils import timezone
+
+from .models import BackgroundJob
+
+
+logger = logging.getLogger(__name__)
+
+HANDLERS = {}
+
+# Tarefa "em execução" sem sinal de vida (heartbeat_at) há mais tempo que
+# isso é considerada abandonada; exportações longas renovam o sinal pelo
+# set_progress e não são pegas por um segundo worker
+STALE_AFTER = timedelta(minutes=15)
+# Intervalo mínimo entre gravações do sinal quando o progresso não muda
+HEARTBEAT_INTERVAL = timedelta(minutes=1)
+# Tarefas encerradas (e seus arquivos) são apagadas depois disso
+RETENTION = timedelta(days=7)
+
+
+def register(kind):
+    """Decorator que associa um handler a um tipo de tarefa"""
+    def decorator(func):
+        HANDLERS[kind] = func
+        return func
+    return decorator
+
+
+def params_hash(kind, params):
+    payload = json.dumps([kind, params], sort_keys=True, separators=(',', ':'), default=str)
+    return hashlib.sha256(payload.encode('utf-8')).hexdigest()
+
+
+def enqueue(kind, params=None, user=None):
+    """Enfileira a tarefa ou devolve a idêntica que ainda está ativa"""
+    if kind not in HANDLERS:
+        raise ValueError(f'Tipo de tarefa desconhecido: {kind}')
+    params = params or {}
+    digest = params_hash(kind, params)
+    active = BackgroundJob.objects.filter(active_key=digest)
+    for _ in range(3):
+        job = active.first()
+        if job is not None:
+            return job
+        try:
+            with transaction.atomic():
+                return BackgroundJob.objects.create(
+                    kind=kind, params=params, params_hash=digest, requested_by=user,
+                )
+        except IntegrityError:
+            # Pedido idêntico criado ao mesmo tempo: devolve o dele
+            continue
+    return active.get()
+
+
+def set_progress(job, percent):
+    """
+    Atualiza o progresso (0–99; 100 só ao concluir) e o sinal de vida da
+    tarefa. Só grava se o progresso mudou ou se o último sinal tem mais de
+    HEARTBEAT_INTERVAL.
+    """
+    percent = max(0, min(int(percent), 99))
+    now = timezone.now()
+    beat_due = job.heartbeat_at is None or now - job.heartbeat_at >= HEARTBEAT_INTERVAL
+    if percent != job.progress or beat_due:
+        job.progress = percent
+        job.heartbeat_at = now
+        BackgroundJob.objects.filter(pk=job.pk).update(progress=percent, heartbeat_at=now)
+
+
+def claim_next():
+    """
+    Marca como em execução e devolve a tarefa mais antiga da fila, ou None.
+    O UPDATE condicional garante que dois workers não pegam a mesma tarefa.
+    """
+    queue = BackgroundJob.objects.filter(status='pendente').order_by('created_at', 'id')
+    while True:
+        pk = queue.values_list('pk', flat=True).first()
+        if pk is None:
+            return None
+        now = timezone.now()
+        claimed = BackgroundJob.objects.filter(pk=pk, status='pendente').update(
+            status='executando', started_at=now, heartbeat_at=now, progress=0,
+        )
+        if claimed:
+            return BackgroundJob.objects.get(pk=pk)
+
+
+def run(job):
+    """Executa uma tarefa já marcada como em execução"""
+    try:
+        result = HANDLERS[job.kind](job)
+        if result is not None:
+            filename, content, *on_stored = result
+            with content:
+                job.file.save(filename, File(content), save=False)
+            for callback in on_stored:
+                callback()
+    except Exception as exc:
+        logger.exception('Tarefa %s falhou', job)
+        job.status = 'erro'
+        job.error = str(exc) or exc.__class__.__name__
+    else:
+        job.status = 'concluido'
+        job.progress = 100
+    job.finished_at = timezone.now()
+    job.save(update_fields=['status', 'progress', 'file', 'error', 'finished_at', 'active_key'])
+    return job
+
+
+def requeue_stale():
+    """
+    Devolve à fila tarefas abandonadas (worker que morreu no meio): sem sinal
+    de vida há mais de STALE_AFTER, não importa há quanto tempo começaram.
+    active_key continua.
+    """
+    return BackgroundJob.objects.filter(
+        status='executando', heartbeat_at__lt=timezone.now() - STALE_AFTER,
+    ).update(status='pendente', started_at=None, heartbeat_at=None, progress=0)
+
+
+def purge_finished():
+    """Apaga tarefas encerradas há mais de RETENTION e seus arquivos"""
+    old = BackgroundJob.objects.filter(
+        status__in=['concluido', 'erro'], finished_at__lt=timezone.now() - RETENTION,
+    )
+    removed = 0
+    for job in old.iterator():
+        if job.file:
+            job.file.delete(save=False)
+        job.delete()
+        removed += 1
+    return removed
+
+
+def download_name(job):
+    return os.path.basename(job.file.name)
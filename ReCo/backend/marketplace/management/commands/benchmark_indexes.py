@@ -0,0 +1,138 @@
+import json
+import statistics
+import time
+
+from django.core.management.base import BaseCommand
+from django.db import connection
+from django.db.models import Q
+
+from marketplace.benchmarks.seed import seed
+from marketplace.models import Delivery, Donation, DonationRequest, Message
+
+
+# Índices compostos criados na migration 0011 (modelo, nome do índice)
+HOT_INDEXES = [
+    (Donation, 'donation_created_avail_status'),
+    (Donation, 'donation_status_created'),
+    (DonationRequest, 'request_status_created'),
+    (DonationRequest, 'request_donation_status'),
+    (Delivery, 'delivery_driver_status_created'),
+    (Message, 'message_conversation_created'),
+]
+
+
+def _index(model, name):
+    return next(index for index in model._meta.indexes if index.name == name)
+
+
+def hot_queries():
+    """Consultas reais das views, com parâmetros tirados do próprio dataset"""
+    message = Message.objects.order_by('id').first()
+    delivery = Delivery.objects.order_by('id').first()
+    donation_id = DonationRequest.objects.order_by('id').values_list('donation_id', flat=True).first()
+
+    queries = [
+        ('index (listagem pública)', Donation.objects.filter(
+            is_available=True, status__in=['aprovada', 'entregue'],
+        ).order_by('-created_at', '-id')[:24]),
+        ('dashboard (doações pendentes)', Donation.objects.filter(
+            status='pendente',
+        ).order_by('-created_at')[:5]),
+        ('requests_management (pendentes)', DonationRequest.objects.filter(
+            status='pendente',
+        ).order_by('-created_at')[:50]),
+        ('solicitações aprovadas da doação', DonationRequest.objects.filter(
+            donation_id=donation_id, status='aprovada',
+        )),
+    ]
+    if delivery:
+        queries.append(('driver_dashboard (ativas)', Delivery.objects.filter(
+            driver_id=delivery.driver_id,
+        ).exclude(status__in=['entregue', 'cancelada']).order_by('-created_at')))
+    if message:
+        a, b = message.sender_id, message.recipient_id
+        queries.append(('messages_json (conversa)', Message.objects.filter(
+            donation_id=message.donation_id,
+        ).filter(
+            Q(sender_id=a, recipient_id=b) | Q(sender_id=b, recipient_id=a)
+        ).order_by('created_at')))
+    return queries
+
+
+class Command(BaseCommand):
+    help = (
+        'Popula um banco de teste e compara EXPLAIN e tempos das consultas '
+        'mais usadas sem e com os índices compostos'
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('--donations', type=int, default=20000, help='Quantidade de doações no seed')
+        parser.add_argument('--repeat', type=int, default=20, help='Execuções por consulta')
+        parser.add_argument('--seed', type=int, default=42)
+        parser.add_argument('--output', help='Arquivo JSON com os resultados')
+
+    def handle(self, *args, **options):
+        old_name = connection.settings_dict['NAME']
+        connection.creation.create_test_db(verbosity=0, autoclobber=True, serialize=False)
+        try:
+            counts = seed(donations=options['donations'], seed=options['seed'])
+            self.stdout.write(f'Dados gerados: {counts}')
+            results = {'dataset': counts, 'vendor': connection.vendor, 'runs': {}}
+
+            self._drop_indexes()
+            results['runs']['antes'] = self._measure(options['repeat'])
+            self._create_indexes()
+            results['runs']['depois'] = self._measure(options['repeat'])
+        finally:
+            connection.creation.destroy_test_db(old_name, verbosity=0)
+
+        self._report(results)
+        if options['output']:
+            with open(options['output'], 'w', encoding='utf-8') as fh:
+                json.dump(results, fh, ensure_ascii=False, indent=2)
+            self.stdout.write(self.style.SUCCESS(f"Resultados salvos em {options['output']}"))
+
+    def _drop_indexes(self):
+        with connection.schema_editor() as editor:
+            for model, name in HOT_INDEXES:
+                editor.remove_index(model, _index(model, name))
+        self._analyze()
+
+    def _create_indexes(self):
+        with connection.schema_editor() as editor:
+            for model, name in HOT_INDEXES:
+                editor.add_index(model, _index(model, name))
+        self._analyze()
+
+    def _analyze(self):
+        # Atualiza estatísticas para o otimizador escolher o plano com dados reais
+        if connection.vendor in ('sqlite', 'postgresql'):
+            with connection.cursor() as cursor:
+                cursor.execute('ANALYZE')
+
+    def _measure(self, repeat):
+        run = {}
+        for label, queryset in hot_queries():
+            timings = []
+            for _ in range(repeat):
+                start = time.perf_counter()
+                list(queryset.all())
+                timings.append((time.perf_counter() - start) * 1000)
+            run[label] = {
+                'explain': queryset.explain(),
+                'median_ms': round(statistics.median(timings), 3),
+                'max_ms': round(max(timings), 3),
+            }
+        return run
+
+    def _report(self, results):
+        before, after = results['runs']['antes'], results['runs']['depois']
+        for label in before:
+            self.stdout.write(self.style.MIGRATE_HEADING(label))
+            self.stdout.write('  antes:  ' + before[label]['explain'].replace('\n', '\n          '))
+            self.stdout.write('  depois: ' + after[label]['explain'].replace('\n', '\n          '))
+            speedup = before[label]['median_ms'] / after[label]['median_ms'] if after[label]['median_ms'] else 0
+            self.stdout.write(
+                f"  mediana: {before[label]['median_ms']} ms -> {after[label]['median_ms']} ms "
+                f"({speedup:.1f}x)"
+            )
@@ -0,0 +1,122 @@
+import gc
+import json
+import time
+import tracemalloc
+from collections import defaultdict
+
+from django.contrib.auth import get_user_model
+from django.core.management.base import BaseCommand
+from django.db import connection
+from django.test import RequestFactory
+
+from marketplace.benchmarks.seed import seed
+from marketplace.models import Donation
+from marketplace.reports_views import daily_series, impact_report, monthly_impact_series
+
+
+def legacy_daily_series(donations):
+    """Série diária como era antes: todas as doações carregadas e contadas em Python"""
+    daily_stats = defaultdict(int)
+    for donation in donations:
+        daily_stats[donation.created_at.date()] += 1
+    return [
+        {'date': day.strftime('%d/%m'), 'count': count}
+        for day, count in sorted(daily_stats.items())
+    ]
+
+
+def legacy_monthly_series(delivered):
+    """Série mensal como era antes: todas as entregas carregadas e contadas em Python"""
+    monthly_stats = defaultdict(int)
+    for donation in delivered:
+        monthly_stats[donation.created_at.strftime('%Y-%m')] += 1
+    return [
+        {'month': month, 'count': count, 'kg': count * 3, 'co2': count * 180}
+        for month, count in sorted(monthly_stats.items())
+    ]
+
+
+def measure(func):
+    """(resultado, ms, pico de memória Python em KiB)"""
+    gc.collect()
+    tracemalloc.start()
+    start = time.perf_counter()
+    try:
+        result = func()
+    finally:
+        elapsed = (time.perf_counter() - start) * 1000
+        _, peak = tracemalloc.get_traced_memory()
+        tracemalloc.stop()
+    return result, round(elapsed, 1), round(peak / 1024, 1)
+
+
+class Command(BaseCommand):
+    help = (
+        'Popula bancos de teste de tamanhos crescentes e compara tempo e pico de '
+        'memória das séries dos relatórios (contagem em Python x agrupamento no banco)'
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--rows', type=int, nargs='+', default=[10000, 100000, 1000000],
+            help='Quantidades de doações a testar',
+        )
+        parser.add_argument(
+            '--legacy-limit', type=int, default=200000,
+            help='Acima disso a versão antiga não é executada (carrega tudo em memória)',
+        )
+        parser.add_argument('--seed', type=int, default=42)
+        parser.add_argument('--output', help='Arquivo JSON com os resultados')
+
+    def handle(self, *args, **options):
+        results = []
+        for rows in options['rows']:
+            old_name = connection.settings_dict['NAME']
+            connection.creation.create_test_db(verbosity=0, autoclobber=True, serialize=False)
+            try:
+                seed(donations=rows, seed=options['seed'], activity=False)
+                results.append(self._measure(rows, options['legacy_limit']))
+            finally:
+                connection.creation.destroy_test_db(old_name, verbosity=0)
+            self._report(results[-1])
+
+        if options['output']:
+            with open(options['output'], 'w', encoding='utf-8') as fh:
+                json.dump(results, fh, ensure_ascii=False, indent=2)
+            self.stdout.write(self.style.SUCCESS(f"Resultados salvos em {options['output']}"))
+
+    def _measure(self, rows, legacy_limit):
+        donations = Donation.objects.all()
+        delivered = Donation.objects.filter(status='entregue')
+        cases = [
+            ('série diária (banco)', lambda: daily_series(donations)),
+            ('série mensal (banco)', lambda: monthly_impact_series(delivered)),
+            ('relatório de impacto (view)', self._impact_view),
+        ]
+        if rows <= legacy_limit:
+            cases += [
+                ('série diária (Python)', lambda: legacy_daily_series(donations.all())),
+                ('série mensal (Python)', lambda: legacy_monthly_series(delivered.all())),
+            ]
+
+        run = {'rows': rows, 'cases': {}}
+        for label, func in cases:
+            _, elapsed, peak = measure(func)
+            run['cases'][label] = {'ms': elapsed, 'peak_kib': peak}
+        return run
+
+    def _impact_view(self):
+        User = get_user_model()
+        admin = User.objects.filter(is_staff=True).first() or User.objects.create_user(
+            username='benchmark-admin', password='x', is_staff=True,
+        )
+        request = RequestFactory().get('/doacoes/relatorios/impacto/', {'period': 'all'})
+        request.user = admin
+        response = impact_report(request)
+        assert response.status_code == 200, response.status_code
+        return response
+
+    def _report(self, run):
+        self.stdout.write(self.style.MIGRATE_HEADING(f"{run['rows']} doações"))
+        for label, values in run['cases'].items():
+            self.stdout.write(f"  {label:<30} {values['ms']:>10} ms  {values['peak_kib']:>12} KiB")
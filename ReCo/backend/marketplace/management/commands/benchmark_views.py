@@ -0,0 +1,159 @@
+import json
+import shutil
+import statistics
+import tempfile
+import time
+
+from django.contrib.auth import get_user_model
+from django.core.cache import cache
+from django.core.management.base import BaseCommand
+from django.db import connection
+from django.db.models import Count
+from django.test import Client, override_settings
+from django.test.utils import CaptureQueriesContext, setup_test_environment, teardown_test_environment
+from django.urls import reverse
+
+from marketplace.benchmarks.seed import seed
+from marketplace.models import Conversation, Delivery
+
+
+# Cache local e mídia temporária: o benchmark nunca toca no cache/arquivos reais
+BENCHMARK_CACHES = {
+    'default': {
+        'BACKEND': 'django.core.cache.backends.locmem.LocMemCache',
+        'LOCATION': 'reco-benchmark',
+    }
+}
+
+
+def fetch(client, url, params=None):
+    """(status, ms, consultas) de um GET completo, consumindo respostas em streaming"""
+    with CaptureQueriesContext(connection) as queries:
+        start = time.perf_counter()
+        response = client.get(url, params or {})
+        if response.streaming:
+            for _ in response.streaming_content:
+                pass
+        else:
+            response.content
+        elapsed = (time.perf_counter() - start) * 1000
+        response.close()
+    return response.status_code, round(elapsed, 1), len(queries)
+
+
+class Command(BaseCommand):
+    help = (
+        'Popula bancos de teste de tamanhos crescentes e mede, pelo cliente de '
+        'teste, tempo e número de consultas das principais páginas (cache frio e quente)'
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--donations', type=int, nargs='+', default=[10000, 100000, 1000000],
+            help='Quantidades de doações a testar',
+        )
+        parser.add_argument('--repeat', type=int, default=3, help='Execuções com cache quente (mediana)')
+        parser.add_argument('--seed', type=int, default=42)
+        parser.add_argument('--output', help='Arquivo JSON com os resultados')
+
+    def handle(self, *args, **options):
+        results = []
+        media_root = tempfile.mkdtemp(prefix='reco-benchmark-')
+        setup_test_environment()
+        try:
+            with override_settings(MEDIA_ROOT=media_root, CACHES=BENCHMARK_CACHES):
+                for donations in options['donations']:
+                    old_name = connection.settings_dict['NAME']
+                    connection.creation.create_test_db(verbosity=0, autoclobber=True, serialize=False)
+                    try:
+                        counts = seed(donations=donations, seed=options['seed'])
+                        run = {'donations': donations, 'rows': counts, 'views': {}}
+                        for label, client, url, params in self._targets():
+                            run['views'][label] = self._measure(client, url, params, options['repeat'])
+                        results.append(run)
+                    finally:
+                        connection.creation.destroy_test_db(old_name, verbosity=0)
+                    self._report(results[-1])
+        finally:
+            teardown_test_environment()
+            shutil.rmtree(media_root, ignore_errors=True)
+
+        if options['output']:
+            with open(options['output'], 'w', encoding='utf-8') as fh:
+                json.dump(results, fh, ensure_ascii=False, indent=2)
+            self.stdout.write(self.style.SUCCESS(f"Resultados salvos em {options['output']}"))
+
+    def _targets(self):
+        """[(rótulo, cliente logado, url, parâmetros)] com os usuários mais ativos do seed"""
+        User = get_user_model()
+        admin = User.objects.create_user(
+            username='benchmark-admin', password='x', is_staff=True, is_superuser=True,
+        )
+        staff = Client()
+        staff.force_login(admin)
+
+        # Quem tem mais conversas: a caixa de entrada e o chat mais pesados
+        busiest = (
+            Conversation.objects.values('user_a').annotate(total=Count('id'))
+            .order_by('-total', 'user_a').first()
+        )
+        conversation = (
+            Conversation.objects.filter(user_a=busiest['user_a']).select_related('donation')
+            .order_by('-last_activity').first()
+        )
+        chatter = Client()
+        chatter.force_login(User.objects.get(pk=conversation.user_a_id))
+        other = conversation.user_b_id if conversation.user_a_id == conversation.donation.donor_id else None
+        chat_params = {'participant': other} if other else {}
+
+        driver_id = (
+            Delivery.objects.values('driver').annotate(total=Count('id'))
+            .order_by('-total', 'driver').first()['driver']
+        )
+        driver = Client()
+        driver.force_login(User.objects.get(pk=driver_id))
+
+        report = {'period': 'all'}
+        donation = conversation.donation_id
+        return [
+            ('index', chatter, reverse('doacoes:index'), {}),
+            ('chats', chatter, reverse('doacoes:chats'), {}),
+            ('chat', chatter, reverse('doacoes:chat', args=[donation]), chat_params),
+            ('messages_json', chatter, reverse('doacoes:messages_json', args=[donation]), chat_params),
+            ('reports_dashboard', staff, reverse('doacoes:reports_dashboard'), report),
+            ('reports_donations', staff, reverse('doacoes:reports_donations'), report),
+            ('reports_impact', staff, reverse('doacoes:reports_impact'), report),
+            ('reports_beneficiaries', staff, reverse('doacoes:reports_beneficiaries'), report),
+            ('export_donations_xlsx', staff, reverse('doacoes:reports_export_donations'), report),
+            ('export_donations_csv', staff, reverse('doacoes:reports_export_donations_csv'), report),
+            ('export_impact_pdf', staff, reverse('doacoes:reports_export_impact'), report),
+            ('admin_dashboard', staff, reverse('doacoes:admin_dashboard'), {}),
+            ('recycling_dashboard', staff, reverse('doacoes:recycling_dashboard'), {}),
+            ('driver_dashboard', driver, reverse('doacoes:driver_dashboard'), {}),
+        ]
+
+    def _measure(self, client, url, params, repeat):
+        cache.clear()
+        status, cold_ms, cold_queries = fetch(client, url, params)
+        warm = [fetch(client, url, params) for _ in range(repeat)]
+        if status != 200:
+            self.stderr.write(self.style.WARNING(f'{url} respondeu {status}'))
+        return {
+            'status': status,
+            'cold_ms': cold_ms,
+            'cold_queries': cold_queries,
+            'warm_ms': round(statistics.median(ms for _, ms, _ in warm), 1) if warm else None,
+            'warm_queries': warm[-1][2] if warm else None,
+        }
+
+    def _report(self, run):
+        self.stdout.write(self.style.MIGRATE_HEADING(
+            f"{run['donations']} doações (" + ', '.join(f'{k}={v}' for k, v in run['rows'].items()) + ')'
+        ))
+        self.stdout.write(f"  {'view':<24} {'frio ms':>10} {'consultas':>10} {'quente ms':>10} {'consultas':>10}")
+        for label, values in run['views'].items():
+            self.stdout.write(
+                f"  {label:<24} {values['cold_ms']:>10} {values['cold_queries']:>10} "
+                f"{values['warm_ms'] if values['warm_ms'] is not None else '-':>10} "
+                f"{values['warm_queries'] if values['warm_queries'] is not None else '-':>10}"
+            )
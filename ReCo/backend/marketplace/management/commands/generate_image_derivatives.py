@@ -0,0 +1,33 @@
+from django.apps import apps
+from django.core.management.base import BaseCommand
+
+from marketplace import images
+
+
+class Command(BaseCommand):
+    help = 'Gera derivados WebP/JPEG redimensionados para as imagens já enviadas'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--force', action='store_true', help='Regera mesmo se os derivados já existirem')
+
+    def handle(self, *args, **options):
+        total = 0
+        for label, field_names in images.IMAGE_FIELDS.items():
+            model = apps.get_model(label)
+            for field_name in field_names:
+                queryset = (
+                    model.objects.exclude(**{field_name: ''})
+                    .exclude(**{f'{field_name}__isnull': True})
+                    .only('pk', field_name)
+                    .order_by('pk')
+                )
+                generated = 0
+                for instance in queryset.iterator(chunk_size=500):
+                    fieldfile = getattr(instance, field_name)
+                    if images.is_derivative(fieldfile.name):
+                        continue
+                    if images.generate_derivatives(fieldfile, force=options['force']):
+                        generated += 1
+                total += generated
+                self.stdout.write(f'{label}.{field_name}: {generated} imagens processadas')
+        self.stdout.write(self.style.SUCCESS(f'Derivados gerados para {total} imagens.'))
@@ -0,0 +1,13 @@
+from django.core.management.base import BaseCommand
+
+from marketplace import similarity
+
+
+class Command(BaseCommand):
+    help = 'Reconstrói o índice de similaridade usado em "itens relacionados"'
+
+    def handle(self, *args, **options):
+        total = similarity.rebuild_related()
+        self.stdout.write(self.style.SUCCESS(
+            f'Vizinhos recalculados para {total} doações (top {similarity.TOP_K}).'
+        ))
@@ -0,0 +1,20 @@
+from django.core.management.base import BaseCommand
+
+from marketplace import search
+
+
+class Command(BaseCommand):
+    help = 'Reconstrói o índice de busca textual das doações (FTS5 no SQLite, FULLTEXT no MySQL)'
+
+    def handle(self, *args, **options):
+        search.reset_backend_cache()
+        backend = search.search_backend()
+        if backend is None:
+            self.stdout.write(self.style.WARNING(
+                'Banco atual não possui índice full-text; a busca usa icontains.'
+            ))
+            return
+        total = search.rebuild_index()
+        self.stdout.write(self.style.SUCCESS(
+            f'Índice de busca ({backend}) reconstruído com {total} doações.'
+        ))
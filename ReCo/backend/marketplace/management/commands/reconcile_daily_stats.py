@@ -0,0 +1,14 @@
+from django.core.management.base import BaseCommand
+
+from marketplace import rollups
+
+
+class Command(BaseCommand):
+    help = 'Confere a tabela DailyStats com as doações/solicitações e corrige as diferenças'
+
+    def handle(self, *args, **options):
+        fixed = rollups.reconcile()
+        if fixed:
+            self.stdout.write(self.style.WARNING(f'{fixed} baldes corrigidos'))
+        else:
+            self.stdout.write(self.style.SUCCESS('DailyStats já está consistente'))
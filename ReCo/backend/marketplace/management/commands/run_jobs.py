@@ -0,0 +1,49 @@
+import time
+
+from django.core.management.base import BaseCommand
+from django.db import close_old_connections
+
+from marketplace import jobs
+
+
+# Intervalo entre limpezas (tarefas abandonadas e arquivos antigos)
+MAINTENANCE_INTERVAL = 60 * 60
+
+
+class Command(BaseCommand):
+    help = 'Worker da fila de tarefas em segundo plano (exportações de relatórios)'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--once', action='store_true', help='Processa a fila atual e sai')
+        parser.add_argument('--sleep', type=float, default=2.0, help='Segundos entre consultas com a fila vazia')
+
+    def handle(self, *args, **options):
+        last_maintenance = None
+        while True:
+            if last_maintenance is None or time.monotonic() - last_maintenance > MAINTENANCE_INTERVAL:
+                self._maintenance()
+                last_maintenance = time.monotonic()
+
+            job = jobs.claim_next()
+            if job is None:
+                if options['once']:
+                    return
+                # Processo de longa duração: respeita CONN_MAX_AGE e reconecta se preciso
+                close_old_connections()
+                time.sleep(options['sleep'])
+                continue
+
+            self.stdout.write(f'Executando {job}...')
+            jobs.run(job)
+            if job.status == 'concluido':
+                self.stdout.write(self.style.SUCCESS(f'{job} concluída: {job.file.name}'))
+            else:
+                self.stdout.write(self.style.ERROR(f'{job} falhou: {job.error}'))
+
+    def _maintenance(self):
+        requeued = jobs.requeue_stale()
+        if requeued:
+            self.stdout.write(self.style.WARNING(f'{requeued} tarefas abandonadas voltaram para a fila'))
+        removed = jobs.purge_finished()
+        if removed:
+            self.stdout.write(f'{removed} tarefas antigas removidas')
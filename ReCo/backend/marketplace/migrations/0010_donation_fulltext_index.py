@@ -0,0 +1,44 @@
+from django.db import migrations
+
+
+FTS_TABLE = 'marketplace_donation_fts'
+FULLTEXT_INDEX = 'marketplace_donation_ft'
+
+
+def create_search_index(apps, schema_editor):
+    connection = schema_editor.connection
+    if connection.vendor == 'sqlite':
+        schema_editor.execute(
+            f"CREATE VIRTUAL TABLE IF NOT EXISTS {FTS_TABLE} "
+            f"USING fts5(title, description, tokenize='unicode61 remove_diacritics 2')"
+        )
+        schema_editor.execute(
+            f"INSERT INTO {FTS_TABLE} (rowid, title, description) "
+            f"SELECT id, title, description FROM marketplace_donation"
+        )
+    elif connection.vendor == 'mysql':
+        schema_editor.execute(
+            f"ALTER TABLE marketplace_donation "
+            f"ADD FULLTEXT INDEX {FULLTEXT_INDEX} (title, description)"
+        )
+
+
+def drop_search_index(apps, schema_editor):
+    connection = schema_editor.connection
+    if connection.vendor == 'sqlite':
+        schema_editor.execute(f"DROP TABLE IF EXISTS {FTS_TABLE}")
+    elif connection.vendor == 'mysql':
+        schema_editor.execute(
+            f"ALTER TABLE marketplace_donation DROP INDEX {FULLTEXT_INDEX}"
+        )
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('marketplace', '0009_add_beneficiary_to_donation'),
+    ]
+
+    operations = [
+        migrations.RunPython(create_search_index, drop_search_index),
+    ]
@@ -0,0 +1,39 @@
+# Generated by Django 5.2.8 on 2026-10-18 09:00
+
+from django.conf import settings
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('marketplace', '0010_donation_fulltext_index'),
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+    ]
+
+    operations = [
+        migrations.AddIndex(
+            model_name='delivery',
+            index=models.Index(fields=['driver', 'status', 'created_at'], name='delivery_driver_status_created'),
+        ),
+        migrations.AddIndex(
+            model_name='donation',
+            index=models.Index(fields=['created_at', 'is_available', 'status'], name='donation_created_avail_status'),
+        ),
+        migrations.AddIndex(
+            model_name='donation',
+            index=models.Index(fields=['status', 'created_at'], name='donation_status_created'),
+        ),
+        migrations.AddIndex(
+            model_name='donationrequest',
+            index=models.Index(fields=['status', 'created_at'], name='request_status_created'),
+        ),
+        migrations.AddIndex(
+            model_name='donationrequest',
+            index=models.Index(fields=['donation', 'status'], name='request_donation_status'),
+        ),
+        migrations.AddIndex(
+            model_name='message',
+            index=models.Index(fields=['donation', 'sender', 'recipient', 'created_at'], name='message_conversation_created'),
+        ),
+    ]
@@ -0,0 +1,41 @@
+# Generated by Django 5.2.8 on 2026-10-18 10:12
+
+import django.db.models.deletion
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('marketplace', '0011_hot_query_indexes'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='DonationTerm',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('term', models.CharField(max_length=40)),
+                ('weight', models.FloatField()),
+                ('donation', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='terms', to='marketplace.donation')),
+            ],
+            options={
+                'indexes': [models.Index(fields=['term', 'donation'], name='donationterm_term_donation')],
+                'unique_together': {('donation', 'term')},
+            },
+        ),
+        migrations.CreateModel(
+            name='RelatedDonation',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('score', models.FloatField()),
+                ('donation', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='neighbours', to='marketplace.donation')),
+                ('related', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='neighbour_of', to='marketplace.donation')),
+            ],
+            options={
+                'ordering': ['-score'],
+                'indexes': [models.Index(fields=['donation', '-score'], name='related_donation_score')],
+                'unique_together': {('donation', 'related')},
+            },
+        ),
+    ]
@@ -0,0 +1,48 @@
+# Generated by Django 5.2.8 on 2026-10-18 11:02
+
+from django.db import migrations, models
+
+from marketplace import geo
+
+
+def fill_geohashes(apps, schema_editor):
+    CollectionPoint = apps.get_model('marketplace', 'CollectionPoint')
+    Donation = apps.get_model('marketplace', 'Donation')
+
+    points = {}
+    for point in CollectionPoint.objects.all():
+        point.geohash = geo.encode(point.latitude, point.longitude)
+        point.save(update_fields=['geohash'])
+        points[point.pk] = point.geohash
+
+    batch = []
+    donations = Donation.objects.only('pk', 'pickup_latitude', 'pickup_longitude', 'collection_point_id')
+    for donation in donations.iterator(chunk_size=1000):
+        if donation.pickup_latitude is not None and donation.pickup_longitude is not None:
+            donation.geohash = geo.encode(donation.pickup_latitude, donation.pickup_longitude)
+        else:
+            donation.geohash = points.get(donation.collection_point_id, '')
+        if donation.geohash:
+            batch.append(donation)
+    Donation.objects.bulk_update(batch, ['geohash'], batch_size=1000)
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('marketplace', '0012_related_donations_index'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='collectionpoint',
+            name='geohash',
+            field=models.CharField(blank=True, db_index=True, editable=False, max_length=12),
+        ),
+        migrations.AddField(
+            model_name='donation',
+            name='geohash',
+            field=models.CharField(blank=True, db_index=True, editable=False, max_length=12),
+        ),
+        migrations.RunPython(fill_geohashes, migrations.RunPython.noop),
+    ]
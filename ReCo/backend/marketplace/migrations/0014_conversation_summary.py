@@ -0,0 +1,65 @@
+# Generated by Django 5.2.8 on 2026-10-18 13:25
+
+import django.db.models.deletion
+from django.conf import settings
+from django.db import migrations, models
+
+
+def fill_conversations(apps, schema_editor):
+    Conversation = apps.get_model('marketplace', 'Conversation')
+    Message = apps.get_model('marketplace', 'Message')
+
+    # Até aqui nada marcava mensagens como lidas: o histórico conta como lido
+    Message.objects.filter(read=False).update(read=True)
+
+    summaries = {}
+    messages = Message.objects.order_by('id').values_list(
+        'id', 'donation_id', 'sender_id', 'recipient_id', 'created_at',
+    )
+    for pk, donation_id, sender_id, recipient_id, created_at in messages.iterator(chunk_size=2000):
+        user_a, user_b = sorted((sender_id, recipient_id))
+        summaries[(donation_id, user_a, user_b)] = (pk, created_at)
+
+    Conversation.objects.bulk_create(
+        [
+            Conversation(
+                donation_id=donation_id,
+                user_a_id=user_a,
+                user_b_id=user_b,
+                last_message_id=last_message_id,
+                last_activity=last_activity,
+            )
+            for (donation_id, user_a, user_b), (last_message_id, last_activity) in summaries.items()
+        ],
+        batch_size=2000,
+    )
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('marketplace', '0013_geohash_proximity_index'),
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='Conversation',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('last_activity', models.DateTimeField()),
+                ('unread_a', models.PositiveIntegerField(default=0)),
+                ('unread_b', models.PositiveIntegerField(default=0)),
+                ('donation', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='conversations', to='marketplace.donation')),
+                ('last_message', models.ForeignKey(blank=True, null=True, on_delete=django.db.models.deletion.SET_NULL, related_name='+', to='marketplace.message')),
+                ('user_a', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='conversations_as_a', to=settings.AUTH_USER_MODEL)),
+                ('user_b', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='conversations_as_b', to=settings.AUTH_USER_MODEL)),
+            ],
+            options={
+                'ordering': ['-last_activity'],
+                'indexes': [models.Index(fields=['user_a', '-last_activity'], name='conversation_a_activity'), models.Index(fields=['user_b', '-last_activity'], name='conversation_b_activity')],
+                'unique_together': {('donation', 'user_a', 'user_b')},
+            },
+        ),
+        migrations.RunPython(fill_conversations, migrations.RunPython.noop),
+    ]
@@ -0,0 +1,62 @@
+# Generated by Django 5.2.8 on 2026-10-18 14:40
+
+from collections import Counter
+
+from django.db import migrations, models
+from django.db.models import Count
+from django.db.models.functions import TruncDate
+
+
+def fill_daily_stats(apps, schema_editor):
+    DailyStats = apps.get_model('marketplace', 'DailyStats')
+    Donation = apps.get_model('marketplace', 'Donation')
+    DonationRequest = apps.get_model('marketplace', 'DonationRequest')
+
+    buckets = Counter()
+    donations = (
+        Donation.objects.values_list(TruncDate('created_at'), 'status', 'condition', 'city')
+        .annotate(n=Count('id')).order_by()
+    )
+    for day, status, condition, city, n in donations:
+        buckets[('donation', day, status, condition or '', (city or '').strip())] += n
+    requests = (
+        DonationRequest.objects.values_list(TruncDate('created_at'), 'status')
+        .annotate(n=Count('id')).order_by()
+    )
+    for day, status, n in requests:
+        buckets[('request', day, status, '', '')] += n
+
+    DailyStats.objects.bulk_create(
+        [
+            DailyStats(kind=kind, day=day, status=status, condition=condition, city=city, count=count)
+            for (kind, day, status, condition, city), count in buckets.items()
+        ],
+        batch_size=1000,
+    )
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('marketplace', '0014_conversation_summary'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='DailyStats',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('kind', models.CharField(choices=[('donation', 'Doação'), ('request', 'Solicitação')], max_length=10)),
+                ('day', models.DateField()),
+                ('status', models.CharField(max_length=20)),
+                ('condition', models.CharField(blank=True, max_length=10)),
+                ('city', models.CharField(blank=True, max_length=100)),
+                ('count', models.IntegerField(default=0)),
+            ],
+            options={
+                'indexes': [models.Index(fields=['kind', 'day'], name='dailystats_kind_day')],
+                'unique_together': {('kind', 'day', 'status', 'condition', 'city')},
+            },
+        ),
+        migrations.RunPython(fill_daily_stats, migrations.RunPython.noop),
+    ]
@@ -0,0 +1,39 @@
+# Generated by Django 5.2.8 on 2026-10-18 15:10
+
+import django.db.models.deletion
+import marketplace.models
+from django.conf import settings
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('marketplace', '0015_daily_stats_rollup'),
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='BackgroundJob',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('kind', models.CharField(max_length=50)),
+                ('params', models.JSONField(blank=True, default=dict)),
+                ('params_hash', models.CharField(max_length=64)),
+                ('status', models.CharField(choices=[('pendente', 'Na fila'), ('executando', 'Em execução'), ('concluido', 'Concluído'), ('erro', 'Erro')], default='pendente', max_length=20)),
+                ('progress', models.PositiveSmallIntegerField(default=0)),
+                ('file', models.FileField(blank=True, upload_to=marketplace.models.job_upload_to)),
+                ('error', models.TextField(blank=True)),
+                ('created_at', models.DateTimeField(auto_now_add=True)),
+                ('started_at', models.DateTimeField(blank=True, null=True)),
+                ('finished_at', models.DateTimeField(blank=True, null=True)),
+                ('requested_by', models.ForeignKey(blank=True, null=True, on_delete=django.db.models.deletion.SET_NULL, related_name='background_jobs', to=settings.AUTH_USER_MODEL)),
+            ],
+            options={
+                'ordering': ['-created_at'],
+                'indexes': [models.Index(fields=['status', 'created_at'], name='job_status_created')],
+                'constraints': [models.UniqueConstraint(condition=models.Q(('status__in', ['pendente', 'executando'])), fields=('kind', 'params_hash'), name='job_active_unique')],
+            },
+        ),
+    ]
@@ -0,0 +1,41 @@
+# Generated by Django 5.2.8 on 2026-10-18 17:05
+
+from django.db import migrations, models
+from django.db.models import F
+
+
+def fill_updated_at(apps, schema_editor):
+    # Doações existentes: a última alteração conhecida é a criação
+    Donation = apps.get_model('marketplace', 'Donation')
+    Donation.objects.update(updated_at=F('created_at'))
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('marketplace', '0016_background_job'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='ExportWatermark',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('dataset', models.CharField(max_length=50, unique=True)),
+                ('exported_until', models.DateTimeField()),
+                ('rows', models.PositiveIntegerField(default=0, verbose_name='Linhas na última exportação')),
+                ('updated_at', models.DateTimeField(auto_now=True)),
+            ],
+            options={
+                'verbose_name': "Marca d'água de exportação",
+                'verbose_name_plural': "Marcas d'água de exportação",
+                'ordering': ['dataset'],
+            },
+        ),
+        migrations.AddField(
+            model_name='donation',
+            name='updated_at',
+            field=models.DateTimeField(auto_now=True, db_index=True),
+        ),
+        migrations.RunPython(fill_updated_at, migrations.RunPython.noop),
+    ]
@@ -0,0 +1,33 @@
+# Generated by Django 5.2.8 on 2026-10-18 18:20
+
+from django.db import migrations, models
+from django.db.models import F, Min
+
+
+def fill_active_key(apps, schema_editor):
+    # Tarefas ainda na fila ou em execução passam a ocupar a chave. No MySQL o
+    # índice parcial não existia: se houver duplicadas, só a mais antiga fica
+    BackgroundJob = apps.get_model('marketplace', 'BackgroundJob')
+    active = BackgroundJob.objects.filter(status__in=['pendente', 'executando'])
+    first_ids = active.values('params_hash').annotate(first=Min('id')).values_list('first', flat=True)
+    BackgroundJob.objects.filter(pk__in=list(first_ids)).update(active_key=F('params_hash'))
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('marketplace', '0017_donation_updated_at_export_watermark'),
+    ]
+
+    operations = [
+        migrations.RemoveConstraint(
+            model_name='backgroundjob',
+            name='job_active_unique',
+        ),
+        migrations.AddField(
+            model_name='backgroundjob',
+            name='active_key',
+            field=models.CharField(blank=True, editable=False, max_length=64, null=True, unique=True),
+        ),
+        migrations.RunPython(fill_active_key, migrations.RunPython.noop),
+    ]
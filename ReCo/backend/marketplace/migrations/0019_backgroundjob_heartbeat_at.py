@@ -0,0 +1,26 @@
+# Generated by Django 5.2.8 on 2026-10-18 19:05
+
+from django.db import migrations, models
+from django.db.models import F
+
+
+def fill_heartbeat(apps, schema_editor):
+    # Tarefas em execução começam com o sinal de vida do início
+    BackgroundJob = apps.get_model('marketplace', 'BackgroundJob')
+    BackgroundJob.objects.filter(status='executando').update(heartbeat_at=F('started_at'))
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('marketplace', '0018_backgroundjob_active_key'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='backgroundjob',
+            name='heartbeat_at',
+            field=models.DateTimeField(blank=True, null=True),
+        ),
+        migrations.RunPython(fill_heartbeat, migrations.RunPython.noop),
+    ]
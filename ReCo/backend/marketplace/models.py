@@ -1,6 +1,10 @@
+import uuid
+
 from django.db import models
 from django.conf import settings
 
+from . import geo
+
 class Donation(models.Model):
     CONDITION_CHOICES = [
         ('novo', 'Novo'),
@@ -16,6 +20,9 @@ class Donation(models.Model):
         ('cancelada', 'Cancelada'),
         ('reciclagem', 'Para Reciclagem'),
     ]
+
+    # Status exibidos na listagem pública
+    PUBLIC_STATUSES = ['aprovada', 'entregue']
     
     DELIVERY_TYPE_CHOICES = [
         ('coleta', 'Ponto de Coleta'),
@@ -30,6 +37,8 @@ class Donation(models.Model):
     contact_phone = models.CharField(max_length=30, blank=True)
     donor = models.ForeignKey(settings.AUTH_USER_MODEL, on_delete=models.CASCADE, related_name='donations')
     created_at = models.DateTimeField(auto_now_add=True)
+    # Base das exportações incrementais (ver analytics.py)
+    updated_at = models.DateTimeField(auto_now=True, db_index=True)
     is_available = models.BooleanField(default=True)
     image = models.ImageField(upload_to='donations/', blank=True, null=True)
     
@@ -45,13 +54,72 @@ class Donation(models.Model):
     pickup_address = models.CharField("Endereço para retirada", max_length=300, blank=True)
     pickup_latitude = models.FloatField(null=True, blank=True)
     pickup_longitude = models.FloatField(null=True, blank=True)
+    # Geohash da localização (retirada ou ponto de coleta) para busca por proximidade
+    geohash = models.CharField(max_length=12, blank=True, db_index=True, editable=False)
 
     class Meta:
         ordering = ['-created_at']
+        indexes = [
+            # Listagem pública: percorre em ordem de data filtrando disponibilidade/status no próprio índice
+            models.Index(fields=['created_at', 'is_available', 'status'], name='donation_created_avail_status'),
+            # Filas por status (pendentes no painel, filtros da gestão)
+            models.Index(fields=['status', 'created_at'], name='donation_status_created'),
+        ]
 
     def __str__(self):
         return f"{self.title} — {self.get_status_display()}"
 
+    def location(self):
+        """(lat, lng) do endereço de retirada ou do ponto de coleta, se houver"""
+        if self.pickup_latitude is not None and self.pickup_longitude is not None:
+            return self.pickup_latitude, self.pickup_longitude
+        if self.collection_point_id:
+            return self.collection_point.latitude, self.collection_point.longitude
+        return None
+
+    def save(self, *args, **kwargs):
+        point = self.location()
+        self.geohash = geo.encode(*point) if point else ''
+        update_fields = kwargs.get('update_fields')
+        if update_fields is not None:
+            # geohash é derivado e updated_at marca a alteração: sempre gravados juntos
+            missing = [name for name in ('geohash', 'updated_at') if name not in update_fields]
+            kwargs['update_fields'] = list(update_fields) + missing
+        super().save(*args, **kwargs)
+
+
+class DonationTerm(models.Model):
+    """Termo do título/descrição de uma doação com peso TF normalizado (índice invertido)"""
+    donation = models.ForeignKey(Donation, on_delete=models.CASCADE, related_name='terms')
+    term = models.CharField(max_length=40)
+    weight = models.FloatField()
+
+    class Meta:
+        unique_together = ('donation', 'term')
+        indexes = [
+            models.Index(fields=['term', 'donation'], name='donationterm_term_donation'),
+        ]
+
+    def __str__(self):
+        return f"{self.term} ({self.weight:.3f}) em #{self.donation_id}"
+
+
+class RelatedDonation(models.Model):
+    """Vizinho pré-calculado (top-k por similaridade) exibido como item relacionado"""
+    donation = models.ForeignKey(Donation, on_delete=models.CASCADE, related_name='neighbours')
+    related = models.ForeignKey(Donation, on_delete=models.CASCADE, related_name='neighbour_of')
+    score = models.FloatField()
+
+    class Meta:
+        ordering = ['-score']
+        unique_together = ('donation', 'related')
+        indexes = [
+            models.Index(fields=['donation', '-score'], name='related_donation_score'),
+        ]
+
+    def __str__(self):
+        return f"#{self.donation_id} ~ #{self.related_id} ({self.score:.3f})"
+
 
 class DonationRequest(models.Model):
     """Modelo para solicitação de uma doação por um beneficiário"""
@@ -74,6 +142,10 @@ class DonationRequest(models.Model):
     class Meta:
         ordering = ['-created_at']
         unique_together = ('donation', 'beneficiary')  # Uma solicitação por beneficiário por doação
+        indexes = [
+            models.Index(fields=['status', 'created_at'], name='request_status_created'),
+            models.Index(fields=['donation', 'status'], name='request_donation_status'),
+        ]
 
     def __str__(self):
         return f"{self.beneficiary.username} solicitou {self.donation.title} - {self.get_status_display()}"
@@ -85,6 +157,7 @@ class CollectionPoint(models.Model):
     address = models.CharField("Endereço", max_length=300)
     latitude = models.FloatField()
     longitude = models.FloatField()
+    geohash = models.CharField(max_length=12, blank=True, db_index=True, editable=False)
     opening_hours = models.CharField("Horário de funcionamento", max_length=100, help_text="ex: 08:00-17:00")
     capacity = models.IntegerField("Capacidade em itens", default=50)
     is_active = models.BooleanField(default=True)
@@ -100,6 +173,13 @@ class CollectionPoint(models.Model):
     def __str__(self):
         return f"{self.name} - {self.address}"
     
+    def save(self, *args, **kwargs):
+        self.geohash = geo.encode(self.latitude, self.longitude)
+        update_fields = kwargs.get('update_fields')
+        if update_fields is not None and 'geohash' not in update_fields:
+            kwargs['update_fields'] = list(update_fields) + ['geohash']
+        super().save(*args, **kwargs)
+
     def current_inventory(self):
         """Retorna quantidade atual de itens"""
         return self.donations.filter(status__in=['aprovada', 'em_rota']).count()
@@ -116,11 +196,54 @@ class Message(models.Model):
 
     class Meta:
         ordering = ['created_at']
+        indexes = [
+            # Histórico de uma conversa (doação + par de usuários) em ordem cronológica
+            models.Index(fields=['donation', 'sender', 'recipient', 'created_at'], name='message_conversation_created'),
+        ]
 
     def __str__(self):
         return f'Msg from {self.sender} to {self.recipient} on {self.donation}'
 
 
+class Conversation(models.Model):
+    """
+    Resumo de uma conversa (doação + par de usuários) para a caixa de entrada.
+
+    O par é gravado em ordem (user_a tem o menor id) e é atualizado na mesma
+    transação em que a mensagem é enviada.
+    """
+    donation = models.ForeignKey(Donation, on_delete=models.CASCADE, related_name='conversations')
+    user_a = models.ForeignKey(settings.AUTH_USER_MODEL, on_delete=models.CASCADE, related_name='conversations_as_a')
+    user_b = models.ForeignKey(settings.AUTH_USER_MODEL, on_delete=models.CASCADE, related_name='conversations_as_b')
+    last_message = models.ForeignKey(Message, on_delete=models.SET_NULL, null=True, blank=True, related_name='+')
+    last_activity = models.DateTimeField()
+    # Mensagens ainda não lidas por cada lado
+    unread_a = models.PositiveIntegerField(default=0)
+    unread_b = models.PositiveIntegerField(default=0)
+
+    class Meta:
+        ordering = ['-last_activity']
+        unique_together = ('donation', 'user_a', 'user_b')
+        indexes = [
+            models.Index(fields=['user_a', '-last_activity'], name='conversation_a_activity'),
+            models.Index(fields=['user_b', '-last_activity'], name='conversation_b_activity'),
+        ]
+
+    def __str__(self):
+        return f"Conversa #{self.donation_id} entre {self.user_a_id} e {self.user_b_id}"
+
+    @staticmethod
+    def pair(user_id, other_id):
+        """Ids do par na ordem gravada (user_a, user_b)"""
+        return tuple(sorted((user_id, other_id)))
+
+    def other_user(self, user):
+        return self.user_b if self.user_a_id == user.pk else self.user_a
+
+    def unread_for(self, user):
+        return self.unread_a if self.user_a_id == user.pk else self.unread_b
+
+
 class Delivery(models.Model):
     """Modelo para rastreamento de entregas"""
     STATUS_CHOICES = [
@@ -159,6 +282,10 @@ class Delivery(models.Model):
 
     class Meta:
         ordering = ['-created_at']
+        indexes = [
+            # Painel do transportador
+            models.Index(fields=['driver', 'status', 'created_at'], name='delivery_driver_status_created'),
+        ]
 
     def __str__(self):
         return f"Entrega #{self.pk} - {self.donation.title} - {self.get_status_display()}"
@@ -277,4 +404,103 @@ class RecyclingBatch(models.Model):
             'energy_saved_kwh': weight * 15,
             'water_saved_liters': weight * 500,
             'trees_preserved': weight * 0.05,
-        }
\ No newline at end of file
+        }
+
+
+class DailyStats(models.Model):
+    """Contagem diária pré-agregada por tipo × dia × status × condição × cidade (relatórios)"""
+    KIND_CHOICES = [
+        ('donation', 'Doação'),
+        ('request', 'Solicitação'),
+    ]
+
+    kind = models.CharField(max_length=10, choices=KIND_CHOICES)
+    day = models.DateField()
+    status = models.CharField(max_length=20)
+    condition = models.CharField(max_length=10, blank=True)
+    city = models.CharField(max_length=100, blank=True)
+    count = models.IntegerField(default=0)
+
+    class Meta:
+        unique_together = ('kind', 'day', 'status', 'condition', 'city')
+        indexes = [
+            models.Index(fields=['kind', 'day'], name='dailystats_kind_day'),
+        ]
+
+    def __str__(self):
+        return f"{self.get_kind_display()} {self.day} {self.status}: {self.count}"
+
+
+def job_upload_to(instance, filename):
+    # Diretório aleatório: o arquivo pode conter dados pessoais e não deve ter URL previsível
+    return f'jobs/{uuid.uuid4().hex}/{filename}'
+
+
+class BackgroundJob(models.Model):
+    """
+    Tarefa pesada (ex.: exportação de relatório) executada fora da requisição
+    pelo comando ``run_jobs``. Pedidos idênticos (mesmo tipo e parâmetros)
+    enquanto um deles está na fila ou em execução reaproveitam a mesma tarefa:
+    ``active_key`` (único) repete o params_hash só enquanto a tarefa está
+    ativa e volta a NULL quando ela termina.
+    """
+    STATUS_CHOICES = [
+        ('pendente', 'Na fila'),
+        ('executando', 'Em execução'),
+        ('concluido', 'Concluído'),
+        ('erro', 'Erro'),
+    ]
+    ACTIVE_STATUSES = ['pendente', 'executando']
+
+    kind = models.CharField(max_length=50)
+    params = models.JSONField(default=dict, blank=True)
+    # sha256 de kind + params em JSON canônico (deduplicação)
+    params_hash = models.CharField(max_length=64)
+    # params_hash enquanto ativa, NULL depois: índice único comum, sem condição
+    active_key = models.CharField(max_length=64, null=True, blank=True, unique=True, editable=False)
+    status = models.CharField(max_length=20, choices=STATUS_CHOICES, default='pendente')
+    progress = models.PositiveSmallIntegerField(default=0)
+    file = models.FileField(upload_to=job_upload_to, blank=True)
+    error = models.TextField(blank=True)
+    requested_by = models.ForeignKey(settings.AUTH_USER_MODEL, on_delete=models.SET_NULL, null=True, blank=True, related_name='background_jobs')
+    created_at = models.DateTimeField(auto_now_add=True)
+    started_at = models.DateTimeField(null=True, blank=True)
+    # Renovado pelo worker (set_progress); sem ele a tarefa volta para a fila
+    heartbeat_at = models.DateTimeField(null=True, blank=True)
+    finished_at = models.DateTimeField(null=True, blank=True)
+
+    class Meta:
+        ordering = ['-created_at']
+        indexes = [
+            models.Index(fields=['status', 'created_at'], name='job_status_created'),
+        ]
+
+    def __str__(self):
+        return f"{self.kind} #{self.pk} ({self.get_status_display()})"
+
+    def save(self, *args, **kwargs):
+        self.active_key = self.params_hash if self.is_active else None
+        super().save(*args, **kwargs)
+
+    @property
+    def is_active(self):
+        return self.status in self.ACTIVE_STATUSES
+
+
+class ExportWatermark(models.Model):
+    """
+    Até onde cada conjunto da exportação analítica já foi exportado: a próxima
+    exportação incremental leva só as linhas com updated_at posterior.
+    """
+    dataset = models.CharField(max_length=50, unique=True)
+    exported_until = models.DateTimeField()
+    rows = models.PositiveIntegerField("Linhas na última exportação", default=0)
+    updated_at = models.DateTimeField(auto_now=True)
+
+    class Meta:
+        ordering = ['dataset']
+        verbose_name = "Marca d'água de exportação"
+        verbose_name_plural = "Marcas d'água de exportação"
+
+    def __str__(self):
+        return f"{self.dataset} até {self.exported_until:%d/%m/%Y %H:%M}"
@@ -0,0 +1,161 @@
+"""
+Moderação em massa de doações e solicitações.
+
+O novo status de todos os itens selecionados é gravado com ``bulk_update``
+numa única transação. ``bulk_update`` não dispara sinais, então os derivados
+mantidos pelos receivers (DailyStats, facetas, números do painel e
+participantes do chat) são ajustados aqui. O que custa caro por item (emails
+e índice de relacionados) vai para uma única tarefa da fila, enfileirada na
+mesma transação.
+"""
+from collections import Counter
+
+from django.core import mail
+from django.db import transaction
+from django.utils import timezone
+
+from . import jobs, participants, rollups, similarity
+from .admin_stats import invalidate_admin_stats
+from .facets import invalidate_facets
+from .models import Donation, DonationRequest
+from .notifications import (
+    notify_donation_approved, notify_donation_rejected,
+    notify_request_approved, notify_request_rejected,
+)
+
+
+JOB_KIND = 'moderation_followup'
+BULK_BATCH_SIZE = 500
+
+# ação: (status de destino, status de origem aceitos)
+DONATION_ACTIONS = {
+    'approve': ('aprovada', ['pendente']),
+    'cancel': ('cancelada', ['pendente', 'aprovada']),
+}
+REQUEST_ACTIONS = {
+    'approve': ('aprovada', ['pendente']),
+    'reject': ('rejeitada', ['pendente']),
+}
+
+DEFAULT_CANCEL_REASON = 'Cancelada pelo administrador'
+DEFAULT_REJECT_REASON = 'Rejeitada pelo administrador'
+
+
+def moderate_donations(ids, action, user, reason=''):
+    """Aplica ``action`` às doações ``ids`` que aceitam a transição. Retorna quantas mudaram."""
+    new_status, allowed = DONATION_ACTIONS[action]
+    now = timezone.now()
+    with transaction.atomic():
+        donations = list(
+            Donation.objects.select_for_update()
+            .filter(pk__in=ids, status__in=allowed)
+            .only('pk', 'status', 'condition', 'city', 'created_at')
+        )
+        if not donations:
+            return 0
+        moves = Counter()
+        for donation in donations:
+            old_key = rollups.donation_key(donation.created_at, donation.status, donation.condition, donation.city)
+            donation.status = new_status
+            donation.updated_at = now
+            if new_status == 'aprovada':
+                donation.approved_by = user
+                donation.approved_at = now
+            moves[(old_key, rollups.donation_key(donation.created_at, new_status, donation.condition, donation.city))] += 1
+        fields = ['status', 'updated_at']
+        if new_status == 'aprovada':
+            fields += ['approved_by', 'approved_at']
+        Donation.objects.bulk_update(donations, fields, batch_size=BULK_BATCH_SIZE)
+        rollups.move_many(moves)
+        jobs.enqueue(JOB_KIND, {
+            'model': 'donation',
+            'action': action,
+            'ids': sorted(donation.pk for donation in donations),
+            'reason': reason,
+        }, user=user)
+
+    invalidate_facets()
+    invalidate_admin_stats()
+    return len(donations)
+
+
+def moderate_requests(ids, action, user, reason=''):
+    """Aplica ``action`` às solicitações ``ids`` ainda pendentes. Retorna quantas mudaram."""
+    new_status, allowed = REQUEST_ACTIONS[action]
+    reason = reason or DEFAULT_REJECT_REASON
+    now = timezone.now()
+    with transaction.atomic():
+        donation_requests = list(
+            DonationRequest.objects.select_for_update()
+            .filter(pk__in=ids, status__in=allowed)
+            .only('pk', 'donation_id', 'status', 'created_at')
+        )
+        if not donation_requests:
+            return 0
+        moves = Counter()
+        for donation_request in donation_requests:
+            old_key = rollups.request_key(donation_request.created_at, donation_request.status)
+            donation_request.status = new_status
+            donation_request.updated_at = now
+            donation_request.approved_by = user
+            if new_status == 'rejeitada':
+                donation_request.rejection_reason = reason
+            moves[(old_key, rollups.request_key(donation_request.created_at, new_status))] += 1
+        fields = ['status', 'updated_at', 'approved_by']
+        if new_status == 'rejeitada':
+            fields.append('rejection_reason')
+        DonationRequest.objects.bulk_update(donation_requests, fields, batch_size=BULK_BATCH_SIZE)
+        rollups.move_many(moves)
+        jobs.enqueue(JOB_KIND, {
+            'model': 'request',
+            'action': action,
+            'ids': sorted(donation_request.pk for donation_request in donation_requests),
+            'reason': reason,
+        }, user=user)
+
+    # Aprovação/rejeição muda quem pode conversar no anúncio
+    for donation_id in {donation_request.donation_id for donation_request in donation_requests}:
+        participants.invalidate(donation_id)
+    invalidate_admin_stats()
+    return len(donation_requests)
+
+
+@jobs.register(JOB_KIND)
+def moderation_followup(job):
+    """
+    Notifica os envolvidos (uma conexão SMTP para o lote) e, para doações,
+    atualiza o índice de relacionados. Itens que mudaram de status desde a
+    moderação são ignorados.
+    """
+    params = job.params
+    reason = params.get('reason', '')
+    if params['model'] == 'donation':
+        new_status, _ = DONATION_ACTIONS[params['action']]
+        items = Donation.objects.filter(pk__in=params['ids'], status=new_status).select_related('donor')
+        if params['action'] == 'approve':
+            def notify(donation, connection):
+                notify_donation_approved(donation, connection=connection)
+        else:
+            def notify(donation, connection):
+                notify_donation_rejected(donation, reason or DEFAULT_CANCEL_REASON, connection=connection)
+    else:
+        new_status, _ = REQUEST_ACTIONS[params['action']]
+        items = DonationRequest.objects.filter(pk__in=params['ids'], status=new_status).select_related(
+            'donation', 'beneficiary',
+        )
+        if params['action'] == 'approve':
+            def notify(donation_request, connection):
+                notify_request_approved(donation_request, connection=connection)
+        else:
+            def notify(donation_request, connection):
+                notify_request_rejected(donation_request, reason or DEFAULT_REJECT_REASON, connection=connection)
+
+    items = list(items)
+    with mail.get_connection() as connection:
+        for done, item in enumerate(items, start=1):
+            notify(item, connection)
+            if params['model'] == 'donation':
+                # Aprovar/cancelar muda a visibilidade no índice de relacionados
+                similarity.refresh_related(item)
+            jobs.set_progress(job, done * 100 // len(items))
+    return None
@@ -7,7 +7,7 @@ from django.conf import settings
 from django.utils.html import strip_tags
 
 
-def send_email_notification(subject, template_name, context, recipient_email):
+def send_email_notification(subject, template_name, context, recipient_email, connection=None):
     """
     Envia email com base em um template
     
@@ -16,6 +16,7 @@ def send_email_notification(subject, template_name, context, recipient_email):
         template_name: Nome do template HTML (ex: 'email/donation_approved.html')
         context: Dicionário com dados para o template
         recipient_email: Email do destinatário
+        connection: Conexão de email aberta para reaproveitar em envios em lote
     """
     try:
         # Renderizar o template HTML
@@ -31,6 +32,7 @@ def send_email_notification(subject, template_name, context, recipient_email):
             recipient_list=[recipient_email],
             html_message=html_message,
             fail_silently=False,
+            connection=connection,
         )
         return True
     except Exception as e:
@@ -38,7 +40,7 @@ def send_email_notification(subject, template_name, context, recipient_email):
         return False
 
 
-def notify_donation_approved(donation):
+def notify_donation_approved(donation, connection=None):
     """Notifica doador que sua doação foi aprovada"""
     context = {
         'donor_name': donation.donor.get_full_name() or donation.donor.username,
@@ -51,10 +53,11 @@ def notify_donation_approved(donation):
         template_name='email/donation_approved.html',
         context=context,
         recipient_email=donation.donor.email,
+        connection=connection,
     )
 
 
-def notify_donation_rejected(donation, rejection_reason=''):
+def notify_donation_rejected(donation, rejection_reason='', connection=None):
     """Notifica doador que sua doação foi rejeitada"""
     context = {
         'donor_name': donation.donor.get_full_name() or donation.donor.username,
@@ -67,10 +70,11 @@ def notify_donation_rejected(donation, rejection_reason=''):
         template_name='email/donation_rejected.html',
         context=context,
         recipient_email=donation.donor.email,
+        connection=connection,
     )
 
 
-def notify_request_approved(donation_request):
+def notify_request_approved(donation_request, connection=None):
     """Notifica beneficiário que sua solicitação foi aprovada"""
     context = {
         'beneficiary_name': donation_request.beneficiary.get_full_name() or donation_request.beneficiary.username,
@@ -83,10 +87,11 @@ def notify_request_approved(donation_request):
         template_name='email/request_approved.html',
         context=context,
         recipient_email=donation_request.beneficiary.email,
+        connection=connection,
     )
 
 
-def notify_request_rejected(donation_request, rejection_reason=''):
+def notify_request_rejected(donation_request, rejection_reason='', connection=None):
     """Notifica beneficiário que sua solicitação foi rejeitada"""
     context = {
         'beneficiary_name': donation_request.beneficiary.get_full_name() or donation_request.beneficiary.username,
@@ -98,6 +103,7 @@ def notify_request_rejected(donation_request, rejection_reason=''):
         template_name='email/request_rejected.html',
         context=context,
         recipient_email=donation_request.beneficiary.email,
+        connection=connection,
     )
 
 
@@ -0,0 +1,173 @@
+"""
+Paginação por cursor (keyset) para listagens longas.
+
+Em vez de OFFSET, cada página guarda os valores das colunas de ordenação do
+último item e a próxima página filtra "depois desse item". Assim a consulta
+usa o índice da ordenação e as páginas não se deslocam quando novos registros
+são publicados.
+"""
+import base64
+import bisect
+import json
+from datetime import date, datetime
+
+from django.core.exceptions import ValidationError
+from django.db.models import Q
+from django.utils.dateparse import parse_date, parse_datetime
+
+
+DEFAULT_PAGE_SIZE = 24
+MAX_PAGE_SIZE = 100
+
+
+class KeysetPage:
+    """Resultado de uma página: itens e cursor para a próxima"""
+
+    def __init__(self, items, next_cursor=None):
+        self.items = items
+        self.next_cursor = next_cursor
+
+    @property
+    def has_next(self):
+        return self.next_cursor is not None
+
+    def __iter__(self):
+        return iter(self.items)
+
+    def __len__(self):
+        return len(self.items)
+
+    def __bool__(self):
+        return bool(self.items)
+
+
+def _encode_value(value):
+    if isinstance(value, datetime):
+        return {'dt': value.isoformat()}
+    if isinstance(value, date):
+        return {'d': value.isoformat()}
+    return value
+
+
+def _decode_value(value):
+    """Inverso de _encode_value; ValueError para valores que ele não produziria"""
+    if isinstance(value, dict):
+        if 'dt' in value:
+            value = parse_datetime(value['dt'])
+        elif 'd' in value:
+            value = parse_date(value['d'])
+        else:
+            raise ValueError('cursor inválido')
+        if value is None:
+            raise ValueError('cursor inválido')
+        return value
+    if not isinstance(value, (str, int, float)):
+        raise ValueError('cursor inválido')
+    return value
+
+
+def encode_cursor(values):
+    """Serializa os valores das chaves do último item em um token para URL"""
+    payload = json.dumps([_encode_value(v) for v in values], separators=(',', ':'))
+    return base64.urlsafe_b64encode(payload.encode()).decode().rstrip('=')
+
+
+def decode_cursor(token, size):
+    """Decodifica o token; retorna None se inválido ou de outra ordenação"""
+    if not token:
+        return None
+    try:
+        padded = token + '=' * (-len(token) % 4)
+        values = json.loads(base64.urlsafe_b64decode(padded.encode()).decode())
+        if not isinstance(values, list) or len(values) != size:
+            return None
+        # Token vem da URL: datas fora do intervalo ou tipos adulterados não chegam à consulta
+        return [_decode_value(v) for v in values]
+    except (ValueError, TypeError):
+        return None
+
+
+def _after(ordering, values):
+    """Monta o filtro "(k1, k2, ...) vem depois de values" respeitando a direção"""
+    condition = Q()
+    equal = Q()
+    for key, value in zip(ordering, values):
+        field = key.lstrip('-')
+        lookup = 'lt' if key.startswith('-') else 'gt'
+        condition |= equal & Q(**{f'{field}__{lookup}': value})
+        equal &= Q(**{field: value})
+    return condition
+
+
+def _coerce(queryset, ordering, values):
+    """Converte os valores do cursor para o tipo de cada coluna (campo ou anotação)"""
+    coerced = []
+    for key, value in zip(ordering, values):
+        name = key.lstrip('-')
+        if name in queryset.query.annotations:
+            field = queryset.query.annotations[name].output_field
+        else:
+            field = queryset.model._meta.get_field(name)
+        coerced.append(field.to_python(value))
+    return coerced
+
+
+def _key_value(item, key):
+    return getattr(item, key.lstrip('-'))
+
+
+def paginate_keyset(queryset, ordering, cursor=None, page_size=DEFAULT_PAGE_SIZE):
+    """
+    Retorna uma KeysetPage do queryset ordenado por ``ordering``.
+
+    ``ordering`` deve terminar em uma chave única (ex.: ``('-created_at', '-id')``).
+    """
+    page_size = max(1, min(int(page_size), MAX_PAGE_SIZE))
+    queryset = queryset.order_by(*ordering)
+    values = decode_cursor(cursor, len(ordering))
+    if values is not None:
+        try:
+            values = _coerce(queryset, ordering, values)
+        except (ValueError, TypeError, ValidationError):
+            # Tipo que não bate com a coluna: cursor adulterado, volta ao início
+            values = None
+    if values is not None:
+        queryset = queryset.filter(_after(ordering, values))
+
+    items = list(queryset[:page_size + 1])
+    next_cursor = None
+    if len(items) > page_size:
+        items = items[:page_size]
+        next_cursor = encode_cursor([_key_value(items[-1], key) for key in ordering])
+    return KeysetPage(items, next_cursor)
+
+
+def _same_kind(value, key):
+    """O valor do cursor é comparável com a chave da lista (números entre si)"""
+    if isinstance(key, (int, float)) and not isinstance(key, bool):
+        return isinstance(value, (int, float)) and not isinstance(value, bool)
+    return isinstance(value, type(key))
+
+
+def paginate_sequence(items, key, cursor=None, page_size=DEFAULT_PAGE_SIZE):
+    """
+    KeysetPage de uma lista já ordenada em Python (ex.: por distância).
+
+    ``key(item)`` deve devolver uma tupla crescente e única ao longo da lista;
+    o cursor guarda a chave do último item exibido, como em paginate_keyset.
+    """
+    page_size = max(1, min(int(page_size), MAX_PAGE_SIZE))
+    if not items:
+        return KeysetPage([])
+    keys = [tuple(key(item)) for item in items]
+    values = decode_cursor(cursor, len(keys[0]))
+    if values is not None and not all(map(_same_kind, values, keys[0])):
+        # Cursor adulterado ou de outra ordenação: volta ao início
+        values = None
+    start = bisect.bisect_right(keys, tuple(values)) if values is not None else 0
+
+    page = items[start:start + page_size]
+    next_cursor = None
+    if start + page_size < len(items):
+        next_cursor = encode_cursor(list(keys[start + page_size - 1]))
+    return KeysetPage(page, next_cursor)
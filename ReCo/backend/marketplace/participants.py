@@ -0,0 +1,52 @@
+"""
+Conjunto em cache dos participantes de chat de cada doação.
+
+Participantes são os beneficiários com solicitação aprovada e quem já trocou
+mensagens no anúncio (exceto o doador). A autorização de cada chamada do chat
+vira uma leitura de cache; o conjunto é invalidado quando uma solicitação
+muda e quando uma mensagem traz alguém que ainda não estava nele.
+"""
+from django.core.cache import cache
+from django.db import transaction
+
+from .models import Conversation, DonationRequest
+
+
+CACHE_TIMEOUT = 60 * 60
+
+
+def _key(donation_id):
+    return f'marketplace:chat_participants:{donation_id}'
+
+
+def participant_ids(donation):
+    """frozenset com os ids dos participantes da doação"""
+    key = _key(donation.pk)
+    ids = cache.get(key)
+    if ids is None:
+        ids = set(
+            DonationRequest.objects.filter(donation_id=donation.pk, status='aprovada')
+            .values_list('beneficiary_id', flat=True)
+        )
+        for user_a, user_b in Conversation.objects.filter(donation_id=donation.pk).values_list('user_a_id', 'user_b_id'):
+            ids.update((user_a, user_b))
+        ids.discard(donation.donor_id)
+        ids = frozenset(ids)
+        cache.set(key, ids, CACHE_TIMEOUT)
+    return ids
+
+
+def invalidate(donation_id):
+    cache.delete(_key(donation_id))
+
+
+def message_sent(message, donor_id):
+    """
+    Após o commit, invalida o conjunto se a mensagem trouxe um participante
+    novo. Apagar (em vez de acrescentar) evita perder ids em envios simultâneos.
+    """
+    def check():
+        cached = cache.get(_key(message.donation_id))
+        if cached is not None and not ({message.sender_id, message.recipient_id} - {donor_id}) <= cached:
+            invalidate(message.donation_id)
+    transaction.on_commit(check)
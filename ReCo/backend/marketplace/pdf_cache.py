@@ -0,0 +1,80 @@
+"""
+Cache em disco de PDFs gerados, endereçado pelo conteúdo.
+
+O nome do arquivo é o sha256 dos números usados no documento (período e
+indicadores): se nada mudou, o PDF já renderizado é servido direto do disco e
+o mesmo hash vira o ETag. Ao passar de MAX_ENTRIES arquivos, os menos usados
+(mtime mais antigo; cada acerto atualiza o mtime) são apagados.
+"""
+import hashlib
+import json
+import os
+import tempfile
+
+from django.conf import settings
+
+
+MAX_ENTRIES = 64
+
+
+def cache_dir():
+    return os.path.join(settings.MEDIA_ROOT, 'cache', 'reports')
+
+
+def content_hash(figures):
+    payload = json.dumps(figures, sort_keys=True, separators=(',', ':'), default=str)
+    return hashlib.sha256(payload.encode('utf-8')).hexdigest()
+
+
+def get_or_render(figures, render):
+    """
+    (caminho, hash) do PDF para ``figures``; chama ``render(figures)`` (bytes)
+    só se ainda não houver arquivo para esses números.
+    """
+    digest = content_hash(figures)
+    directory = cache_dir()
+    path = os.path.join(directory, f'{digest}.pdf')
+    try:
+        os.utime(path)
+        return path, digest
+    except FileNotFoundError:
+        pass
+
+    os.makedirs(directory, exist_ok=True)
+    content = render(figures)
+    # Escreve em arquivo temporário e renomeia: quem lê nunca vê PDF pela metade
+    fd, tmp_path = tempfile.mkstemp(dir=directory, suffix='.tmp')
+    try:
+        with os.fdopen(fd, 'wb') as fh:
+            fh.write(content)
+        os.replace(tmp_path, path)
+    except BaseException:
+        os.unlink(tmp_path)
+        raise
+    evict(keep=path)
+    return path, digest
+
+
+def evict(keep=None):
+    """Apaga os PDFs menos usados além de MAX_ENTRIES. Retorna quantos apagou."""
+    directory = cache_dir()
+    entries = []
+    with os.scandir(directory) as it:
+        for entry in it:
+            if entry.name.endswith('.pdf') and entry.path != keep:
+                try:
+                    entries.append((entry.stat().st_mtime, entry.path))
+                except FileNotFoundError:
+                    continue
+    excess = len(entries) + (keep is not None) - MAX_ENTRIES
+    if excess <= 0:
+        return 0
+    entries.sort()
+    removed = 0
+    for _, path in entries[:excess]:
+        try:
+            os.unlink(path)
+            removed += 1
+        except FileNotFoundError:
+            pass
+    return removed
@@ -0,0 +1,75 @@
+"""
+Pub/sub em memória para acordar conexões SSE do chat.
+
+Cada conexão aberta assina o canal da sua conversa e recebe uma fila asyncio;
+``publish`` pode ser chamado de qualquer thread (views síncronas rodam em
+threads sob ASGI) e entrega via ``call_soon_threadsafe`` no loop do assinante.
+
+O aviso é só um "acorde": o stream sempre relê as mensagens no banco a partir
+do último id enviado. Com vários processos, quem está em outro processo não
+recebe o aviso e percebe a mensagem no próximo heartbeat.
+"""
+import asyncio
+import threading
+from collections import defaultdict
+
+
+_lock = threading.Lock()
+_subscribers = defaultdict(set)
+
+
+def conversation_channel(donation_id, user_a, user_b):
+    """Canal de uma conversa (doação + par de usuários, em qualquer ordem)"""
+    low, high = sorted((int(user_a), int(user_b)))
+    return f'chat:{donation_id}:{low}:{high}'
+
+
+class Subscription:
+    def __init__(self, channel):
+        self.channel = channel
+        self.loop = asyncio.get_running_loop()
+        self.queue = asyncio.Queue()
+
+    def _deliver(self, payload):
+        self.loop.call_soon_threadsafe(self.queue.put_nowait, payload)
+
+    async def wait(self, timeout):
+        """Próximo aviso ou None se o tempo esgotar"""
+        try:
+            return await asyncio.wait_for(self.queue.get(), timeout)
+        except asyncio.TimeoutError:
+            return None
+
+    def close(self):
+        with _lock:
+            subscribers = _subscribers.get(self.channel)
+            if subscribers is not None:
+                subscribers.discard(self)
+                if not subscribers:
+                    del _subscribers[self.channel]
+
+
+def subscribe(channel):
+    """Assina o canal; deve ser chamado dentro do loop da conexão"""
+    subscription = Subscription(channel)
+    with _lock:
+        _subscribers[channel].add(subscription)
+    return subscription
+
+
+def publish(channel, payload=None):
+    """Avisa os assinantes do canal. Retorna quantos foram avisados."""
+    with _lock:
+        subscribers = list(_subscribers.get(channel, ()))
+    for subscription in subscribers:
+        try:
+            subscription._deliver(payload)
+        except RuntimeError:
+            # Loop já encerrado: a conexão está sendo fechada
+            subscription.close()
+    return len(subscribers)
+
+
+def subscriber_count(channel):
+    with _lock:
+        return len(_subscribers.get(channel, ()))
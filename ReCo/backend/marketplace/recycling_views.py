@@ -8,6 +8,8 @@ from django.contrib import messages
 from django.db.models import Sum, Count
 from django.utils import timezone
 from datetime import datetime, timedelta
+from . import rollups
+from .admin_stats import invalidate_admin_stats
 from .models import RecyclingBatch, RecyclingPartner, Donation
 from .notifications import send_recycling_notification
 
@@ -92,8 +94,10 @@ def create_batch(request):
             batch.items.set(items)
             batch.update_estimated_weight()
             
-            # Atualizar status dos itens
-            items.update(status='em_rota')  # Em rota para reciclagem
+            # Atualizar status dos itens (mantendo os contadores dos relatórios)
+            rollups.bulk_status_change(items, 'em_rota')  # Em rota para reciclagem
+            # update() em massa não dispara sinais
+            invalidate_admin_stats()
         
         messages.success(request, f'Lote {batch.batch_code} criado com sucesso!')
         return redirect('recycling_batch_detail', pk=batch.pk)
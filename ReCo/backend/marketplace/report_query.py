@@ -0,0 +1,208 @@
+"""
+Filtro comum dos relatórios (período + dimensões) e o caminho único de
+consulta usado por todas as views e exportações.
+
+Um ``ReportQuery`` vem da querystring (ou dos parâmetros de uma tarefa):
+``period`` (7/30/90/365/all) ou ``start``/``end`` (datas AAAA-MM-DD, o fim é
+inclusivo) e as dimensões ``status``, ``condition`` e ``city``. Ele gera um
+queryset já filtrado por modelo e responde contagens pelo rollup diário
+sempre que o rollup tem as dimensões pedidas.
+
+Resultados nomeados passam por ``cached``: ficam memorizados na instância (a
+mesma requisição não recalcula) e no cache por REPORT_CACHE_TIMEOUT (vários
+administradores com a mesma página aberta compartilham o resultado).
+"""
+import hashlib
+from datetime import datetime, time, timedelta
+from urllib.parse import urlencode
+
+from django.core.cache import cache
+from django.db.models import Count, Q, Sum
+from django.utils import timezone
+from django.utils.dateparse import parse_date
+
+from . import rollups
+from .models import DailyStats, Delivery, Donation, DonationRequest
+
+
+# Os números dos relatórios podem ficar até 1 minuto atrasados
+REPORT_CACHE_TIMEOUT = 60
+
+PERIODS = {
+    '7': ('Últimos 7 dias', 7),
+    '30': ('Últimos 30 dias', 30),
+    '90': ('Últimos 90 dias', 90),
+    '365': ('Último ano', 365),
+    'all': ('Todo o período', None),
+}
+DEFAULT_PERIOD = '30'
+CUSTOM_PERIOD = 'custom'
+
+DIMENSIONS = ('status', 'condition', 'city')
+# Dimensões que o rollup guarda por tipo. O filtro ``status`` da consulta é
+# o status da doação e não se aplica às solicitações (que têm status próprio)
+ROLLUP_DIMENSIONS = {
+    rollups.DONATION: ('status', 'condition', 'city'),
+    rollups.REQUEST: ('status',),
+}
+
+
+def _local_midnight(day):
+    return timezone.make_aware(datetime.combine(day, time.min))
+
+
+class ReportQuery:
+    def __init__(self, period=DEFAULT_PERIOD, start=None, end=None, **dimensions):
+        """
+        ``start``/``end`` são datas (``end`` inclusivo); sem elas vale o
+        ``period``. Dimensões vazias são ignoradas.
+        """
+        self.dimensions = {
+            name: value.strip() for name, value in dimensions.items()
+            if name in DIMENSIONS and value and value.strip()
+        }
+        if start and end and start > end:
+            start, end = end, start
+        self.start_day = start
+        self.end_day = end
+        if start or end:
+            self.period = CUSTOM_PERIOD
+            self.start_date = _local_midnight(start) if start else None
+            # Fim exclusivo: meia-noite do dia seguinte ao último dia pedido
+            self.end_date = _local_midnight(end + timedelta(days=1)) if end else None
+        else:
+            self.period = period if period in PERIODS else 'all'
+            days = PERIODS[self.period][1]
+            self.start_date = timezone.now() - timedelta(days=days) if days else None
+            self.end_date = None
+        self._memo = {}
+
+    @classmethod
+    def from_params(cls, params):
+        """A partir de request.GET/POST ou dos parâmetros (dict) de uma tarefa"""
+        return cls(
+            period=params.get('period') or DEFAULT_PERIOD,
+            start=_parse_day(params.get('start')),
+            end=_parse_day(params.get('end')),
+            **{name: params.get(name) or '' for name in DIMENSIONS},
+        )
+
+    # Descrição
+
+    @property
+    def period_name(self):
+        if self.period != CUSTOM_PERIOD:
+            return PERIODS[self.period][0]
+        if self.start_day and self.end_day:
+            return f"De {self.start_day:%d/%m/%Y} a {self.end_day:%d/%m/%Y}"
+        if self.start_day:
+            return f"A partir de {self.start_day:%d/%m/%Y}"
+        return f"Até {self.end_day:%d/%m/%Y}"
+
+    def params(self):
+        """Parâmetros normalizados (querystring, tarefas e chave de cache)"""
+        if self.period == CUSTOM_PERIOD:
+            params = {
+                'start': self.start_day.isoformat() if self.start_day else '',
+                'end': self.end_day.isoformat() if self.end_day else '',
+            }
+            params = {name: value for name, value in params.items() if value}
+        else:
+            params = {'period': self.period}
+        params.update(sorted(self.dimensions.items()))
+        return params
+
+    def querystring(self):
+        return urlencode(self.params())
+
+    # Querysets (um por modelo, com os mesmos filtros)
+
+    def _range(self, field='created_at'):
+        condition = Q()
+        if self.start_date:
+            condition &= Q(**{f'{field}__gte': self.start_date})
+        if self.end_date:
+            condition &= Q(**{f'{field}__lt': self.end_date})
+        return condition
+
+    def donations(self, **overrides):
+        """Doações no intervalo com as dimensões (``overrides`` substitui dimensões)"""
+        dimensions = {**self.dimensions, **overrides}
+        return Donation.objects.filter(self._range(), **dimensions)
+
+    def _donation_dimensions(self, prefix):
+        # Solicitações e entregas herdam condição e cidade da doação
+        return {f'{prefix}{name}': value for name, value in self.dimensions.items() if name != 'status'}
+
+    def requests(self):
+        return DonationRequest.objects.filter(self._range(), **self._donation_dimensions('donation__'))
+
+    def deliveries(self):
+        return Delivery.objects.filter(self._range(), **self._donation_dimensions('donation__'))
+
+    # Rollup diário
+
+    def rollup_rows(self):
+        """Linhas do DailyStats nos dias do intervalo (os filtros por tipo vêm de ``rollup_q``)"""
+        rows = DailyStats.objects.all()
+        if self.start_date:
+            rows = rows.filter(day__gte=timezone.localdate(self.start_date))
+        if self.end_date:
+            rows = rows.filter(day__lt=timezone.localdate(self.end_date))
+        return rows
+
+    def rollup_q(self, kind, **overrides):
+        """
+        Q que seleciona as linhas do tipo com as dimensões pedidas, ou None se
+        o rollup não tem alguma delas (a contagem então vem da tabela bruta).
+        """
+        dimensions = dict(self.dimensions)
+        if kind == rollups.REQUEST:
+            dimensions.pop('status', None)
+        dimensions.update(overrides)
+        if any(name not in ROLLUP_DIMENSIONS[kind] for name in dimensions):
+            return None
+        return Q(kind=kind, **dimensions)
+
+    def _raw(self, kind, **overrides):
+        if kind == rollups.DONATION:
+            return self.donations(**overrides)
+        requests = self.requests()
+        if overrides.get('status'):
+            requests = requests.filter(status=overrides['status'])
+        return requests
+
+    def breakdown(self, kind, field, **overrides):
+        """[{field: valor, 'count': n}] do maior para o menor (rollup se possível)"""
+        condition = self.rollup_q(kind, **overrides)
+        if condition is not None:
+            rows = self.rollup_rows().filter(condition).values(field).annotate(count=Sum('count'))
+        else:
+            rows = self._raw(kind, **overrides).values(field).annotate(count=Count('id'))
+        return list(rows.filter(count__gt=0).order_by('-count', field))
+
+    # Memorização
+
+    def cache_key(self, name):
+        digest = hashlib.md5(urlencode(self.params()).encode('utf-8')).hexdigest()
+        return f'marketplace:reports:{name}:{digest}'
+
+    def cached(self, name, compute):
+        """``compute(self)`` memorizado na instância e no cache compartilhado"""
+        if name in self._memo:
+            return self._memo[name]
+        key = self.cache_key(name)
+        value = cache.get(key)
+        if value is None:
+            value = compute(self)
+            cache.set(key, value, REPORT_CACHE_TIMEOUT)
+        self._memo[name] = value
+        return value
+
+
+def _parse_day(value):
+    """Data AAAA-MM-DD ou None se vazia/inválida"""
+    try:
+        return parse_date(value or '')
+    except ValueError:
+        return None
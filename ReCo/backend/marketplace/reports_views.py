@@ -2,13 +2,17 @@
 Views para relatórios e análise de impacto do ReCo
 """
 from django.contrib.auth.decorators import user_passes_test
-from django.http import HttpResponse
-from django.shortcuts import render
-from django.db.models import Count, Q
+from django.http import FileResponse, Http404, JsonResponse, StreamingHttpResponse
+from django.shortcuts import get_object_or_404, redirect, render
+from django.urls import reverse
+from django.utils.cache import get_conditional_response, patch_cache_control
+from django.views.decorators.http import require_http_methods
+from django.db.models import Count, Q, Sum
+from django.db.models.functions import TruncDay, TruncMonth
 from django.utils import timezone
-from datetime import timedelta, datetime
-from collections import defaultdict
 from io import BytesIO
+import csv
+import tempfile
 
 from openpyxl import Workbook
 from reportlab.lib import colors
@@ -16,7 +20,9 @@ from reportlab.lib.pagesizes import A4
 from reportlab.lib.styles import getSampleStyleSheet
 from reportlab.platypus import SimpleDocTemplate, Paragraph, Spacer, Table, TableStyle
 
-from .models import Donation, DonationRequest, Delivery
+from . import analytics, jobs, pdf_cache, rollups
+from .models import BackgroundJob, Donation, DonationRequest
+from .report_query import ReportQuery
 
 
 def is_admin(user):
@@ -24,50 +30,111 @@ def is_admin(user):
     return user.is_staff or user.is_superuser
 
 
+def _bucket_counts(queryset, trunc):
+    """(início do balde, total) agrupados no banco, sem carregar as linhas"""
+    return (
+        queryset.order_by()
+        .annotate(bucket=trunc('created_at'))
+        .values_list('bucket')
+        .annotate(count=Count('id'))
+        .order_by('bucket')
+    )
+
+
+def daily_series(donations):
+    """Doações por dia: [{'date': 'dd/mm', 'count': n}]"""
+    return [
+        {'date': timezone.localtime(bucket).strftime('%d/%m'), 'count': count}
+        for bucket, count in _bucket_counts(donations, TruncDay)
+    ]
+
+
+def monthly_impact_series(delivered):
+    """Impacto por mês das doações entregues: [{'month', 'count', 'kg', 'co2'}]"""
+    return [
+        {
+            'month': timezone.localtime(bucket).strftime('%b/%Y'),
+            'count': count,
+            'kg': count * 3,
+            'co2': count * 180,
+        }
+        for bucket, count in _bucket_counts(delivered, TruncMonth)
+    ]
+
+
+def _breakdown(totals, prefix, choices):
+    """[{campo: valor, 'count': n}] do maior para o menor, sem os zerados"""
+    rows = [
+        {prefix: value, 'count': totals[f'{prefix}_{value}'] or 0}
+        for value, _ in choices
+    ]
+    rows = [row for row in rows if row['count']]
+    rows.sort(key=lambda row: (-row['count'], row[prefix]))
+    return rows
+
+
+def dashboard_stats(query):
+    """
+    Números do dashboard com uma agregação condicional por modelo: o rollup
+    diário (doações e solicitações por status/condição), doadores únicos,
+    beneficiários únicos e entregas concluídas.
+    """
+    donation = query.rollup_q(rollups.DONATION)
+    requests = query.rollup_q(rollups.REQUEST)
+    expressions = {'total_donations': Sum('count', filter=donation)}
+    if requests is not None:
+        expressions['total_requests'] = Sum('count', filter=requests)
+    for status, _ in Donation.STATUS_CHOICES:
+        expressions[f'status_{status}'] = Sum('count', filter=donation & Q(status=status))
+    for condition, _ in Donation.CONDITION_CHOICES:
+        expressions[f'condition_{condition}'] = Sum('count', filter=donation & Q(condition=condition))
+    totals = query.rollup_rows().aggregate(**expressions)
+    if requests is None:
+        # Filtro por condição/cidade: o rollup das solicitações não tem essas colunas
+        totals['total_requests'] = query.requests().count()
+
+    donors = query.donations().aggregate(unique_donors=Count('donor', distinct=True))
+    beneficiaries = query.requests().aggregate(unique_beneficiaries=Count('beneficiary', distinct=True))
+    deliveries = query.deliveries().aggregate(
+        total_deliveries=Count('id', filter=Q(status='entregue')),
+    )
+
+    return {
+        'total_donations': totals['total_donations'] or 0,
+        'total_approved': totals['status_aprovada'] or 0,
+        'total_delivered': totals['status_entregue'] or 0,
+        'total_requests': totals['total_requests'] or 0,
+        'total_deliveries': deliveries['total_deliveries'],
+        'unique_donors': donors['unique_donors'],
+        'unique_beneficiaries': beneficiaries['unique_beneficiaries'],
+        'donations_by_status': _breakdown(totals, 'status', Donation.STATUS_CHOICES),
+        'donations_by_condition': _breakdown(totals, 'condition', Donation.CONDITION_CHOICES),
+    }
+
+
+def _query_context(query):
+    """Contexto comum do filtro de relatórios (reports/_filters.html)"""
+    return {
+        'query': query,
+        'period': query.period,
+        'period_name': query.period_name,
+        'start_date': query.start_date,
+        'status_choices': Donation.STATUS_CHOICES,
+        'condition_choices': Donation.CONDITION_CHOICES,
+    }
+
+
 @user_passes_test(is_admin, login_url='usuario:login')
 def reports_dashboard(request):
     """
     Dashboard de relatórios com visão geral
     """
-    # Período selecionado (padrão: últimos 30 dias)
-    period = request.GET.get('period', '30')
+    query = ReportQuery.from_params(request.GET)
+    counts = query.cached('dashboard', dashboard_stats)
     
-    if period == '7':
-        start_date = timezone.now() - timedelta(days=7)
-        period_name = 'Últimos 7 dias'
-    elif period == '30':
-        start_date = timezone.now() - timedelta(days=30)
-        period_name = 'Últimos 30 dias'
-    elif period == '90':
-        start_date = timezone.now() - timedelta(days=90)
-        period_name = 'Últimos 90 dias'
-    elif period == '365':
-        start_date = timezone.now() - timedelta(days=365)
-        period_name = 'Último ano'
-    else:  # all
-        start_date = None
-        period_name = 'Todo o período'
-    
-    # Base queryset
-    if start_date:
-        donations_qs = Donation.objects.filter(created_at__gte=start_date)
-        requests_qs = DonationRequest.objects.filter(created_at__gte=start_date)
-        deliveries_qs = Delivery.objects.filter(created_at__gte=start_date)
-    else:
-        donations_qs = Donation.objects.all()
-        requests_qs = DonationRequest.objects.all()
-        deliveries_qs = Delivery.objects.all()
-    
-    # Estatísticas principais
-    total_donations = donations_qs.count()
-    total_approved = donations_qs.filter(status='aprovada').count()
-    total_delivered = donations_qs.filter(status='entregue').count()
-    total_requests = requests_qs.count()
-    total_deliveries = deliveries_qs.filter(status='entregue').count()
-    
-    # Usuários únicos
-    unique_donors = donations_qs.values('donor').distinct().count()
-    unique_beneficiaries = requests_qs.values('beneficiary').distinct().count()
+    total_donations = counts['total_donations']
+    total_approved = counts['total_approved']
+    total_delivered = counts['total_delivered']
     
     # Impacto ambiental
     # Estimativa: 3kg por item eletrônico
@@ -81,24 +148,16 @@ def reports_dashboard(request):
     approval_rate = (total_approved / total_donations * 100) if total_donations > 0 else 0
     delivery_rate = (total_delivered / total_approved * 100) if total_approved > 0 else 0
     
-    # Doações por condição
-    donations_by_condition = donations_qs.values('condition').annotate(count=Count('id')).order_by('-count')
-    
-    # Doações por status
-    donations_by_status = donations_qs.values('status').annotate(count=Count('id')).order_by('-count')
-    
     context = {
-        'period': period,
-        'period_name': period_name,
-        'start_date': start_date,
+        **_query_context(query),
         'stats': {
             'total_donations': total_donations,
             'total_approved': total_approved,
             'total_delivered': total_delivered,
-            'total_requests': total_requests,
-            'total_deliveries': total_deliveries,
-            'unique_donors': unique_donors,
-            'unique_beneficiaries': unique_beneficiaries,
+            'total_requests': counts['total_requests'],
+            'total_deliveries': counts['total_deliveries'],
+            'unique_donors': counts['unique_donors'],
+            'unique_beneficiaries': counts['unique_beneficiaries'],
             'approval_rate': round(approval_rate, 1),
             'delivery_rate': round(delivery_rate, 1),
         },
@@ -107,110 +166,56 @@ def reports_dashboard(request):
             'estimated_co2': estimated_co2,
             'estimated_energy': estimated_energy,
         },
-        'donations_by_condition': list(donations_by_condition),
-        'donations_by_status': list(donations_by_status),
+        'donations_by_condition': counts['donations_by_condition'],
+        'donations_by_status': counts['donations_by_status'],
     }
     
     return render(request, 'reports/dashboard.html', context)
 
 
+def donation_stats(query):
+    """Série diária, top doadores e contagem por condição do relatório de doações"""
+    top_donors = query.donations().values('donor__username', 'donor__first_name', 'donor__last_name')\
+        .annotate(count=Count('id'))\
+        .order_by('-count')[:10]
+    return {
+        'daily_data': daily_series(query.donations()),
+        'top_donors': list(top_donors),
+        'condition_stats': query.breakdown(rollups.DONATION, 'condition'),
+    }
+
+
 @user_passes_test(is_admin, login_url='usuario:login')
 def donation_report(request):
     """
     Relatório detalhado de doações
     """
-    # Filtros
-    period = request.GET.get('period', '30')
-    status_filter = request.GET.get('status', '')
-    condition_filter = request.GET.get('condition', '')
-    
-    # Período
-    if period == '7':
-        start_date = timezone.now() - timedelta(days=7)
-    elif period == '30':
-        start_date = timezone.now() - timedelta(days=30)
-    elif period == '90':
-        start_date = timezone.now() - timedelta(days=90)
-    elif period == '365':
-        start_date = timezone.now() - timedelta(days=365)
-    else:
-        start_date = None
-    
-    # Queryset base
-    donations = Donation.objects.select_related('donor', 'approved_by')
-    
-    if start_date:
-        donations = donations.filter(created_at__gte=start_date)
-    if status_filter:
-        donations = donations.filter(status=status_filter)
-    if condition_filter:
-        donations = donations.filter(condition=condition_filter)
-    
-    donations = donations.order_by('-created_at')
-    
-    # Análise temporal (por dia)
-    daily_stats = defaultdict(int)
-    for donation in donations:
-        date_key = donation.created_at.date()
-        daily_stats[date_key] += 1
-    
-    # Converter para lista ordenada
-    daily_data = [
-        {'date': date.strftime('%d/%m'), 'count': count}
-        for date, count in sorted(daily_stats.items())
-    ]
-    
-    # Top doadores
-    top_donors = donations.values('donor__username', 'donor__first_name', 'donor__last_name')\
-        .annotate(count=Count('id'))\
-        .order_by('-count')[:10]
-    
-    # Estatísticas por condição
-    condition_stats = donations.values('condition')\
-        .annotate(count=Count('id'))\
-        .order_by('-count')
+    query = ReportQuery.from_params(request.GET)
+    stats = query.cached('donations', donation_stats)
+    donations = query.donations().select_related('donor', 'approved_by').order_by('-created_at')
     
     context = {
+        **_query_context(query),
         'donations': donations[:100],  # Limitar para performance
-        'total_count': donations.count(),
-        'daily_data': daily_data,
-        'top_donors': top_donors,
-        'condition_stats': list(condition_stats),
-        'period': period,
-        'status_filter': status_filter,
-        'condition_filter': condition_filter,
-        'status_choices': Donation.STATUS_CHOICES,
-        'condition_choices': Donation.CONDITION_CHOICES,
+        'total_count': sum(row['count'] for row in stats['condition_stats']),
+        'daily_data': stats['daily_data'],
+        'top_donors': stats['top_donors'],
+        'condition_stats': stats['condition_stats'],
+        'status_filter': query.dimensions.get('status', ''),
+        'condition_filter': query.dimensions.get('condition', ''),
     }
     
     return render(request, 'reports/donations.html', context)
 
 
-@user_passes_test(is_admin, login_url='usuario:login')
-def impact_report(request):
+def impact_stats(query):
     """
-    Relatório de impacto ambiental
+    Números do relatório (e do PDF) de impacto: doações entregues no período
+    com as demais dimensões do filtro.
     """
-    # Filtros
-    period = request.GET.get('period', '30')
-    
-    if period == '7':
-        start_date = timezone.now() - timedelta(days=7)
-    elif period == '30':
-        start_date = timezone.now() - timedelta(days=30)
-    elif period == '90':
-        start_date = timezone.now() - timedelta(days=90)
-    elif period == '365':
-        start_date = timezone.now() - timedelta(days=365)
-    else:
-        start_date = None
-    
-    # Doações entregues (impacto real)
-    delivered_donations = Donation.objects.filter(status='entregue')
-    if start_date:
-        delivered_donations = delivered_donations.filter(created_at__gte=start_date)
-    
-    total_delivered = delivered_donations.count()
+    # Contagens do rollup diário
+    impact_by_condition = query.breakdown(rollups.DONATION, 'condition', status='entregue')
+    total_delivered = sum(item['count'] for item in impact_by_condition)
     
     # Cálculos de impacto
     # Premissas:
@@ -227,33 +232,12 @@ def impact_report(request):
     trees_saved = kg_total * 0.05  # Árvores equivalentes
     
     # Impacto por categoria (condição)
-    impact_by_condition = delivered_donations.values('condition')\
-        .annotate(count=Count('id'))\
-        .order_by('-count')
-    
-    # Adicionar cálculos
     for item in impact_by_condition:
         item['kg'] = item['count'] * 3
         item['co2'] = item['kg'] * 60
     
-    # Evolução mensal
-    monthly_impact = defaultdict(lambda: {'count': 0, 'kg': 0, 'co2': 0})
-    for donation in delivered_donations:
-        month_key = donation.created_at.strftime('%Y-%m')
-        monthly_impact[month_key]['count'] += 1
-        monthly_impact[month_key]['kg'] += 3
-        monthly_impact[month_key]['co2'] += 180
-    
-    # Converter para lista ordenada
-    monthly_data = [
-        {
-            'month': datetime.strptime(month, '%Y-%m').strftime('%b/%Y'),
-            'count': data['count'],
-            'kg': data['kg'],
-            'co2': data['co2']
-        }
-        for month, data in sorted(monthly_impact.items())
-    ]
+    # Doações entregues (impacto real)
+    delivered_donations = query.donations(status='entregue')
     
     # Beneficiários impactados
     unique_beneficiaries = DonationRequest.objects.filter(
@@ -261,8 +245,7 @@ def impact_report(request):
         status='entregue'
     ).values('beneficiary').distinct().count()
     
-    context = {
-        'period': period,
+    return {
         'total_delivered': total_delivered,
         'impact': {
             'kg_total': kg_total,
@@ -271,111 +254,146 @@ def impact_report(request):
             'water_saved': round(water_saved, 2),
             'trees_saved': round(trees_saved, 2),
         },
-        'impact_by_condition': list(impact_by_condition),
-        'monthly_data': monthly_data,
+        'impact_by_condition': impact_by_condition,
+        'monthly_data': monthly_impact_series(delivered_donations),
         'unique_beneficiaries': unique_beneficiaries,
     }
-    
+
+
+@user_passes_test(is_admin, login_url='usuario:login')
+def impact_report(request):
+    """
+    Relatório de impacto ambiental
+    """
+    query = ReportQuery.from_params(request.GET)
+    context = {**_query_context(query), **query.cached('impact', impact_stats)}
     return render(request, 'reports/impact.html', context)
 
 
+EXPORT_HEADERS = ['ID', 'Título', 'Doado por', 'Status', 'Condição', 'Cidade', 'Criado em']
+# Linhas buscadas por vez no banco durante a exportação
+EXPORT_CHUNK_SIZE = 2000
+
+
+def export_queryset(params):
+    """Doações do filtro de relatórios (querystring ou parâmetros da tarefa)"""
+    return ReportQuery.from_params(params).donations()
+
+
+def export_rows(donations):
+    """
+    Linhas da exportação lidas em lotes de tuplas (sem instanciar modelos),
+    então a memória não cresce com a quantidade de doações.
+    """
+    statuses = dict(Donation.STATUS_CHOICES)
+    conditions = dict(Donation.CONDITION_CHOICES)
+    rows = donations.order_by('-created_at', '-id').values_list(
+        'id', 'title', 'donor__first_name', 'donor__last_name', 'donor__username',
+        'status', 'condition', 'city', 'created_at',
+    )
+    for pk, title, first_name, last_name, username, status, condition, city, created_at in rows.iterator(
+        chunk_size=EXPORT_CHUNK_SIZE
+    ):
+        yield [
+            pk,
+            title,
+            f'{first_name} {last_name}'.strip() or username,
+            statuses.get(status, status),
+            conditions.get(condition, condition),
+            city,
+            timezone.localtime(created_at).strftime('%d/%m/%Y'),
+        ]
+
+
+def export_filename(extension):
+    return f"relatorio-doacoes-{timezone.now().strftime('%Y%m%d-%H%M')}.{extension}"
+
+
 @user_passes_test(is_admin, login_url='usuario:login')
 def export_donations_excel(request):
     """Exporta relatório de doações em Excel (XLSX)"""
-    period = request.GET.get('period', '30')
-    status_filter = request.GET.get('status', '')
-    condition_filter = request.GET.get('condition', '')
-
-    # Período
-    if period == '7':
-        start_date = timezone.now() - timedelta(days=7)
-    elif period == '30':
-        start_date = timezone.now() - timedelta(days=30)
-    elif period == '90':
-        start_date = timezone.now() - timedelta(days=90)
-    elif period == '365':
-        start_date = timezone.now() - timedelta(days=365)
-    else:
-        start_date = None
-
-    donations = Donation.objects.select_related('donor')
-    if start_date:
-        donations = donations.filter(created_at__gte=start_date)
-    if status_filter:
-        donations = donations.filter(status=status_filter)
-    if condition_filter:
-        donations = donations.filter(condition=condition_filter)
-
-    wb = Workbook()
-    ws = wb.active
-    ws.title = 'Doacoes'
-
-    headers = ['ID', 'Título', 'Doado por', 'Status', 'Condição', 'Cidade', 'Criado em']
-    ws.append(headers)
-
-    for donation in donations.order_by('-created_at'):
-        ws.append([
-            donation.id,
-            donation.title,
-            donation.donor.get_full_name() or donation.donor.username,
-            donation.get_status_display(),
-            donation.get_condition_display(),
-            donation.city,
-            donation.created_at.strftime('%d/%m/%Y'),
-        ])
-
-    response = HttpResponse(
-        content_type='application/vnd.openxmlformats-officedocument.spreadsheetml.sheet'
+    # Modo write-only: cada linha vai direto para um arquivo temporário
+    wb = Workbook(write_only=True)
+    ws = wb.create_sheet('Doacoes')
+    ws.append(EXPORT_HEADERS)
+    for row in export_rows(export_queryset(request.GET)):
+        ws.append(row)
+
+    output = tempfile.TemporaryFile()
+    wb.save(output)
+    output.seek(0)
+    return FileResponse(
+        output,
+        as_attachment=True,
+        filename=export_filename('xlsx'),
+        content_type='application/vnd.openxmlformats-officedocument.spreadsheetml.sheet',
     )
-    filename = f"relatorio-doacoes-{timezone.now().strftime('%Y%m%d-%H%M')}.xlsx"
-    response['Content-Disposition'] = f'attachment; filename="{filename}"'
-    wb.save(response)
-    return response
+
+
+class _Echo:
+    """Arquivo falso para o csv.writer: devolve a linha em vez de guardá-la"""
+
+    def write(self, value):
+        return value
 
 
 @user_passes_test(is_admin, login_url='usuario:login')
-def export_impact_pdf(request):
-    """Exporta relatório de impacto ambiental em PDF"""
-    period = request.GET.get('period', '30')
-
-    if period == '7':
-        start_date = timezone.now() - timedelta(days=7)
-    elif period == '30':
-        start_date = timezone.now() - timedelta(days=30)
-    elif period == '90':
-        start_date = timezone.now() - timedelta(days=90)
-    elif period == '365':
-        start_date = timezone.now() - timedelta(days=365)
-    else:
-        start_date = None
-
-    delivered = Donation.objects.filter(status='entregue')
-    if start_date:
-        delivered = delivered.filter(created_at__gte=start_date)
-
-    total = delivered.count()
-    kg_total = total * 3
+def export_donations_csv(request):
+    """Exporta relatório de doações em CSV, gerado enquanto é enviado"""
+    writer = csv.writer(_Echo())
+    rows = export_rows(export_queryset(request.GET))
+
+    def stream():
+        # BOM para o Excel reconhecer UTF-8 (acentos)
+        yield '\ufeff' + writer.writerow(EXPORT_HEADERS)
+        for row in rows:
+            yield writer.writerow(row)
+
+    response = StreamingHttpResponse(stream(), content_type='text/csv; charset=utf-8')
+    response['Content-Disposition'] = f'attachment; filename="{export_filename("csv")}"'
+    return response
+
+
+def impact_figures(query):
+    """Números do PDF de impacto (também a chave do cache de PDFs)"""
+    stats = query.cached('impact', impact_stats)
+    kg_total = stats['impact']['kg_total']
     impact = {
         'CO2 evitado (kg)': kg_total * 60,
         'Energia economizada (kWh)': kg_total * 15,
         'Água economizada (L)': kg_total * 500,
         'Árvores preservadas': kg_total * 0.05,
     }
+    return {
+        'period': query.period_name,
+        'filters': query.dimensions,
+        'total': stats['total_delivered'],
+        'kg_total': kg_total,
+        'impact': impact,
+        # Entra no hash: um PDF em cache nunca mostra a data de outro dia
+        'computed_on': timezone.localdate(),
+    }
+
 
+def render_impact_pdf(figures):
+    """Conteúdo (bytes) do PDF de impacto ambiental"""
     buffer = BytesIO()
     doc = SimpleDocTemplate(buffer, pagesize=A4)
     styles = getSampleStyleSheet()
     elements = []
 
     elements.append(Paragraph('Relatório de Impacto Ambiental', styles['Title']))
-    elements.append(Paragraph(f'Período: {period}', styles['Normal']))
-    elements.append(Paragraph(f'Data de geração: {timezone.now().strftime("%d/%m/%Y %H:%M")}', styles['Normal']))
+    elements.append(Paragraph(f"Período: {figures['period']}", styles['Normal']))
+    if figures['filters']:
+        filters = ', '.join(f'{name}: {value}' for name, value in figures['filters'].items())
+        elements.append(Paragraph(f'Filtros: {filters}', styles['Normal']))
+    elements.append(Paragraph(f'Dados apurados em: {figures["computed_on"].strftime("%d/%m/%Y")}', styles['Normal']))
     elements.append(Spacer(1, 12))
 
     data = [['Indicador', 'Valor']]
-    data.append(['Itens entregues', total])
-    data.append(['Peso estimado (kg)', kg_total])
-    for key, value in impact.items():
+    data.append(['Itens entregues', figures['total']])
+    data.append(['Peso estimado (kg)', figures['kg_total']])
+    for key, value in figures['impact'].items():
         data.append([key, f"{value:,.1f}" if isinstance(value, float) else value])
 
     table = Table(data, hAlign='LEFT')
@@ -394,40 +412,97 @@ def export_impact_pdf(request):
     doc.build(elements)
     pdf = buffer.getvalue()
     buffer.close()
+    return pdf
+
+
+def impact_pdf(query):
+    """(caminho, hash) do PDF do filtro; só renderiza se os números mudaram"""
+    return pdf_cache.get_or_render(impact_figures(query), render_impact_pdf)
 
-    response = HttpResponse(content_type='application/pdf')
-    filename = f"impacto-ambiental-{timezone.now().strftime('%Y%m%d-%H%M')}.pdf"
-    response['Content-Disposition'] = f'attachment; filename="{filename}"'
-    response.write(pdf)
+
+def impact_pdf_filename():
+    return f"impacto-ambiental-{timezone.now().strftime('%Y%m%d-%H%M')}.pdf"
+
+
+@user_passes_test(is_admin, login_url='usuario:login')
+def export_impact_pdf(request):
+    """Exporta relatório de impacto ambiental em PDF"""
+    path, digest = impact_pdf(ReportQuery.from_params(request.GET))
+
+    # Mesmos números = mesmo arquivo: o navegador revalida e recebe 304
+    etag = f'"{digest}"'
+    response = get_conditional_response(request, etag=etag)
+    if response is None:
+        response = FileResponse(
+            open(path, 'rb'),
+            as_attachment=True,
+            filename=impact_pdf_filename(),
+            content_type='application/pdf',
+        )
+    response['ETag'] = etag
+    patch_cache_control(response, private=True, no_cache=True)
     return response
 
 
+# Exportações que podem ir para a fila (handlers em exports.py)
+EXPORT_JOB_KINDS = ('donations_xlsx', 'impact_pdf')
+# Tarefas acompanhadas pelas páginas abaixo (relatórios + exportação analítica)
+JOB_PAGE_KINDS = EXPORT_JOB_KINDS + (analytics.JOB_KIND,)
+
+
 @user_passes_test(is_admin, login_url='usuario:login')
-def beneficiary_report(request):
-    """
-    Relatório de beneficiários
-    """
-    # Filtros
-    period = request.GET.get('period', '30')
-    
-    if period == '7':
-        start_date = timezone.now() - timedelta(days=7)
-    elif period == '30':
-        start_date = timezone.now() - timedelta(days=30)
-    elif period == '90':
-        start_date = timezone.now() - timedelta(days=90)
-    elif period == '365':
-        start_date = timezone.now() - timedelta(days=365)
-    else:
-        start_date = None
-    
-    # Solicitações
-    requests = DonationRequest.objects.select_related('beneficiary', 'donation')
-    if start_date:
-        requests = requests.filter(created_at__gte=start_date)
+@require_http_methods(["POST"])
+def export_job_create(request, kind):
+    """Enfileira uma exportação (ou reaproveita a idêntica em andamento)"""
+    if kind not in EXPORT_JOB_KINDS:
+        raise Http404
+    # Parâmetros normalizados: filtros equivalentes caem na mesma tarefa
+    params = ReportQuery.from_params(request.POST).params()
+    job = jobs.enqueue(kind, params, user=request.user)
+    return redirect('doacoes:reports_export_job', pk=job.pk)
+
+
+def _job_payload(job):
+    return {
+        'id': job.pk,
+        'status': job.status,
+        'status_display': job.get_status_display(),
+        'progress': job.progress,
+        'error': job.error,
+        'download_url': (
+            reverse('doacoes:reports_export_job_download', args=[job.pk])
+            if job.status == 'concluido' and job.file else None
+        ),
+    }
+
+
+@user_passes_test(is_admin, login_url='usuario:login')
+def export_job_detail(request, pk):
+    """Página de acompanhamento da exportação (progresso e link de download)"""
+    job = get_object_or_404(BackgroundJob, pk=pk, kind__in=JOB_PAGE_KINDS)
+    return render(request, 'reports/export_job.html', {'job': job, 'payload': _job_payload(job)})
+
+
+@user_passes_test(is_admin, login_url='usuario:login')
+def export_job_status(request, pk):
+    job = get_object_or_404(BackgroundJob, pk=pk, kind__in=JOB_PAGE_KINDS)
+    return JsonResponse(_job_payload(job))
+
+
+@user_passes_test(is_admin, login_url='usuario:login')
+def export_job_download(request, pk):
+    job = get_object_or_404(BackgroundJob, pk=pk, kind__in=JOB_PAGE_KINDS, status='concluido')
+    if not job.file:
+        raise Http404
+    return FileResponse(job.file.open('rb'), as_attachment=True, filename=jobs.download_name(job))
+
+
+def beneficiary_stats(query):
+    """Top beneficiários e contagens de solicitações do filtro"""
+    requests = query.requests()
     
     # Top beneficiários
-    top_beneficiaries = requests.values(
+    top_beneficiaries = list(requests.values(
         'beneficiary__username',
         'beneficiary__first_name',
         'beneficiary__last_name'
@@ -435,7 +510,7 @@ def beneficiary_report(request):
         total_requests=Count('id'),
         approved_requests=Count('id', filter=Q(status='aprovada')),
         delivered_requests=Count('id', filter=Q(status='entregue'))
-    ).order_by('-delivered_requests')[:20]
+    ).order_by('-delivered_requests')[:20])
     
     # Taxa de aprovação por beneficiário
     for beneficiary in top_beneficiaries:
@@ -448,17 +523,14 @@ def beneficiary_report(request):
     
     # Estatísticas gerais
     total_beneficiaries = requests.values('beneficiary').distinct().count()
-    total_requests = requests.count()
-    approved_requests = requests.filter(status='aprovada').count()
-    delivered_requests = requests.filter(status='entregue').count()
-    
-    # Solicitações por status
-    requests_by_status = requests.values('status')\
-        .annotate(count=Count('id'))\
-        .order_by('-count')
-    
-    context = {
-        'period': period,
+    # Solicitações por status (rollup diário quando possível)
+    requests_by_status = query.breakdown(rollups.REQUEST, 'status')
+    by_status = {row['status']: row['count'] for row in requests_by_status}
+    total_requests = sum(by_status.values())
+    approved_requests = by_status.get('aprovada', 0)
+    delivered_requests = by_status.get('entregue', 0)
+    
+    return {
         'stats': {
             'total_beneficiaries': total_beneficiaries,
             'total_requests': total_requests,
@@ -467,7 +539,15 @@ def beneficiary_report(request):
             'approval_rate': round(approved_requests / total_requests * 100, 1) if total_requests > 0 else 0,
         },
         'top_beneficiaries': top_beneficiaries,
-        'requests_by_status': list(requests_by_status),
+        'requests_by_status': requests_by_status,
     }
-    
+
+
+@user_passes_test(is_admin, login_url='usuario:login')
+def beneficiary_report(request):
+    """
+    Relatório de beneficiários
+    """
+    query = ReportQuery.from_params(request.GET)
+    context = {**_query_context(query), **query.cached('beneficiaries', beneficiary_stats)}
     return render(request, 'reports/beneficiaries.html', context)
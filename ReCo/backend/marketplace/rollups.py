@@ -0,0 +1,145 @@
+"""
+Contagens diárias pré-agregadas (DailyStats) para os relatórios.
+
+Cada linha guarda quantas doações/solicitações criadas em um dia estão hoje em
+um status, condição e cidade. Os sinais ajustam as linhas a cada criação,
+mudança ou exclusão; o comando ``reconcile_daily_stats`` confere a tabela com
+os dados brutos e corrige diferenças (ex.: após ``QuerySet.update``).
+
+Os relatórios somam poucas linhas por dia em vez de varrer as tabelas, então
+"todo o período" custa o mesmo que "últimos 7 dias". O filtro de período é por
+dia (local): o início do intervalo inclui o dia inteiro em que cai (ver
+``ReportQuery.rollup_rows``).
+"""
+from collections import Counter
+
+from django.db import IntegrityError, transaction
+from django.db.models import Count, F
+from django.db.models.functions import TruncDate
+from django.utils import timezone
+
+from .models import DailyStats, Donation, DonationRequest
+
+
+DONATION = 'donation'
+REQUEST = 'request'
+
+
+def _day(created_at):
+    return timezone.localdate(created_at) if timezone.is_aware(created_at) else created_at.date()
+
+
+def bump(kind, day, status, condition='', city='', delta=1):
+    """Soma ``delta`` ao balde (UPDATE atômico; cria a linha se não existir)"""
+    if not delta:
+        return
+    bucket = DailyStats.objects.filter(kind=kind, day=day, status=status, condition=condition, city=city)
+    if bucket.update(count=F('count') + delta) or delta < 0:
+        return
+    try:
+        with transaction.atomic():
+            DailyStats.objects.create(
+                kind=kind, day=day, status=status, condition=condition, city=city, count=delta,
+            )
+    except IntegrityError:
+        bucket.update(count=F('count') + delta)
+
+
+def donation_key(created_at, status, condition, city):
+    return (DONATION, _day(created_at), status, condition or '', (city or '').strip())
+
+
+def request_key(created_at, status):
+    return (REQUEST, _day(created_at), status, '', '')
+
+
+def move(old_key, new_key):
+    """Tira um item do balde antigo e coloca no novo (qualquer um pode ser None)"""
+    if old_key == new_key:
+        return
+    if old_key is not None:
+        bump(*old_key, delta=-1)
+    if new_key is not None:
+        bump(*new_key, delta=1)
+
+
+def move_many(moves):
+    """
+    Vários ``move`` de uma vez: ``moves`` é um Counter {(chave antiga, chave
+    nova): quantidade}. Cada balde afetado recebe um único UPDATE.
+    """
+    deltas = Counter()
+    for (old_key, new_key), n in moves.items():
+        if old_key == new_key:
+            continue
+        if old_key is not None:
+            deltas[old_key] -= n
+        if new_key is not None:
+            deltas[new_key] += n
+    for key, delta in deltas.items():
+        bump(*key, delta=delta)
+
+
+def _grouped(kind, queryset):
+    """Counter {chave do balde: quantidade} calculado a partir dos dados brutos"""
+    if kind == DONATION:
+        rows = queryset.values_list(TruncDate('created_at'), 'status', 'condition', 'city')
+        rows = rows.annotate(n=Count('id')).order_by()
+        result = Counter()
+        for day, status, condition, city, n in rows:
+            result[(DONATION, day, status, condition or '', (city or '').strip())] += n
+        return result
+    rows = queryset.values_list(TruncDate('created_at'), 'status').annotate(n=Count('id')).order_by()
+    return Counter({(REQUEST, day, status, '', ''): n for day, status, n in rows})
+
+
+def bulk_status_change(queryset, new_status):
+    """
+    ``queryset.update(status=new_status)`` mantendo os baldes em dia.
+    Retorna a quantidade de linhas atualizadas.
+    """
+    kind = DONATION if queryset.model is Donation else REQUEST
+    with transaction.atomic():
+        before = _grouped(kind, queryset.exclude(status=new_status).select_for_update())
+        # update() não aciona auto_now: updated_at explícito para a exportação incremental
+        updated = queryset.exclude(status=new_status).update(status=new_status, updated_at=timezone.now())
+        for (kind_, day, status, condition, city), n in before.items():
+            bump(kind_, day, status, condition, city, delta=-n)
+            bump(kind_, day, new_status, condition, city, delta=n)
+    return updated
+
+
+def expected():
+    """Conteúdo correto da tabela, calculado dos dados brutos"""
+    return _grouped(DONATION, Donation.objects.all()) + _grouped(REQUEST, DonationRequest.objects.all())
+
+
+def reconcile():
+    """
+    Corrige a tabela para bater com os dados brutos.
+    Retorna a quantidade de baldes alterados.
+    """
+    with transaction.atomic():
+        target = expected()
+        current = {
+            (row.kind, row.day, row.status, row.condition, row.city): row
+            for row in DailyStats.objects.select_for_update()
+        }
+        fixed = 0
+        for key, row in current.items():
+            if key not in target:
+                # Baldes zerados pelos sinais são só limpeza, não divergência
+                row.delete()
+                fixed += bool(row.count)
+            elif row.count != target[key]:
+                row.count = target[key]
+                row.save(update_fields=['count'])
+                fixed += 1
+        missing = [
+            DailyStats(kind=kind, day=day, status=status, condition=condition, city=city, count=count)
+            for (kind, day, status, condition, city), count in target.items()
+            if (kind, day, status, condition, city) not in current
+        ]
+        DailyStats.objects.bulk_create(missing, batch_size=1000)
+    return fixed + len(missing)
+
@@ -0,0 +1,152 @@
+"""
+Busca textual (full-text) sobre título e descrição das doações.
+
+O backend é escolhido pelo banco ativo em DATABASES:
+- SQLite: tabela virtual FTS5 ``marketplace_donation_fts`` (rowid = id da doação),
+  mantida em sincronia pelos sinais de Donation;
+- MySQL: índice FULLTEXT ``marketplace_donation_ft`` sobre (title, description),
+  mantido pelo próprio InnoDB;
+- outros bancos: fallback para ``icontains``.
+
+As consultas anotam ``search_rank`` (maior = mais relevante).
+"""
+import re
+
+from django.db import connections, router
+from django.db.models import FloatField, Q, Value
+from django.db.models.expressions import RawSQL
+
+from .models import Donation
+
+
+FTS_TABLE = 'marketplace_donation_fts'
+FULLTEXT_INDEX = 'marketplace_donation_ft'
+
+TOKEN_RE = re.compile(r'\w+', re.UNICODE)
+
+# Cache de existência da tabela FTS5 por alias de conexão
+_fts_available = {}
+
+
+def _connection():
+    return connections[router.db_for_write(Donation)]
+
+
+def search_backend(connection=None):
+    """Retorna 'fts5', 'mysql' ou None (fallback icontains)"""
+    connection = connection or _connection()
+    if connection.vendor == 'mysql':
+        return 'mysql'
+    if connection.vendor == 'sqlite':
+        if connection.alias not in _fts_available:
+            with connection.cursor() as cursor:
+                _fts_available[connection.alias] = (
+                    FTS_TABLE in connection.introspection.table_names(cursor)
+                )
+        if _fts_available[connection.alias]:
+            return 'fts5'
+    return None
+
+
+def reset_backend_cache():
+    """Esquece a detecção da tabela FTS5 (após migrations/rebuild)"""
+    _fts_available.clear()
+
+
+def _tokens(term):
+    return TOKEN_RE.findall(term or '')
+
+
+def _fts5_query(term):
+    """Converte a busca do usuário em expressão FTS5 segura (AND de prefixos)"""
+    return ' '.join('"{}"*'.format(token) for token in _tokens(term))
+
+
+def _mysql_query(term):
+    """Converte a busca do usuário em expressão BOOLEAN MODE (AND de prefixos)"""
+    return ' '.join('+{}*'.format(token) for token in _tokens(term))
+
+
+def search_donations(queryset, term):
+    """
+    Filtra o queryset de doações pelo termo e anota ``search_rank``.
+
+    Termos sem nenhuma palavra válida retornam o queryset sem filtro.
+    """
+    if not _tokens(term):
+        return queryset
+
+    backend = search_backend()
+    if backend == 'fts5':
+        match = _fts5_query(term)
+        table = Donation._meta.db_table
+        # bm25() é negativo (menor = melhor); invertemos para manter "maior = melhor"
+        return queryset.filter(
+            id__in=RawSQL(
+                f'SELECT rowid FROM {FTS_TABLE} WHERE {FTS_TABLE} MATCH %s',
+                (match,),
+            )
+        ).annotate(
+            search_rank=RawSQL(
+                f'SELECT -bm25({FTS_TABLE}) FROM {FTS_TABLE} '
+                f'WHERE {FTS_TABLE} MATCH %s AND rowid = {table}.id',
+                (match,),
+            )
+        )
+
+    if backend == 'mysql':
+        match = _mysql_query(term)
+        return queryset.annotate(
+            search_rank=RawSQL(
+                'MATCH (title, description) AGAINST (%s IN BOOLEAN MODE)',
+                (match,),
+            )
+        ).filter(search_rank__gt=0)
+
+    return queryset.filter(
+        Q(title__icontains=term) | Q(description__icontains=term)
+    ).annotate(search_rank=Value(1.0, output_field=FloatField()))
+
+
+def index_donation(donation):
+    """Insere/atualiza a doação no índice FTS5 (no-op nos demais backends)"""
+    connection = _connection()
+    if search_backend(connection) != 'fts5':
+        return
+    with connection.cursor() as cursor:
+        cursor.execute(f'DELETE FROM {FTS_TABLE} WHERE rowid = %s', [donation.pk])
+        cursor.execute(
+            f'INSERT INTO {FTS_TABLE} (rowid, title, description) VALUES (%s, %s, %s)',
+            [donation.pk, donation.title, donation.description],
+        )
+
+
+def remove_donation(donation_id):
+    """Remove a doação do índice FTS5 (no-op nos demais backends)"""
+    connection = _connection()
+    if search_backend(connection) != 'fts5':
+        return
+    with connection.cursor() as cursor:
+        cursor.execute(f'DELETE FROM {FTS_TABLE} WHERE rowid = %s', [donation_id])
+
+
+def rebuild_index():
+    """
+    Reconstrói o índice inteiro a partir da tabela de doações.
+
+    Retorna a quantidade de doações indexadas.
+    """
+    connection = _connection()
+    backend = search_backend(connection)
+    table = Donation._meta.db_table
+    with connection.cursor() as cursor:
+        if backend == 'fts5':
+            cursor.execute(f'DELETE FROM {FTS_TABLE}')
+            cursor.execute(
+                f'INSERT INTO {FTS_TABLE} (rowid, title, description) '
+                f'SELECT id, title, description FROM {table}'
+            )
+            cursor.execute(f"INSERT INTO {FTS_TABLE} ({FTS_TABLE}) VALUES ('optimize')")
+        elif backend == 'mysql':
+            cursor.execute(f'OPTIMIZE TABLE {table}')
+    return Donation.objects.count()
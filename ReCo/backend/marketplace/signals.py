@@ -0,0 +1,139 @@
+"""
+Receivers de sinais do marketplace: mantêm índices e caches derivados em dia
+"""
+from django.db.models import Q
+from django.db.models.signals import post_delete, post_init, post_save, pre_delete
+from django.dispatch import receiver
+
+from usuario.models import Profile
+
+from . import images, participants, rollups, search, similarity
+from .admin_stats import invalidate_admin_stats
+from .facets import invalidate_facets
+from .models import CollectionPoint, Delivery, Donation, DonationRequest, Message
+
+
+# Campos da doação cujo valor anterior interessa aos caches derivados
+FACET_FIELDS = ('city', 'condition', 'status', 'is_available')
+SIMILARITY_FIELDS = FACET_FIELDS + ('title', 'description')
+ROLLUP_FIELDS = ('status', 'condition', 'city')
+TRACKED_DONATION_FIELDS = SIMILARITY_FIELDS
+
+
+def _donation_state(instance):
+    # __dict__ evita disparar consultas para campos adiados (.only/.defer)
+    return {field: instance.__dict__.get(field) for field in TRACKED_DONATION_FIELDS}
+
+
+def _changed(previous, current, fields):
+    return any(previous.get(field) != current.get(field) for field in fields)
+
+
+@receiver(post_init, sender=Donation)
+def remember_donation_state(sender, instance, **kwargs):
+    instance._tracked_state = _donation_state(instance)
+
+
+@receiver(post_save, sender=Donation)
+def donation_saved(sender, instance, created, raw=False, **kwargs):
+    if raw:
+        return
+    search.index_donation(instance)
+    images.generate_for_instance(instance)
+
+    previous = instance._tracked_state
+    current = _donation_state(instance)
+    if created or _changed(previous, current, FACET_FIELDS):
+        invalidate_facets()
+    if created or _changed(previous, current, SIMILARITY_FIELDS):
+        similarity.refresh_related(instance)
+    if created:
+        rollups.move(None, _donation_bucket(instance, current))
+    elif _changed(previous, current, ROLLUP_FIELDS) and previous.get('status') is not None:
+        rollups.move(_donation_bucket(instance, previous), _donation_bucket(instance, current))
+    instance._tracked_state = current
+
+
+@receiver(post_delete, sender=Donation)
+def donation_deleted(sender, instance, **kwargs):
+    search.remove_donation(instance.pk)
+    invalidate_facets()
+    rollups.move(_donation_bucket(instance, _donation_state(instance)), None)
+
+
+def _donation_bucket(instance, state):
+    return rollups.donation_key(instance.created_at, state['status'], state['condition'], state['city'])
+
+
+@receiver(post_init, sender=DonationRequest)
+def remember_request_state(sender, instance, **kwargs):
+    instance._tracked_status = instance.__dict__.get('status')
+
+
+@receiver(post_save, sender=DonationRequest)
+def donation_request_saved(sender, instance, created, raw=False, **kwargs):
+    if raw:
+        return
+    # Aprovação/rejeição muda quem pode conversar no anúncio
+    participants.invalidate(instance.donation_id)
+
+    previous = instance._tracked_status
+    if created:
+        rollups.move(None, rollups.request_key(instance.created_at, instance.status))
+    elif previous is not None and previous != instance.status:
+        rollups.move(
+            rollups.request_key(instance.created_at, previous),
+            rollups.request_key(instance.created_at, instance.status),
+        )
+    instance._tracked_status = instance.status
+
+
+@receiver(post_delete, sender=DonationRequest)
+def donation_request_deleted(sender, instance, **kwargs):
+    participants.invalidate(instance.donation_id)
+    rollups.move(rollups.request_key(instance.created_at, instance.status), None)
+
+
+@receiver(post_save, sender=Donation)
+@receiver(post_delete, sender=Donation)
+@receiver(post_save, sender=DonationRequest)
+@receiver(post_delete, sender=DonationRequest)
+@receiver(post_save, sender=Delivery)
+@receiver(post_delete, sender=Delivery)
+@receiver(post_save, sender=Profile)
+@receiver(post_delete, sender=Profile)
+@receiver(post_save, sender=CollectionPoint)
+@receiver(post_delete, sender=CollectionPoint)
+def admin_stats_changed(sender, raw=False, **kwargs):
+    # Qualquer alteração nessas tabelas pode mudar os números do painel
+    if raw:
+        return
+    invalidate_admin_stats()
+
+
+def _located_by_point(point):
+    # Doações sem coordenadas próprias usam a localização do ponto de coleta
+    return Donation.objects.filter(collection_point=point).filter(
+        Q(pickup_latitude__isnull=True) | Q(pickup_longitude__isnull=True)
+    )
+
+
+@receiver(post_save, sender=CollectionPoint)
+def collection_point_saved(sender, instance, raw=False, **kwargs):
+    if raw:
+        return
+    _located_by_point(instance).exclude(geohash=instance.geohash).update(geohash=instance.geohash)
+
+
+@receiver(pre_delete, sender=CollectionPoint)
+def collection_point_deleted(sender, instance, **kwargs):
+    _located_by_point(instance).update(geohash='')
+
+
+@receiver(post_save, sender=Message)
+@receiver(post_save, sender=Delivery)
+@receiver(post_save, sender=Profile)
+def image_owner_saved(sender, instance, raw=False, **kwargs):
+    if raw:
+        return
+    images.generate_for_instance(instance)
@@ -0,0 +1,219 @@
+"""
+Índice de similaridade para "itens relacionados" na página de detalhe.
+
+Cada doação visível tem seus termos (título com peso dobrado + descrição)
+gravados em DonationTerm com TF normalizado (L2). A similaridade entre duas
+doações é o produto escalar ponderado por IDF² dos termos em comum, com bônus
+para mesma cidade e mesma condição. Os TOP_K vizinhos de cada doação ficam em
+RelatedDonation, então a página de detalhe lê os relacionados com uma consulta.
+
+A atualização é incremental: ao salvar uma doação recalculamos apenas a lista
+dela (candidatos vêm do índice invertido) e oferecemos a nova doação às listas
+dos vizinhos encontrados, já que a pontuação é simétrica.
+"""
+import math
+import re
+import unicodedata
+from collections import Counter
+
+from django.db import transaction
+from django.db.models import Case, Count, F, FloatField, Min, Q, Sum, Value, When
+
+from .models import Donation, DonationTerm, RelatedDonation
+
+
+TOP_K = 6
+# Quantos candidatos (por pontuação textual) recebem bônus e disputam o top-k
+CANDIDATE_LIMIT = 200
+CITY_BOOST = 0.25
+CONDITION_BOOST = 0.10
+# Termos presentes em mais da metade das doações não ajudam a diferenciar e
+# custam caro para percorrer; o corte só vale a partir de MIN_DF_CUTOFF doações
+MAX_DF_RATIO = 0.5
+MIN_DF_CUTOFF = 100
+
+TOKEN_RE = re.compile(r'[a-z0-9]{2,40}')
+
+STOPWORDS = {
+    'de', 'da', 'do', 'das', 'dos', 'em', 'no', 'na', 'nos', 'nas', 'um', 'uma',
+    'uns', 'umas', 'com', 'sem', 'por', 'para', 'pra', 'que', 'se', 'os', 'as',
+    'ao', 'aos', 'ou', 'mas', 'mais', 'muito', 'pouco', 'bem', 'esta', 'este',
+    'essa', 'esse', 'isso', 'tem', 'ter', 'foi', 'ser', 'sao', 'nao', 'sim',
+    'ele', 'ela', 'eu', 'voce', 'meu', 'minha', 'seu', 'sua', 'ja', 'ainda',
+}
+
+
+def tokenize(text):
+    """Minúsculas, sem acentos e sem stopwords"""
+    text = unicodedata.normalize('NFKD', (text or '').lower())
+    text = ''.join(ch for ch in text if not unicodedata.combining(ch))
+    return [token for token in TOKEN_RE.findall(text) if token not in STOPWORDS]
+
+
+def term_weights(donation):
+    """Vetor TF normalizado (L2) da doação: {termo: peso}"""
+    counts = Counter(tokenize(donation.title) * 2 + tokenize(donation.description))
+    norm = math.sqrt(sum(c * c for c in counts.values()))
+    if not norm:
+        return {}
+    return {term: count / norm for term, count in counts.items()}
+
+
+def is_indexable(donation):
+    return donation.is_available and donation.status in Donation.PUBLIC_STATUSES
+
+
+def _visible_count():
+    return Donation.objects.filter(is_available=True, status__in=Donation.PUBLIC_STATUSES).count()
+
+
+def _score_candidates(donation, weights, total):
+    """Lista [(id, pontuação)] dos candidatos mais parecidos, em ordem decrescente"""
+    df = dict(
+        DonationTerm.objects.filter(term__in=list(weights))
+        .values('term')
+        .annotate(df=Count('id'))
+        .values_list('term', 'df')
+    )
+    max_df = max(MIN_DF_CUTOFF, total * MAX_DF_RATIO)
+    idf = {
+        term: math.log((1 + total) / (1 + df.get(term, 0))) + 1
+        for term in weights
+        if df.get(term, 0) <= max_df
+    }
+    if not idf:
+        return []
+
+    # Soma ponderada feita no banco: ``weight * peso_local * idf²`` por termo
+    coefficient = Case(
+        *[When(term=term, then=Value(weights[term] * value ** 2)) for term, value in idf.items()],
+        output_field=FloatField(),
+    )
+    best = list(
+        DonationTerm.objects.filter(term__in=list(idf))
+        .exclude(donation_id=donation.pk)
+        .values('donation_id')
+        .annotate(score=Sum(F('weight') * coefficient))
+        .order_by('-score', '-donation_id')
+        .values_list('donation_id', 'score')[:CANDIDATE_LIMIT]
+    )
+    attributes = dict(
+        (pk, (city, condition))
+        for pk, city, condition in Donation.objects.filter(
+            pk__in=[pk for pk, _ in best],
+            is_available=True,
+            status__in=Donation.PUBLIC_STATUSES,
+        ).values_list('pk', 'city', 'condition')
+    )
+
+    city = (donation.city or '').strip().lower()
+    ranked = []
+    for pk, score in best:
+        if pk not in attributes:
+            continue
+        other_city, other_condition = attributes[pk]
+        if city and city == (other_city or '').strip().lower():
+            score *= 1 + CITY_BOOST
+        if donation.condition == other_condition:
+            score *= 1 + CONDITION_BOOST
+        ranked.append((pk, score))
+    ranked.sort(key=lambda item: (-item[1], -item[0]))
+    return ranked
+
+
+def _offer_to_neighbours(donation, ranked):
+    """Insere a doação no top-k dos vizinhos em que ela passa a figurar"""
+    current = {
+        row['donation_id']: row
+        for row in RelatedDonation.objects.filter(donation_id__in=[pk for pk, _ in ranked])
+        .values('donation_id')
+        .annotate(size=Count('id'), worst=Min('score'))
+    }
+    rows, overflowing = [], []
+    for pk, score in ranked:
+        stats = current.get(pk)
+        if stats is None or stats['size'] < TOP_K:
+            rows.append(RelatedDonation(donation_id=pk, related_id=donation.pk, score=score))
+        elif score > stats['worst']:
+            rows.append(RelatedDonation(donation_id=pk, related_id=donation.pk, score=score))
+            overflowing.append(pk)
+    RelatedDonation.objects.bulk_create(rows)
+
+    for pk in overflowing:
+        excess = list(
+            RelatedDonation.objects.filter(donation_id=pk)
+            .order_by('-score', '-related_id')
+            .values_list('id', flat=True)[TOP_K:]
+        )
+        RelatedDonation.objects.filter(id__in=excess).delete()
+
+
+def _store_terms(donation, weights):
+    DonationTerm.objects.bulk_create([
+        DonationTerm(donation_id=donation.pk, term=term, weight=weight)
+        for term, weight in weights.items()
+    ])
+
+
+def refresh_related(donation):
+    """Recalcula os termos e os vizinhos de uma doação (chamado no post_save)"""
+    with transaction.atomic():
+        RelatedDonation.objects.filter(Q(donation_id=donation.pk) | Q(related_id=donation.pk)).delete()
+        DonationTerm.objects.filter(donation_id=donation.pk).delete()
+        if not is_indexable(donation):
+            return
+
+        weights = term_weights(donation)
+        if not weights:
+            return
+        _store_terms(donation, weights)
+
+        ranked = _score_candidates(donation, weights, _visible_count())
+        RelatedDonation.objects.bulk_create([
+            RelatedDonation(donation_id=donation.pk, related_id=pk, score=score)
+            for pk, score in ranked[:TOP_K]
+        ])
+        _offer_to_neighbours(donation, ranked)
+
+
+def rebuild_related():
+    """Reconstrói termos e vizinhos de todas as doações visíveis. Retorna a quantidade indexada."""
+    visible = Donation.objects.filter(
+        is_available=True, status__in=Donation.PUBLIC_STATUSES,
+    ).only('pk', 'title', 'description', 'city', 'condition', 'status', 'is_available')
+
+    with transaction.atomic():
+        RelatedDonation.objects.all().delete()
+        DonationTerm.objects.all().delete()
+
+        # 1ª passada: índice invertido completo (necessário para o IDF)
+        total = 0
+        for donation in visible.iterator(chunk_size=500):
+            weights = term_weights(donation)
+            if weights:
+                _store_terms(donation, weights)
+                total += 1
+
+        # 2ª passada: vizinhos de cada doação
+        for donation in visible.iterator(chunk_size=500):
+            weights = term_weights(donation)
+            if not weights:
+                continue
+            ranked = _score_candidates(donation, weights, total)
+            RelatedDonation.objects.bulk_create([
+                RelatedDonation(donation_id=donation.pk, related_id=pk, score=score)
+                for pk, score in ranked[:TOP_K]
+            ])
+    return total
+
+
+def related_donations(donation, limit=3):
+    """Doações relacionadas já ordenadas por pontuação (uma consulta indexada)"""
+    return (
+        Donation.objects.filter(
+            neighbour_of__donation=donation,
+            is_available=True,
+            status__in=Donation.PUBLIC_STATUSES,
+        )
+        .order_by('-neighbour_of__score')[:limit]
+    )
@@ -0,0 +1,77 @@
+"""
+Leitura de mensagens e contador de não lidas por usuário.
+
+O total de não lidas de cada usuário fica no cache e é ajustado com
+incr/decr quando uma mensagem é enviada ou lida, então o badge do menu não
+precisa de COUNT na tabela de mensagens. Se a chave expirar ou sumir, o valor
+é recalculado a partir dos contadores de Conversation (duas somas indexadas).
+"""
+from django.core.cache import cache
+from django.db import transaction
+from django.db.models import F, Sum
+from django.db.models.functions import Greatest
+
+from .models import Conversation, Message
+
+
+CACHE_TIMEOUT = 60 * 60
+
+
+def _key(user_id):
+    return f'marketplace:unread:{user_id}'
+
+
+def _count_from_conversations(user_id):
+    as_a = Conversation.objects.filter(user_a_id=user_id).aggregate(total=Sum('unread_a'))['total']
+    as_b = Conversation.objects.filter(user_b_id=user_id).aggregate(total=Sum('unread_b'))['total']
+    return (as_a or 0) + (as_b or 0)
+
+
+def unread_count(user_id):
+    """Total de mensagens não lidas do usuário (cache; recalcula na falta)"""
+    count = cache.get(_key(user_id))
+    if count is None:
+        count = _count_from_conversations(user_id)
+        cache.set(_key(user_id), count, CACHE_TIMEOUT)
+    return max(count, 0)
+
+
+def _adjust(user_id, delta):
+    # Sem a chave não há o que ajustar: a próxima leitura recalcula
+    try:
+        if delta > 0:
+            cache.incr(_key(user_id), delta)
+        else:
+            cache.decr(_key(user_id), -delta)
+    except ValueError:
+        pass
+
+
+def message_sent(message):
+    """Chamado na transação do envio; ajusta o cache só após o commit"""
+    transaction.on_commit(lambda: _adjust(message.recipient_id, 1))
+
+
+def mark_read(donation_id, user_id, other_id, up_to_id):
+    """
+    Marca como lidas (um UPDATE) as mensagens que ``other_id`` enviou a
+    ``user_id`` nessa doação até ``up_to_id`` e desconta do resumo da conversa
+    e do contador em cache. Retorna quantas mensagens foram marcadas.
+    """
+    with transaction.atomic():
+        marked = Message.objects.filter(
+            donation_id=donation_id,
+            sender_id=other_id,
+            recipient_id=user_id,
+            read=False,
+            id__lte=up_to_id,
+        ).update(read=True)
+        if not marked:
+            return 0
+        user_a, user_b = Conversation.pair(user_id, other_id)
+        field = 'unread_a' if user_id == user_a else 'unread_b'
+        Conversation.objects.filter(donation_id=donation_id, user_a_id=user_a, user_b_id=user_b).update(
+            **{field: Greatest(F(field) - marked, 0)}
+        )
+        transaction.on_commit(lambda: _adjust(user_id, -marked))
+    return marked
@@ -19,6 +19,7 @@ urlpatterns = [
     
     # Pontos de coleta
     path('mapa/', views.collection_points_map, name='collection_points_map'),
+    path('mapa/proximos/', views.collection_points_nearby, name='collection_points_nearby'),
     
     # Solicitações de doação
     path('<int:pk>/solicitar/', request_views.request_donation, name='request_donation'),
@@ -34,10 +35,13 @@ urlpatterns = [
     path('admin/dashboard/', admin_views.dashboard, name='admin_dashboard'),
     path('admin/doacoes/', admin_views.donations_management, name='admin_donations_management'),
     path('admin/doacoes/<int:pk>/aprovar/', admin_views.approve_donation, name='admin_approve_donation'),
+    path('admin/doacoes/em-massa/', admin_views.bulk_moderate_donations, name='admin_bulk_donations'),
     path('admin/solicitacoes/', admin_views.requests_management, name='admin_requests_management'),
+    path('admin/solicitacoes/em-massa/', admin_views.bulk_moderate_requests, name='admin_bulk_requests'),
     path('admin/entregas/', admin_views.deliveries_management, name='admin_deliveries_management'),
     path('admin/entregas/<int:donation_id>/atribuir/', admin_views.assign_delivery, name='admin_assign_delivery'),
     path('admin/pontos-coleta/', admin_views.collection_points_management, name='admin_collection_points'),
+    path('admin/exportacao-analitica/', admin_views.analytics_export, name='admin_analytics_export'),
     
     # Relatórios
     path('relatorios/', reports_views.reports_dashboard, name='reports_dashboard'),
@@ -45,7 +49,12 @@ urlpatterns = [
     path('relatorios/impacto/', reports_views.impact_report, name='reports_impact'),
     path('relatorios/beneficiarios/', reports_views.beneficiary_report, name='reports_beneficiaries'),
     path('relatorios/exportar/doacoes.xlsx', reports_views.export_donations_excel, name='reports_export_donations'),
+    path('relatorios/exportar/doacoes.csv', reports_views.export_donations_csv, name='reports_export_donations_csv'),
     path('relatorios/exportar/impacto.pdf', reports_views.export_impact_pdf, name='reports_export_impact'),
+    path('relatorios/exportacoes/<str:kind>/nova/', reports_views.export_job_create, name='reports_export_job_create'),
+    path('relatorios/exportacoes/<int:pk>/', reports_views.export_job_detail, name='reports_export_job'),
+    path('relatorios/exportacoes/<int:pk>/status/', reports_views.export_job_status, name='reports_export_job_status'),
+    path('relatorios/exportacoes/<int:pk>/download/', reports_views.export_job_download, name='reports_export_job_download'),
 
     # Painel do transportador
     path('transportador/', driver_views.driver_dashboard, name='driver_dashboard'),
@@ -71,6 +80,7 @@ urlpatterns = [
     path('<int:donation_pk>/doar/<int:beneficiary_pk>/', views.select_beneficiary, name='select_beneficiary'),
     path('<int:pk>/messages/', views.messages_json, name='messages_json'),
     path('<int:pk>/messages/send/', views.post_message, name='post_message'),
+    path('<int:pk>/messages/stream/', views.message_stream, name='message_stream'),
     
     # Sistema de Reciclagem
     path('reciclagem/', recycling_views.recycling_dashboard, name='recycling_dashboard'),
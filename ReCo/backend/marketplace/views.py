@@ -1,60 +1,157 @@
+import json
+import time
+from functools import partial
+
+from asgiref.sync import sync_to_async
 from django.contrib import messages
 from django.contrib.auth import get_user_model
 from django.contrib.auth.decorators import login_required
-from django.db.models import Q, Count
-from django.http import JsonResponse
-from django.shortcuts import get_object_or_404, redirect, render
+from django.db.models import Case, Count, F, FloatField, Q, When
+from django.core.handlers.asgi import ASGIRequest
+from django.db import transaction
+from django.http import HttpResponse, JsonResponse, StreamingHttpResponse
+from django.shortcuts import aget_object_or_404, get_object_or_404, redirect, render
 from django.urls import reverse
+from django.utils.cache import get_conditional_response, patch_cache_control
+from django.utils.dateparse import parse_datetime
 
+from . import geo, pubsub, unread
+from . import participants as chat_participants
+from .conversations import record_message
+from .facets import donation_facets
 from .forms import DonationForm, MessageForm
-from .models import Donation, Message, CollectionPoint
+from .models import CollectionPoint, Conversation, Donation, Message
+from .pagination import paginate_keyset, paginate_sequence
+from .search import search_donations
+from .similarity import related_donations
 
 
 User = get_user_model()
 
+DONATIONS_PAGE_SIZE = 24
+CONVERSATIONS_PAGE_SIZE = 30
+MESSAGES_PAGE_SIZE = 50
+
+# Stream SSE do chat (segundos / milissegundos)
+STREAM_HEARTBEAT = 15
+STREAM_MAX_AGE = 300
+STREAM_RETRY_MS = 3000
+
+# Chaves de ordenação da lista "perto de mim" (ordenada em Python)
+NEARBY_ORDER_KEYS = {
+    'distance': lambda d: (d.distance_km, d.pk),
+    'relevance': lambda d: (-d.search_rank, -d.pk),
+    'recent': lambda d: (-d.created_at.timestamp(), -d.pk),
+    'oldest': lambda d: (d.created_at.timestamp(), d.pk),
+    'name': lambda d: (d.title, d.pk),
+}
+
+
+def _with_location(donations):
+    """Anota geo_latitude/geo_longitude: retirada em domicílio ou ponto de coleta"""
+    has_pickup = Q(pickup_latitude__isnull=False, pickup_longitude__isnull=False)
+    return donations.annotate(
+        geo_latitude=Case(
+            When(has_pickup, then=F('pickup_latitude')),
+            default=F('collection_point__latitude'),
+            output_field=FloatField(),
+        ),
+        geo_longitude=Case(
+            When(has_pickup, then=F('pickup_longitude')),
+            default=F('collection_point__longitude'),
+            output_field=FloatField(),
+        ),
+    )
+
 
 def index(request):
     """Listar anúncios com filtros simples de busca, condição e cidade."""
     # Apenas doações aprovadas ou entregues são visíveis para usuários comuns
-    donations = Donation.objects.filter(is_available=True, status__in=['aprovada', 'entregue'])
+    donations = Donation.objects.filter(is_available=True, status__in=Donation.PUBLIC_STATUSES)
     search = (request.GET.get('q') or '').strip()
     condition = request.GET.get('condition') or ''
     city = (request.GET.get('city') or '').strip()
-    order = request.GET.get('order') or 'recent'
+    # Modo "perto de mim": coordenadas do navegador + raio em km
+    point = geo.parse_point(request.GET.get('lat'), request.GET.get('lng'))
+    radius = geo.parse_radius(request.GET.get('radius'))
+    order = request.GET.get('order') or ('distance' if point else 'relevance' if search else 'recent')
 
     if search:
-        donations = donations.filter(
-            Q(title__icontains=search) | Q(description__icontains=search)
-        )
+        donations = search_donations(donations, search)
     if condition:
         donations = donations.filter(condition=condition)
     if city:
         donations = donations.filter(city__icontains=city)
 
-    if order == 'oldest':
-        donations = donations.order_by('created_at')
+    if order == 'relevance' and search:
+        ordering = ('-search_rank', '-id')
+    elif order == 'oldest':
+        ordering = ('created_at', 'id')
     elif order == 'name':
-        donations = donations.order_by('title')
+        ordering = ('title', 'id')
     else:
-        donations = donations.order_by('-created_at')
+        ordering = ('-created_at', '-id')
+
+    if point:
+        # Pré-filtro por geohash + caixa no banco; ordem exata por haversine
+        nearby = geo.nearby(
+            _with_location(donations.select_related('donor')),
+            *point,
+            radius,
+            lat_field='geo_latitude',
+            lng_field='geo_longitude',
+        )
+        if order not in NEARBY_ORDER_KEYS or (order == 'relevance' and not search):
+            order = 'distance'
+        key = NEARBY_ORDER_KEYS[order]
+        if order != 'distance':
+            nearby.sort(key=key)
+        page = paginate_sequence(
+            nearby,
+            key=key,
+            cursor=request.GET.get('cursor'),
+            page_size=DONATIONS_PAGE_SIZE,
+        )
+    else:
+        page = paginate_keyset(
+            donations.select_related('donor'),
+            ordering,
+            cursor=request.GET.get('cursor'),
+            page_size=DONATIONS_PAGE_SIZE,
+        )
 
-    city_choices = (
-        Donation.objects.exclude(city='').exclude(city__isnull=True)
-        .values_list('city', flat=True)
-        .distinct()
-        .order_by('city')
-    )
+    next_url = None
+    if page.has_next:
+        params = request.GET.copy()
+        params['cursor'] = page.next_cursor
+        next_url = f"{request.path}?{params.urlencode()}"
+
+    # Requisições do botão "Carregar mais" recebem apenas os cards
+    if request.headers.get('x-requested-with') == 'XMLHttpRequest':
+        return render(
+            request,
+            'marketplace/_donation_cards.html',
+            {'donations': page, 'next_url': next_url},
+        )
+
+    facets = donation_facets()
 
     context = {
-        'donations': donations.select_related('donor'),
+        'donations': page,
+        'next_url': next_url,
         'filters': {
             'search': search,
             'condition': condition,
             'city': city,
             'order': order,
+            'lat': point[0] if point else '',
+            'lng': point[1] if point else '',
+            'radius': radius,
         },
-        'city_choices': city_choices,
-        'condition_choices': Donation.CONDITION_CHOICES,
+        'near': bool(point),
+        'radius_choices': geo.RADIUS_CHOICES_KM,
+        'city_choices': facets['cities'],
+        'condition_choices': facets['conditions'],
     }
     return render(request, 'marketplace/index.html', context)
 
@@ -81,15 +178,19 @@ def detail(request, pk):
         Donation.objects.select_related('donor'),
         pk=pk,
     )
-    related = (
-        Donation.objects.filter(is_available=True)
-        .exclude(pk=pk)
-        .order_by('-created_at')[:3]
-    )
+    related = list(related_donations(donation, limit=3))
+    related_are_similar = bool(related)
+    if not related:
+        # Sem vizinhos calculados (ex.: doação pendente): itens recentes visíveis
+        related = (
+            Donation.objects.filter(is_available=True, status__in=Donation.PUBLIC_STATUSES)
+            .exclude(pk=pk)
+            .order_by('-created_at')[:3]
+        )
     return render(
         request,
         'marketplace/detail.html',
-        {'donation': donation, 'related': related},
+        {'donation': donation, 'related': related, 'related_are_similar': related_are_similar},
     )
 
 
@@ -97,33 +198,25 @@ def detail(request, pk):
 def chats(request):
     """Resumo das conversas do usuário (como doador ou interessado)."""
     user = request.user
-    latest = (
-        Message.objects.filter(Q(sender=user) | Q(recipient=user))
-        .select_related('donation', 'donation__donor', 'sender', 'recipient')
-        .order_by('-created_at')
+    conversations = (
+        Conversation.objects.filter(Q(user_a=user) | Q(user_b=user))
+        .select_related('donation', 'user_a', 'user_b', 'last_message', 'last_message__sender')
     )
-
-    conversations = {}
-    for msg in latest:
-        other = msg.recipient if msg.sender == user else msg.sender
-        if other is None:
-            continue
-        key = (msg.donation_id, other.id)
-        stored = conversations.get(key)
-        if not stored or msg.created_at > stored['last_message'].created_at:
-            conversations[key] = {
-                'donation': msg.donation,
-                'other': other,
-                'last_message': msg,
-            }
-
-    ordered = sorted(
-        conversations.values(),
-        key=lambda item: item['last_message'].created_at,
-        reverse=True,
+    page = paginate_keyset(
+        conversations,
+        ('-last_activity', '-id'),
+        cursor=request.GET.get('cursor'),
+        page_size=CONVERSATIONS_PAGE_SIZE,
     )
+    for conversation in page:
+        conversation.other = conversation.other_user(user)
+        conversation.unread = conversation.unread_for(user)
+
+    next_url = None
+    if page.has_next:
+        next_url = f"{request.path}?cursor={page.next_cursor}"
 
-    return render(request, 'marketplace/chats.html', {'conversations': ordered})
+    return render(request, 'marketplace/chats.html', {'conversations': page, 'next_url': next_url})
 
 
 def _participants_for_donation(donation):
@@ -132,25 +225,10 @@ def _participants_for_donation(donation):
     1. Têm DonationRequest aprovada (pessoas interessadas)
     2. Ou que já trocaram mensagens nesse anúncio
     """
-    # Beneficiários com solicitação aprovada
-    approved_beneficiaries = set(
-        donation.requests.filter(status='aprovada').values_list('beneficiary_id', flat=True)
-    )
-    
-    # Usuários que já trocaram mensagens
-    user_ids = set(
-        donation.messages.values_list('sender_id', flat=True)
-    ) | set(
-        donation.messages.values_list('recipient_id', flat=True)
-    )
-    user_ids.discard(donation.donor_id)
-    
-    # Combina ambos os grupos
-    all_user_ids = approved_beneficiaries | user_ids
-    
-    if not all_user_ids:
+    ids = chat_participants.participant_ids(donation)
+    if not ids:
         return User.objects.none()
-    return User.objects.filter(id__in=all_user_ids)
+    return User.objects.filter(id__in=ids)
 
 
 def _resolve_partner(request, donation, participant_id):
@@ -161,18 +239,18 @@ def _resolve_partner(request, donation, participant_id):
                 {'error': 'Selecione um interessado para continuar o chat.'},
                 status=400,
             )
-        try:
-            participant = User.objects.get(pk=participant_id)
-        except User.DoesNotExist:
-            return None, JsonResponse({'error': 'Usuário não encontrado.'}, status=404)
-        if participant == request.user:
+        if str(participant_id) == str(request.user.pk):
             return None, JsonResponse({'error': 'Conversa inválida.'}, status=400)
-        valid_ids = set(_participants_for_donation(donation).values_list('id', flat=True))
-        if participant.id not in valid_ids:
+        # Autorização pelo conjunto em cache; o usuário só é buscado se válido
+        if not str(participant_id).isdigit() or int(participant_id) not in chat_participants.participant_ids(donation):
             return None, JsonResponse(
                 {'error': 'Esse interessado ainda não iniciou conversa.'},
                 status=400,
             )
+        try:
+            participant = User.objects.get(pk=participant_id)
+        except User.DoesNotExist:
+            return None, JsonResponse({'error': 'Usuário não encontrado.'}, status=404)
         return participant, None
 
     # Interessado falando com o doador
@@ -203,10 +281,12 @@ def chat(request, pk):
 
     messages_url = reverse('doacoes:messages_json', kwargs={'pk': donation.pk})
     post_url = reverse('doacoes:post_message', kwargs={'pk': donation.pk})
+    stream_url = reverse('doacoes:message_stream', kwargs={'pk': donation.pk})
 
     if active_participant:
         messages_url = f"{messages_url}?participant={active_participant.pk}"
         post_url = f"{post_url}?participant={active_participant.pk}"
+        stream_url = f"{stream_url}?participant={active_participant.pk}"
 
     context = {
         'donation': donation,
@@ -216,6 +296,7 @@ def chat(request, pk):
         'active_participant': active_participant,
         'messages_url': messages_url if active_participant else None,
         'post_url': post_url if active_participant else None,
+        'stream_url': stream_url if active_participant else None,
     }
 
     if is_owner and not active_participant:
@@ -227,6 +308,27 @@ def chat(request, pk):
     return render(request, 'marketplace/chat.html', context)
 
 
+def _conversation(donation, user, other):
+    return Message.objects.filter(donation=donation).filter(
+        Q(sender=user, recipient=other) | Q(sender=other, recipient=user)
+    )
+
+
+def _serialize_message(msg):
+    """Formato compacto: o nome do remetente vem do mapa de participantes"""
+    return {
+        'id': msg.id,
+        'sender_id': msg.sender_id,
+        'text': msg.text,
+        'image': msg.image.url if msg.image else None,
+        'created_at': msg.created_at.isoformat(),
+    }
+
+
+def _participants_map(*users):
+    return {str(user.pk): user.get_full_name() or user.get_username() for user in users}
+
+
 @login_required(login_url='usuario:login')
 def messages_json(request, pk):
     donation = get_object_or_404(Donation, pk=pk)
@@ -235,28 +337,61 @@ def messages_json(request, pk):
     if error_response:
         return error_response
 
-    qs = (
-        Message.objects.filter(donation=donation)
-        .filter(
-            Q(sender=request.user, recipient=other)
-            | Q(sender=other, recipient=request.user)
-        )
-        .order_by('created_at')
-        .select_related('sender')
-    )
-
-    data = [
-        {
-            'id': msg.id,
-            'sender': msg.sender.get_full_name() or msg.sender.get_username(),
-            'sender_id': msg.sender.id,
-            'text': msg.text,
-            'image': msg.image.url if msg.image else None,
-            'created_at': msg.created_at.isoformat(),
-        }
-        for msg in qs
-    ]
-    return JsonResponse({'messages': data})
+    conversation = _conversation(donation, request.user, other)
+
+    # ETag = id da última mensagem: sem novidade, 304 sem serializar nada
+    last_id = conversation.order_by('-id').values_list('id', flat=True).first() or 0
+    etag = f'"msg-{last_id}"'
+    not_modified = get_conditional_response(request, etag=etag)
+    if not_modified is not None:
+        patch_cache_control(not_modified, private=True, no_cache=True)
+        return not_modified
+
+    # Cursores: after_id/since (novas, em ordem), before_id (página anterior)
+    # ou nada (as MESSAGES_PAGE_SIZE mais recentes)
+    after_id = request.GET.get('after_id') or ''
+    before_id = request.GET.get('before_id') or ''
+    try:
+        since = parse_datetime(request.GET.get('since') or '')
+    except ValueError:
+        since = None
+
+    has_more = False
+    if after_id.isdigit() or (since and not before_id.isdigit()):
+        if after_id.isdigit():
+            conversation = conversation.filter(id__gt=int(after_id))
+        else:
+            conversation = conversation.filter(created_at__gt=since)
+        page = list(conversation.order_by('id')[:MESSAGES_PAGE_SIZE + 1])
+        # Aqui has_more indica que ainda há mensagens novas depois desta página
+        has_more = len(page) > MESSAGES_PAGE_SIZE
+        page = page[:MESSAGES_PAGE_SIZE]
+        if has_more:
+            # O cliente ainda não tem a última mensagem: last_id e ETag não
+            # podem apontar para ela, senão o próximo pedido receberia 304
+            last_id = page[-1].id
+            etag = None
+    else:
+        if before_id.isdigit():
+            conversation = conversation.filter(id__lt=int(before_id))
+        page = list(conversation.order_by('-id')[:MESSAGES_PAGE_SIZE + 1])
+        has_more = len(page) > MESSAGES_PAGE_SIZE
+        page = page[:MESSAGES_PAGE_SIZE][::-1]
+
+    # Entregues ao destinatário: marca como lidas em um único UPDATE
+    if any(msg.sender_id == other.pk for msg in page):
+        unread.mark_read(donation.pk, request.user.pk, other.pk, max(msg.id for msg in page))
+
+    response = JsonResponse({
+        'messages': [_serialize_message(msg) for msg in page],
+        'participants': _participants_map(request.user, other),
+        'last_id': last_id,
+        'has_more': has_more,
+    })
+    if etag:
+        response['ETag'] = etag
+    patch_cache_control(response, private=True, no_cache=True)
+    return response
 
 
 @login_required(login_url='usuario:login')
@@ -280,11 +415,74 @@ def post_message(request, pk):
     message.donation = donation
     message.sender = request.user
     message.recipient = other
-    message.save()
+    with transaction.atomic():
+        message.save()
+        record_message(message)
+        unread.message_sent(message)
+        chat_participants.message_sent(message, donation.donor_id)
+
+    # Acorda os streams SSE abertos nessa conversa
+    channel = pubsub.conversation_channel(donation.pk, request.user.pk, other.pk)
+    transaction.on_commit(partial(pubsub.publish, channel, message.pk))
 
     return JsonResponse({'ok': True})
 
 
+@login_required(login_url='usuario:login')
+async def message_stream(request, pk):
+    """
+    Server-Sent Events com as mensagens novas da conversa.
+
+    Só faz sentido sob ASGI, onde a conexão aberta não prende uma thread.
+    Sob WSGI responde 204, que faz o EventSource desistir, e o cliente volta
+    para o polling de messages_json.
+    """
+    if not isinstance(request, ASGIRequest):
+        return HttpResponse(status=204)
+
+    donation = await aget_object_or_404(Donation.objects.select_related('donor'), pk=pk)
+    other, error_response = await sync_to_async(_resolve_partner)(
+        request, donation, request.GET.get('participant')
+    )
+    if error_response:
+        return error_response
+
+    user = await request.auser()
+    conversation = _conversation(donation, user, other)
+    channel = pubsub.conversation_channel(donation.pk, user.pk, other.pk)
+    # Reconexões do EventSource mandam Last-Event-ID; a primeira usa after_id
+    cursor = request.headers.get('Last-Event-ID') or request.GET.get('after_id') or ''
+    last_id = int(cursor) if cursor.isdigit() else 0
+
+    async def events():
+        nonlocal last_id
+        # Assina antes de consultar para não perder mensagens entre os dois
+        subscription = pubsub.subscribe(channel)
+        deadline = time.monotonic() + STREAM_MAX_AGE
+        try:
+            yield f'retry: {STREAM_RETRY_MS}\n\n'
+            while True:
+                received = False
+                async for msg in conversation.filter(id__gt=last_id).order_by('id'):
+                    last_id = msg.id
+                    received = received or msg.sender_id == other.pk
+                    yield f'id: {msg.id}\ndata: {json.dumps(_serialize_message(msg))}\n\n'
+                if received:
+                    await sync_to_async(unread.mark_read)(donation.pk, user.pk, other.pk, last_id)
+                # Conexões longas são recicladas; o navegador reconecta sozinho
+                if time.monotonic() >= deadline:
+                    break
+                if await subscription.wait(STREAM_HEARTBEAT) is None:
+                    yield ': ping\n\n'
+        finally:
+            subscription.close()
+
+    response = StreamingHttpResponse(events(), content_type='text/event-stream')
+    response['Cache-Control'] = 'no-cache'
+    response['X-Accel-Buffering'] = 'no'
+    return response
+
+
 def collection_points_map(request):
     """
     Exibir mapa interativo com pontos de coleta
@@ -300,6 +498,29 @@ def collection_points_map(request):
     return render(request, 'marketplace/map.html', context)
 
 
+def collection_points_nearby(request):
+    """Pontos de coleta ativos dentro do raio, do mais próximo ao mais distante (JSON)"""
+    point = geo.parse_point(request.GET.get('lat'), request.GET.get('lng'))
+    if point is None:
+        return JsonResponse({'error': 'Coordenadas inválidas'}, status=400)
+    radius = geo.parse_radius(request.GET.get('radius'))
+
+    points = geo.nearby(CollectionPoint.objects.filter(is_active=True), *point, radius)
+    return JsonResponse({
+        'radius_km': radius,
+        'points': [
+            {
+                'id': p.id,
+                'name': p.name,
+                'lat': p.latitude,
+                'lng': p.longitude,
+                'distance_km': round(p.distance_km, 2),
+            }
+            for p in points
+        ],
+    })
+
+
 @login_required(login_url='usuario:login')
 def edit_donation(request, pk):
     """Editar uma doação existente."""